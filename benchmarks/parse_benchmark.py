@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the parallel STEP entity table against OCCT's ReadFile
+
+Times STEPControl_Reader.ReadFile, the streaming pre-scanner and
+parse_entity_table on one process and on N processes, for every file in
+stp_files/ and for a large synthetic file made of renumbered copies of the
+DATA section of the first corpus file (plain text, no OCCT needed).
+
+    python benchmarks/parse_benchmark.py                          # 4 workers, 100 MB synthetic
+    python benchmarks/parse_benchmark.py --workers 8 --synthetic-mb 500
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Add the project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from core.batch import collect_input_files
+from core.entity_table import parse_entity_table, data_section
+from core.step_scan import scan_step_file
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RESULTS = os.path.join(BENCHMARK_DIR, "parse_last_run.json")
+DEFAULT_CORPUS = os.path.join(project_root, "stp_files")
+
+_REFERENCE_RE = re.compile(rb"#(\d+)")
+
+
+def make_synthetic_text(source_path, target_mb, output_path):
+    """Write a STEP file of about target_mb MB: the DATA section of source_path repeated, renumbered"""
+    with open(source_path, "rb") as f:
+        text = f.read()
+    start, end = data_section(text)
+    data = text[start:end]
+    id_step = max(int(n) for n in _REFERENCE_RE.findall(data))
+
+    copies = max(1, int(target_mb * 1024 * 1024 // len(data)))
+    with open(output_path, "wb") as f:
+        f.write(text[:start])
+        for copy in range(copies):
+            offset = copy * id_step
+            f.write(_REFERENCE_RE.sub(lambda m: b"#%d" % (int(m.group(1)) + offset), data))
+        f.write(text[end:])
+    return output_path
+
+
+def time_read_file(path):
+    """Seconds of STEPControl_Reader.ReadFile, or None without OCCT"""
+    from core import occ_backend as occ
+
+    if not occ.is_available():
+        return None
+    reader = occ.STEPControl_Reader()
+    start = time.perf_counter()
+    status = reader.ReadFile(path)
+    seconds = time.perf_counter() - start
+    if status != occ.IFSelect_RetDone:
+        raise Exception(f"Failed to read STEP file: {path}")
+    return seconds
+
+
+def time_read_file_isolated(path):
+    """time_read_file in a fresh process, so OCCT memory does not pile up"""
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(time_read_file, path).result()
+
+
+def best_of(repeat, function, *args):
+    """Best seconds of repeat calls of function(*args) returning seconds"""
+    return min(function(*args) for _ in range(repeat))
+
+
+def run_case(path, workers, repeat):
+    """Metrics of one file"""
+    file_mb = os.path.getsize(path) / (1024 * 1024)
+    table = parse_entity_table(path, 1)
+    metrics = {
+        "file_mb": file_mb,
+        "entities": len(table),
+        "scan": best_of(repeat, lambda: scan_step_file(path).seconds),
+        "table_1": best_of(repeat, lambda: parse_entity_table(path, 1).seconds),
+        f"table_{workers}": best_of(repeat, lambda: parse_entity_table(path, workers).seconds),
+        "chunks": parse_entity_table(path, workers).workers,
+        "read_file": time_read_file_isolated(path),
+    }
+    if metrics["read_file"] is not None:
+        metrics["speedup_vs_read_file"] = metrics["read_file"] / metrics[f"table_{workers}"]
+    return metrics
+
+
+def print_case(name, metrics, workers):
+    """Print one case as a small table"""
+    print(f"\n{name}  ({metrics['entities']:,} entities, {metrics['file_mb']:.2f} MB, "
+          f"{metrics['chunks']} chunk(s))")
+    for key, label in (("read_file", "ReadFile"), ("scan", "pre-scan"), ("table_1", "table x1"),
+                       (f"table_{workers}", f"table x{workers}")):
+        seconds = metrics[key]
+        if seconds is None:
+            print(f"  {label:<10} {'n/a':>9}")
+        else:
+            print(f"  {label:<10} {seconds:>9.4f}s {metrics['file_mb'] / seconds:>10.1f} MB/s")
+    if "speedup_vs_read_file" in metrics:
+        print(f"  speedup over ReadFile: {metrics['speedup_vs_read_file']:.1f}x")
+
+
+def main():
+    """Main benchmark function"""
+    parser = argparse.ArgumentParser(description="Benchmark the parallel STEP entity table")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="Directory of STEP files")
+    parser.add_argument("--workers", type=int, default=4, help="Processes of the parallel parse")
+    parser.add_argument("--synthetic-mb", type=float, default=100.0,
+                        help="Size of the synthetic file (0 to skip it)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case, best time is kept")
+    parser.add_argument("--results", default=DEFAULT_RESULTS, help="Where to write this run's results")
+    args = parser.parse_args()
+
+    corpus = collect_input_files([args.corpus])
+    if not corpus:
+        print(f"No STEP files found in {args.corpus}")
+        return False
+
+    print("STEP File Face Coloring Tool - Parse Benchmark")
+    print("=" * 50)
+
+    results = {"workers": args.workers, "cpus": os.cpu_count(), "cases": {}}
+    with tempfile.TemporaryDirectory() as work_dir:
+        cases = [(os.path.basename(path), path) for path in corpus]
+        if args.synthetic_mb > 0:
+            synthetic = os.path.join(work_dir, "synthetic.step")
+            make_synthetic_text(corpus[0], args.synthetic_mb, synthetic)
+            cases.append((f"synthetic {args.synthetic_mb:.0f} MB", synthetic))
+
+        for name, path in cases:
+            metrics = run_case(path, args.workers, args.repeat)
+            results["cases"][name] = metrics
+            print_case(name, metrics, args.workers)
+
+    with open(args.results, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    if all(case["read_file"] is None for case in results["cases"].values()):
+        print("\nOCC is not available; ReadFile was not timed")
+    print(f"\nResults written to {args.results}")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the STEP processing pipeline
+
+Runs load, orient, color, save and meshing over every file in stp_files/
+plus synthetic N x M arrays of copies of a wythe part, records throughput
+(faces/s, MB/s, triangles/s) and peak memory per stage, and compares the
+results to a JSON baseline.
+
+    python benchmarks/run_benchmarks.py                     # compare to baseline
+    python benchmarks/run_benchmarks.py --update-baseline   # record a new baseline
+    python benchmarks/run_benchmarks.py --threshold 15 --grid 2x2 --grid 8x8
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+# Add the project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from core.batch import collect_input_files
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+DEFAULT_RESULTS = os.path.join(BENCHMARK_DIR, "last_run.json")
+DEFAULT_CORPUS = os.path.join(project_root, "stp_files")
+
+# Stages faster than this are too noisy to compare
+MIN_COMPARABLE_SECONDS = 0.01
+
+# Stages whose throughput is measured against the file size rather than faces
+BYTE_STAGES = ("read", "transfer")
+
+
+def make_synthetic_file(source_path, rows, cols, output_path):
+    """Write a STEP file holding a rows x cols array of copies of source_path"""
+    from core.step_processor import StepProcessor
+    from core.bodies import make_compound
+    from core.orientation import apply_trsf
+    from core.step_writer import write_colored_step
+    from core.palette import FaceColoring
+    from core import occ_backend as occ
+
+    processor = StepProcessor()
+    shape = processor.load_step_file(source_path)
+    xmin, ymin, _, xmax, ymax, _ = processor.extract_features(shape).bbox.T
+    pitch_x = (xmax.max() - xmin.min()) * 1.1
+    pitch_y = (ymax.max() - ymin.min()) * 1.1
+
+    copies = []
+    for row in range(rows):
+        for col in range(cols):
+            trsf = occ.gp_Trsf()
+            trsf.SetTranslation(occ.gp_Vec(col * pitch_x, row * pitch_y, 0.0))
+            copies.append(apply_trsf(shape, trsf))
+
+    # No face colors: the copies are written plain
+    write_colored_step(make_compound(copies), FaceColoring([], [], []), output_path)
+    return output_path
+
+
+def run_case(input_path, output_dir, repeat):
+    """Run the pipeline on one file and return its metrics (best of repeat runs)"""
+    from core.step_processor import StepProcessor
+    from core.profiling import peak_rss_bytes
+
+    output_path = os.path.join(output_dir, os.path.basename(input_path) + "_bench.step")
+    file_mb = os.path.getsize(input_path) / (1024 * 1024)
+
+    best = {}
+    faces = 0
+    triangles = 0
+    peak_rss = None
+    for _ in range(repeat):
+        processor = StepProcessor()
+        processor.process_file(input_path, output_path)
+        faces = len(processor.face_table)
+        records = list(processor.profile["stages"])
+
+        # Fine preview/export mesh of the oriented shape
+        mesh = processor.tessellate(lod="fine")
+        triangles = len(mesh)
+        records.append({"stage": "mesh", "seconds": mesh.seconds})
+        # Split of the mesh time: OCCT meshing, then packing into NumPy buffers
+        records.append({"stage": "mesh_occt", "seconds": mesh.timings.get("mesh", 0.0)})
+        records.append({"stage": "mesh_gather", "seconds": mesh.timings.get("gather", 0.0)})
+        peak_rss = max(processor.profile["peak_rss"] or 0, peak_rss_bytes() or 0) or None
+
+        for record in records:
+            seconds = record["seconds"]
+            if record["stage"] not in best or seconds < best[record["stage"]]:
+                best[record["stage"]] = seconds
+
+    stages = {}
+    for stage, seconds in best.items():
+        metrics = {"seconds": seconds}
+        if seconds > 0:
+            if stage in BYTE_STAGES:
+                metrics["mb_per_s"] = file_mb / seconds
+            elif stage.startswith("mesh"):
+                metrics["triangles_per_s"] = triangles / seconds
+            else:
+                metrics["faces_per_s"] = faces / seconds
+        stages[stage] = metrics
+
+    return {"file_mb": file_mb, "faces": faces, "triangles": triangles, "peak_rss": peak_rss, "stages": stages}
+
+
+def run_isolated(input_path, output_dir, repeat):
+    """Run a case in a fresh process so that peak memory is per case"""
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(run_case, input_path, output_dir, repeat).result()
+
+
+def compare(results, baseline, threshold):
+    """List regressions of results against baseline beyond threshold percent"""
+    regressions = []
+    limit = 1 + threshold / 100.0
+    for case, current in results["cases"].items():
+        previous = baseline.get("cases", {}).get(case)
+        if previous is None:
+            continue
+
+        for stage, metrics in current["stages"].items():
+            old = previous["stages"].get(stage)
+            if old is None or old["seconds"] < MIN_COMPARABLE_SECONDS:
+                continue
+            if metrics["seconds"] > old["seconds"] * limit:
+                regressions.append(f"{case} {stage}: {old['seconds']:.3f}s -> {metrics['seconds']:.3f}s")
+
+        if previous.get("peak_rss") and current.get("peak_rss"):
+            if current["peak_rss"] > previous["peak_rss"] * limit:
+                regressions.append(f"{case} peak memory: {previous['peak_rss'] / 2**20:.0f} MB -> "
+                                   f"{current['peak_rss'] / 2**20:.0f} MB")
+    return regressions
+
+
+def print_case(name, metrics):
+    """Print one case as a small table"""
+    print(f"\n{name}  ({metrics['faces']} faces, {metrics.get('triangles', 0):,} triangles, "
+          f"{metrics['file_mb']:.2f} MB)")
+    for stage, values in metrics["stages"].items():
+        rate = ""
+        if "faces_per_s" in values:
+            rate = f"{values['faces_per_s']:>12,.0f} faces/s"
+        elif "triangles_per_s" in values:
+            rate = f"{values['triangles_per_s']:>12,.0f} triangles/s"
+        elif "mb_per_s" in values:
+            rate = f"{values['mb_per_s']:>12.2f} MB/s"
+        print(f"  {stage:<11} {values['seconds']:>9.4f}s {rate}")
+    if metrics["peak_rss"]:
+        print(f"  peak memory {metrics['peak_rss'] / 2**20:.0f} MB")
+
+
+def parse_grid(value):
+    """Parse an 'NxM' grid size"""
+    rows, cols = value.lower().split("x")
+    return int(rows), int(cols)
+
+
+def main():
+    """Main benchmark function"""
+    parser = argparse.ArgumentParser(description="Benchmark the STEP processing pipeline")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="Directory of STEP files")
+    parser.add_argument("--grid", action="append", type=parse_grid, default=None,
+                        help="Synthetic NxM array of copies of the first corpus file (repeatable)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case, best time is kept")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--results", default=DEFAULT_RESULTS, help="Where to write this run's results")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="Allowed slowdown per stage in percent before failing")
+    parser.add_argument("--update-baseline", action="store_true", help="Store this run as the baseline")
+    args = parser.parse_args()
+
+    grids = args.grid or [(2, 2), (4, 4)]
+    corpus = collect_input_files([args.corpus])
+    if not corpus:
+        print(f"No STEP files found in {args.corpus}")
+        return False
+
+    print("STEP File Face Coloring Tool - Benchmarks")
+    print("=" * 50)
+
+    results = {"cases": {}}
+    with tempfile.TemporaryDirectory() as work_dir:
+        cases = [(os.path.basename(path), path) for path in corpus]
+        for rows, cols in grids:
+            synthetic = os.path.join(work_dir, f"synthetic_{rows}x{cols}.step")
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                executor.submit(make_synthetic_file, corpus[0], rows, cols, synthetic).result()
+            cases.append((f"synthetic {rows}x{cols}", synthetic))
+
+        for name, path in cases:
+            metrics = run_isolated(path, work_dir, args.repeat)
+            results["cases"][name] = metrics
+            print_case(name, metrics)
+
+    with open(args.results, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    print("\n" + "=" * 50)
+    if args.update_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return True
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"✗ {len(regressions)} regression(s) beyond {args.threshold:.0f}%:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return False
+
+    print(f"✓ No stage regressed by more than {args.threshold:.0f}%")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,247 @@
+"""
+Headless batch processing of STEP files on a process pool
+"""
+
+import glob
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from core.step_scan import scan_step_file
+
+STEP_EXTENSIONS = (".stp", ".step")
+OUTPUT_SUFFIX = "_colored"
+
+# A crash inside OCCT breaks the whole process pool and every unfinished file
+# with it. Those files are retried on a new pool; files caught in this many
+# breaks run alone, so that a crash is blamed on the file that causes it.
+MAX_SHARED_ATTEMPTS = 2
+
+# One StepProcessor per worker process, created by _init_worker
+_processor = None
+
+
+def _init_worker(use_cache=True, cache_dir=None, cache_max_bytes=None, low_memory=False, rss_limit=None,
+                 parse_workers=None):
+    """Create the StepProcessor used by this worker process"""
+    global _processor
+    from core.step_processor import StepProcessor
+    from core.shape_cache import ShapeCache, DEFAULT_MAX_BYTES
+
+    shape_cache = None
+    if use_cache:
+        shape_cache = ShapeCache(cache_dir, cache_max_bytes or DEFAULT_MAX_BYTES)
+    _processor = StepProcessor(shape_cache=shape_cache, low_memory=low_memory, rss_limit=rss_limit,
+                               parse_workers=parse_workers)
+
+
+def is_step_file(path):
+    """Check whether a path looks like a STEP input (and not one of our outputs)"""
+    base, ext = os.path.splitext(path)
+    return ext.lower() in STEP_EXTENSIONS and not base.endswith(OUTPUT_SUFFIX)
+
+
+def collect_input_files(patterns):
+    """Expand directories and glob patterns into a sorted list of STEP files"""
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            candidates = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+        else:
+            candidates = glob.glob(pattern)
+        files.extend(path for path in candidates if os.path.isfile(path) and is_step_file(path))
+    return sorted(set(os.path.abspath(path) for path in files))
+
+
+def output_path_for(input_path, output_dir=None):
+    """Build the '<name>_colored.step' output path for an input file"""
+    base_name = os.path.splitext(os.path.basename(input_path))[0]
+    if output_dir is None:
+        output_dir = os.path.dirname(input_path)
+    return os.path.join(output_dir, f"{base_name}{OUTPUT_SUFFIX}.step")
+
+
+def summary_path_for(output_path):
+    """Path of the JSON summary written next to an output file"""
+    return os.path.splitext(output_path)[0] + ".json"
+
+
+def criteria_key(orientation_criteria, coloring_criteria, mesh_formats=()):
+    """JSON-able identity of the processing options, stored in each summary"""
+    key = {"orientation": orientation_criteria, "coloring": coloring_criteria,
+           "mesh_formats": sorted(mesh_formats)}
+    return json.loads(json.dumps(key, sort_keys=True))
+
+
+def is_up_to_date(input_path, output_path, criteria=None):
+    """True when the output exists and is newer than its input
+
+    With criteria (see criteria_key), the summary next to the output must
+    also record a successful run with the same criteria.
+    """
+    if not os.path.exists(output_path):
+        return False
+    if os.path.getmtime(output_path) < os.path.getmtime(input_path):
+        return False
+    if criteria is None:
+        return True
+    try:
+        with open(summary_path_for(output_path), encoding="utf-8") as f:
+            summary = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return summary.get("status") == "ok" and summary.get("criteria") == criteria
+
+
+def profile_path_for(output_path):
+    """Path of the profiling report written next to an output file"""
+    return os.path.splitext(output_path)[0] + ".profile.json"
+
+
+def mesh_paths_for(output_path, mesh_formats):
+    """Paths of the colored meshes written next to an output file, one per format"""
+    return [f"{os.path.splitext(output_path)[0]}.{fmt}" for fmt in mesh_formats]
+
+
+def _process_one(input_path, output_path, orientation_criteria, coloring_criteria, profile=False,
+                 mesh_formats=(), progress_callback=None):
+    """Process a single file in a worker and return its summary"""
+    summary = {
+        "input": input_path,
+        "output": output_path,
+        "status": "ok",
+        "faces": 0,
+        "seconds": 0.0,
+        "error": None,
+        "criteria": criteria_key(orientation_criteria, coloring_criteria, mesh_formats),
+    }
+    start = time.perf_counter()
+    try:
+        mesh_paths = mesh_paths_for(output_path, mesh_formats)
+        _processor.process_file(input_path, output_path, orientation_criteria, coloring_criteria,
+                                profile_path=profile_path_for(output_path) if profile else None,
+                                mesh_paths=mesh_paths, progress_callback=progress_callback)
+        summary["faces"] = len(_processor.face_colors or {})
+        if mesh_paths:
+            summary["meshes"] = mesh_paths
+        summary["bodies"] = len(_processor.bodies)
+        summary["orient_seconds"] = round(_processor.orientation_time or 0.0, 4)
+    except Exception as e:
+        summary["status"] = "failed"
+        summary["error"] = str(e)
+    summary["seconds"] = round(time.perf_counter() - start, 4)
+    if _processor.profile is not None:
+        summary["stages"] = {record["stage"]: round(record["seconds"], 4)
+                             for record in _processor.profile["stages"]}
+    return summary
+
+
+def _face_count(input_path):
+    """Face count from the pre-scanner, used to schedule big files first"""
+    try:
+        return scan_step_file(input_path).face_count
+    except (OSError, ValueError):
+        return 0
+
+
+def write_summary(summary):
+    """Write the per-file JSON summary next to the output"""
+    with open(summary_path_for(summary["output"]), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+
+def _run_pool(jobs, workers, init_args, task_args, finish):
+    """Run jobs on one process pool, calling finish(summary) for each
+
+    Returns the jobs left unfinished because a worker died and broke the pool.
+    """
+    broken = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args) as executor:
+        futures = {
+            executor.submit(_process_one, input_path, output_path, *task_args): (input_path, output_path)
+            for input_path, output_path in jobs
+        }
+        for future in as_completed(futures):
+            input_path, output_path = futures[future]
+            try:
+                summary = future.result()
+            except BrokenProcessPool:
+                broken.append((input_path, output_path))
+                continue
+            except Exception as e:
+                summary = {"input": input_path, "output": output_path, "status": "failed",
+                           "faces": 0, "seconds": 0.0, "error": f"Worker failed: {e}"}
+            finish(summary)
+    return broken
+
+
+def run_batch(patterns, output_dir=None, workers=None, orientation_criteria=None,
+              coloring_criteria=None, force=False, use_cache=True, cache_dir=None,
+              cache_max_bytes=None, profile=False, mesh_formats=(), low_memory=False, rss_limit=None,
+              parse_workers=None, log=print):
+    """Color every STEP file matched by patterns and return the list of summaries
+
+    A file is skipped when its output is newer and was made with the same
+    criteria. A worker crash only fails the file that caused it.
+    """
+    input_files = collect_input_files(patterns)
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    criteria = criteria_key(orientation_criteria, coloring_criteria, mesh_formats)
+
+    summaries = []
+    jobs = []
+    for input_path in input_files:
+        output_path = output_path_for(input_path, output_dir)
+        if not force and is_up_to_date(input_path, output_path, criteria):
+            log(f"- {os.path.basename(input_path)} (up to date)")
+            summaries.append({"input": input_path, "output": output_path, "status": "skipped"})
+        else:
+            jobs.append((input_path, output_path))
+
+    if not jobs:
+        return summaries
+
+    # Start the heaviest files first so one big file does not finish last
+    face_counts = {input_path: _face_count(input_path) for input_path, _ in jobs}
+    jobs.sort(key=lambda job: face_counts[job[0]], reverse=True)
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+    log(f"Processing {len(jobs)} file(s) with {workers} worker(s)...")
+
+    def finish(summary):
+        write_summary(summary)
+        summaries.append(summary)
+        name = os.path.basename(summary["input"])
+        if summary["status"] == "ok":
+            log(f"✓ {name}: {summary['faces']} faces in {summary['seconds']:.2f}s")
+        else:
+            log(f"✗ {name}: {summary['error']}")
+
+    init_args = (use_cache, cache_dir, cache_max_bytes, low_memory, rss_limit, parse_workers)
+    task_args = (orientation_criteria, coloring_criteria, profile, mesh_formats)
+    order = {job: index for index, job in enumerate(jobs)}
+    attempts = Counter()
+    remaining = jobs
+    while remaining:
+        shared = [job for job in remaining if attempts[job] < MAX_SHARED_ATTEMPTS]
+        broken = _run_pool(shared, min(workers, len(shared)), init_args, task_args, finish) if shared else []
+
+        for job in remaining:
+            if attempts[job] < MAX_SHARED_ATTEMPTS:
+                continue
+            if _run_pool([job], 1, init_args, task_args, finish):
+                input_path, output_path = job
+                finish({"input": input_path, "output": output_path, "status": "failed", "faces": 0,
+                        "seconds": 0.0, "error": "Worker process crashed", "criteria": criteria})
+
+        if broken:
+            log(f"A worker process crashed; retrying {len(broken)} unfinished file(s)")
+        for job in broken:
+            attempts[job] += 1
+        remaining = sorted(broken, key=order.get)
+
+    return summaries
@@ -0,0 +1,49 @@
+"""
+Helpers for shapes made of several solid bodies
+"""
+
+from core import occ_backend as occ
+
+
+def split_bodies(shape):
+    """Solids of shape, then its free shells, then its free faces grouped in one compound
+
+    A shape with neither solids nor free shells is returned as [shape].
+    """
+    bodies = _explore(shape, occ.TopAbs_SOLID)
+    shells = _explore(shape, occ.TopAbs_SHELL, occ.TopAbs_SOLID)
+    if not bodies and len(shells) <= 1:
+        return [shape]
+
+    bodies.extend(shells)
+    faces = _explore(shape, occ.TopAbs_FACE, occ.TopAbs_SHELL)
+    if faces:
+        bodies.append(make_compound(faces))
+    return bodies
+
+
+def _explore(shape, kind, avoid=None):
+    """Sub-shapes of shape of the given kind, skipping those inside an avoid sub-shape"""
+    if avoid is None:
+        explorer = occ.TopExp_Explorer(shape, kind)
+    else:
+        explorer = occ.TopExp_Explorer(shape, kind, avoid)
+    found = []
+    while explorer.More():
+        found.append(explorer.Current())
+        explorer.Next()
+    return found
+
+
+def make_compound(shapes):
+    """Group shapes into one compound; a single shape is returned as is"""
+    if len(shapes) == 1:
+        return shapes[0]
+
+    builder = occ.BRep_Builder()
+    compound = occ.TopoDS_Compound()
+    builder.MakeCompound(compound)
+    for shape in shapes:
+        builder.Add(compound, shape)
+    return compound
+
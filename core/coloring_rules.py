@@ -0,0 +1,173 @@
+"""
+Criteria-driven face coloring evaluated as vectorized masks over a FaceTable
+
+Every method returns (labels, palette): one palette index per face and an
+(k, 3) array of RGB colors in 0..1. Classification methods:
+
+    surface_type       one class per GeomAbs surface type
+    normal_direction   dominant axis of the face normal: +x -x +y -y +z -z
+    area_bands         area quantiles, `count` bands
+    height_bands       centroid height along `up_axis`, `count` equal bands
+
+and a rule list, first match wins:
+
+    {"method": "rules",
+     "up_axis": "z",
+     "rules": [
+         {"surface_type": "plane", "normal": "+z", "color": [0.9, 0.2, 0.2]},
+         {"surface_type": ["cylinder", "cone"], "color": [0.2, 0.4, 0.9]},
+         {"area_min": 1000.0, "height_max": 5.0, "color": [0.2, 0.8, 0.3]}
+     ],
+     "default": [0.7, 0.7, 0.7]}
+"""
+
+import numpy as np
+
+from core.face_table import SURFACE_TYPES
+from core.palette import distinct_palette
+
+AXES = {"x": 0, "y": 1, "z": 2}
+NORMAL_CLASSES = ("+x", "-x", "+y", "-y", "+z", "-z", "none")
+DEFAULT_RULE_COLOR = (0.7, 0.7, 0.7)
+RULE_KEYS = ("surface_type", "normal", "area_min", "area_max", "height_min", "height_max", "color")
+
+
+def classify_surface_type(face_table):
+    """Label every face by its surface type"""
+    return face_table.surface_type.astype(np.int32), len(SURFACE_TYPES)
+
+
+def classify_normal_direction(face_table):
+    """Label every face by the dominant axis and sign of its normal"""
+    normal = face_table.normal
+    axis = np.argmax(np.abs(normal), axis=1)
+    negative = np.take_along_axis(normal, axis[:, None], axis=1)[:, 0] < 0
+    labels = (2 * axis + negative).astype(np.int32)
+    # Faces without a defined normal
+    labels[~np.any(normal, axis=1)] = len(NORMAL_CLASSES) - 1
+    return labels, len(NORMAL_CLASSES)
+
+
+def classify_area_bands(face_table, bands):
+    """Label every face by its area quantile band"""
+    if len(face_table) == 0:
+        return np.zeros(0, dtype=np.int32), bands
+    edges = np.quantile(face_table.area, np.linspace(0, 1, bands + 1)[1:-1])
+    return np.searchsorted(edges, face_table.area, side="right").astype(np.int32), bands
+
+
+def classify_height_bands(face_table, bands, up_axis="z"):
+    """Label every face by equal-width bands of its centroid height"""
+    height = face_table.centroid[:, AXES[up_axis]]
+    if len(height) == 0:
+        return np.zeros(0, dtype=np.int32), bands
+    low, high = height.min(), height.max()
+    if high <= low:
+        return np.zeros(len(height), dtype=np.int32), bands
+    labels = ((height - low) / (high - low) * bands).astype(np.int32)
+    return np.minimum(labels, bands - 1), bands
+
+
+def _as_list(value):
+    return value if isinstance(value, (list, tuple)) else [value]
+
+
+def validate_rules(rules, up_axis="z"):
+    """Raise ValueError naming the first rule that cannot be evaluated and what it allows"""
+    if up_axis not in AXES:
+        raise ValueError(f"Unknown up_axis {up_axis!r}; expected one of {', '.join(AXES)}")
+    if not isinstance(rules, (list, tuple)):
+        raise ValueError("Coloring rules must be a list of rule objects")
+
+    for index, rule in enumerate(rules):
+        where = f"Coloring rule {index + 1} {rule!r}"
+        if not isinstance(rule, dict):
+            raise ValueError(f"{where}: a rule must be an object")
+        unknown = set(rule) - set(RULE_KEYS)
+        if unknown:
+            raise ValueError(f"{where}: unknown key(s) {', '.join(sorted(unknown))}; "
+                             f"expected {', '.join(RULE_KEYS)}")
+        for key, allowed in (("surface_type", SURFACE_TYPES), ("normal", NORMAL_CLASSES)):
+            for name in _as_list(rule.get(key, [])):
+                if name not in allowed:
+                    raise ValueError(f"{where}: unknown {key} {name!r}; expected one of {', '.join(allowed)}")
+        for key in ("area_min", "area_max", "height_min", "height_max"):
+            if key in rule and (isinstance(rule[key], bool) or not isinstance(rule[key], (int, float))):
+                raise ValueError(f"{where}: {key} must be a number")
+        if "color" in rule:
+            color = rule["color"]
+            if (not isinstance(color, (list, tuple)) or len(color) != 3
+                    or not all(isinstance(c, (int, float)) and 0 <= c <= 1 for c in color)):
+                raise ValueError(f"{where}: color must be three numbers in 0..1")
+
+
+def rule_mask(face_table, rule, up_axis="z", normal_labels=None):
+    """Boolean mask of the faces matched by one rule"""
+    mask = np.ones(len(face_table), dtype=bool)
+
+    if "surface_type" in rule:
+        codes = [SURFACE_TYPES.index(name) for name in _as_list(rule["surface_type"])]
+        mask &= np.isin(face_table.surface_type, codes)
+
+    if "normal" in rule:
+        if normal_labels is None:
+            normal_labels, _ = classify_normal_direction(face_table)
+        codes = [NORMAL_CLASSES.index(name) for name in _as_list(rule["normal"])]
+        mask &= np.isin(normal_labels, codes)
+
+    if "area_min" in rule:
+        mask &= face_table.area >= rule["area_min"]
+    if "area_max" in rule:
+        mask &= face_table.area <= rule["area_max"]
+
+    height = face_table.centroid[:, AXES[up_axis]]
+    if "height_min" in rule:
+        mask &= height >= rule["height_min"]
+    if "height_max" in rule:
+        mask &= height <= rule["height_max"]
+
+    return mask
+
+
+def evaluate_rules(face_table, rules, default=DEFAULT_RULE_COLOR, up_axis="z"):
+    """Apply a rule list, first match wins; unmatched faces get the default color"""
+    validate_rules(rules, up_axis)
+    labels = np.full(len(face_table), len(rules), dtype=np.int32)
+    normal_labels = None
+    if any("normal" in rule for rule in rules):
+        normal_labels, _ = classify_normal_direction(face_table)
+
+    # Later rules are applied first so that earlier rules overwrite them
+    for index in range(len(rules) - 1, -1, -1):
+        labels[rule_mask(face_table, rules[index], up_axis, normal_labels)] = index
+
+    palette = np.array([rule.get("color", default) for rule in rules] + [default], dtype=float)
+    return labels, palette
+
+
+CLASSIFIERS = {
+    "surface_type": lambda table, criteria: classify_surface_type(table),
+    "normal_direction": lambda table, criteria: classify_normal_direction(table),
+    "area_bands": lambda table, criteria: classify_area_bands(table, criteria.get("count", 5)),
+    "height_bands": lambda table, criteria: classify_height_bands(
+        table, criteria.get("count", 5), criteria.get("up_axis", "z")),
+}
+
+METHODS = tuple(CLASSIFIERS) + ("rules",)
+
+
+def evaluate(face_table, criteria):
+    """Evaluate a classification method or rule list; returns (labels, palette)"""
+    method = criteria.get("method")
+    if method == "rules":
+        return evaluate_rules(
+            face_table,
+            criteria.get("rules", []),
+            criteria.get("default", DEFAULT_RULE_COLOR),
+            criteria.get("up_axis", "z"),
+        )
+
+    if method not in CLASSIFIERS:
+        raise ValueError(f"Unknown coloring method: {method}")
+    labels, classes = CLASSIFIERS[method](face_table, criteria)
+    return labels, distinct_palette(classes)
@@ -0,0 +1,395 @@
+"""
+Array-based index of the entities of a STEP file, parsed in parallel
+
+The file is memory-mapped and its DATA section cut into one chunk per
+worker process. Each process finds the statement ends (';' outside string
+literals) of its chunk with NumPy and reads the head of every statement,
+giving three arrays: entity ids, type codes and byte offsets. Merged, they
+form an EntityTable that the pre-scanner (step_scan) and the color patcher
+(step_patcher) use instead of scanning the text again.
+
+Whether a chunk starts inside a string follows from the parity of the
+quotes before it ('' escapes count twice and cancel out), so chunks are
+cut exactly without a serial pass over the text. Quotes inside
+/* comments */ are not expected in the DATA section and are not handled.
+
+The table does not replace STEPControl_Reader.ReadFile, which builds its
+own model from the text; StepProcessor(parse_workers=N) builds it while
+ReadFile runs.
+"""
+
+import mmap
+import multiprocessing
+import os
+import re
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from core.step_scan import complex_components
+
+# Chunks smaller than this are not worth a process of their own
+MIN_CHUNK_SIZE = 16 * 1024 * 1024
+
+# Bytes read (and searched with NumPy) at once inside a chunk
+BLOCK_SIZE = 16 * 1024 * 1024
+
+# Type name of a complex entity: its component names joined by this
+COMPONENT_SEPARATOR = " "
+
+_QUOTE = ord("'")
+_SEMICOLON = ord(";")
+_HASH = ord("#")
+_EQUALS = ord("=")
+_OPEN = ord("(")
+_CLOSE = ord(")")
+
+_SPACE = np.zeros(256, dtype=bool)
+_SPACE[list(b" \t\r\n")] = True
+_DIGIT = np.zeros(256, dtype=bool)
+_DIGIT[ord("0"):ord("9") + 1] = True
+_UPPER = np.zeros(256, dtype=bool)
+_UPPER[ord("A"):ord("Z") + 1] = True
+_NAME = _UPPER | _DIGIT
+_NAME[ord("_")] = True
+
+# Statement heads parsed with NumPy may not read further than this past the
+# last head of a block; longer heads go through _HEAD_RE
+HEAD_MARGIN = 4096
+
+# Type names are hashed in windows of WORD_WIDTH bytes, up to NAME_WIDTH bytes;
+# longer ones go through _HEAD_RE
+NAME_WIDTH = 64
+WORD_WIDTH = 32
+
+_MIX_MULTIPLIER = np.uint64(0xBF58476D1CE4E5B9)
+
+_HEAD_RE = re.compile(rb"\s*#(\d+)\s*=\s*(?:([A-Z][A-Z0-9_]*)|\()")
+
+
+class EntityTable:
+    """Entity ids, type codes and statement offsets of a STEP file, in file order
+
+    The statement of row i is the bytes offsets[i]:ends[i] of the file, its
+    type type_names[type_codes[i]].
+    """
+
+    def __init__(self, path, ids, type_codes, offsets, ends, type_names, data_start, data_end):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.ids = ids
+        self.type_codes = type_codes
+        self.offsets = offsets
+        self.ends = ends
+        self.type_names = type_names
+        self.data_start = data_start
+        self.data_end = data_end  # Offset of the ENDSEC closing the DATA section
+        self.seconds = 0.0
+        self.workers = 1
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def max_id(self):
+        return int(self.ids.max()) if len(self.ids) else 0
+
+    def components(self, code):
+        """Type names of one type code; several for a complex entity"""
+        return self.type_names[code].split(COMPONENT_SEPARATOR)
+
+    def type_counts(self):
+        """Counter of entities per type name, complex entities counted once per component"""
+        counts = Counter()
+        for code, count in enumerate(np.bincount(self.type_codes, minlength=len(self.type_names)).tolist()):
+            if count:
+                for name in self.components(code):
+                    counts[name] += count
+        return counts
+
+    def rows_of(self, name):
+        """Rows whose entity is of type name, alone or as a complex component"""
+        codes = [code for code in range(len(self.type_names)) if name in self.components(code)]
+        return np.flatnonzero(np.isin(self.type_codes, codes))
+
+
+def data_section(mm):
+    """(start, end) of the DATA section: after 'DATA;' up to the final ENDSEC"""
+    header_end = mm.find(b"ENDSEC;")
+    start = mm.find(b"DATA;", max(header_end, 0))
+    trailer = mm.rfind(b"END-ISO-10303-21")
+    if start < 0 or trailer < 0:
+        raise Exception("No DATA section found")
+    start += len(b"DATA;")
+    end = mm.rfind(b"ENDSEC", start, trailer)
+    return start, (trailer if end < 0 else end)
+
+
+def _count_quotes(path, start, end):
+    """Number of quote bytes in path[start:end]"""
+    count = 0
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for pos in range(start, end, BLOCK_SIZE):
+            count += mm[pos:min(pos + BLOCK_SIZE, end)].count(b"'")
+    return count
+
+
+def _statement_ends(mm, start, end, in_string):
+    """Offsets just past every ';' outside strings in mm[start:end]"""
+    ends = []
+    for pos in range(start, end, BLOCK_SIZE):
+        block = np.frombuffer(mm[pos:min(pos + BLOCK_SIZE, end)], dtype=np.uint8)
+        quotes = np.flatnonzero(block == _QUOTE)
+        semicolons = np.flatnonzero(block == _SEMICOLON)
+        outside = (np.searchsorted(quotes, semicolons) + in_string) % 2 == 0
+        ends.append(semicolons[outside] + pos + 1)
+        in_string = (in_string + len(quotes)) % 2
+    return np.concatenate(ends) if ends else np.zeros(0, dtype=np.int64)
+
+
+def _skip(buffer, pos, table):
+    """Positions advanced past the bytes of table (a 256 bool lookup)"""
+    pos = pos.copy()
+    rows = np.flatnonzero(table[buffer[pos]])
+    while len(rows):
+        pos[rows] += 1
+        rows = rows[table[buffer[pos[rows]]]]
+    return pos
+
+
+def _parse_heads(buffer, heads):
+    """Vectorized parse of the statement heads '#id = ' at heads of buffer
+
+    Returns (ids, offsets of the '#', offsets after the '=', kind) where
+    kind is 1 for a simple entity (a name follows), 2 for a complex one (a
+    '(' follows) and 0 for no statement.
+    """
+    last = len(buffer) - 1
+    offsets = _skip(buffer, heads, _SPACE)
+    pos = np.minimum(offsets + 1, last)
+
+    ids = np.zeros(len(heads), dtype=np.int64)
+    kind = np.zeros(len(heads), dtype=np.int8)
+    rows = np.flatnonzero((buffer[offsets] == _HASH) & _DIGIT[buffer[pos]])
+    kind[rows] = 1
+    while len(rows):
+        ids[rows] = ids[rows] * 10 + buffer[pos[rows]] - ord("0")
+        pos[rows] += 1
+        rows = rows[_DIGIT[buffer[pos[rows]]]]
+
+    pos = _skip(buffer, pos, _SPACE)
+    kind[buffer[pos] != _EQUALS] = 0
+    pos = _skip(buffer, np.minimum(pos + 1, last), _SPACE)
+    kind[(kind == 1) & (buffer[pos] == _OPEN)] = 2
+    kind[(kind == 1) & ~_UPPER[buffer[pos]]] = 0
+    return ids, offsets, pos, kind
+
+
+def _mix(h):
+    return (h ^ (h >> np.uint64(31))) * _MIX_MULTIPLIER
+
+
+def _name_hashes(buffer, starts, ends):
+    """Hash of each name buffer[starts[i]:ends[i]], or 0 when it is not a plain name of NAME_WIDTH bytes at most"""
+    lengths = ends - starts
+    hashes = np.zeros(len(starts), dtype=np.uint64)
+    windows = np.lib.stride_tricks.sliding_window_view(buffer, WORD_WIDTH)
+    offsets = np.arange(WORD_WIDTH)
+    rows = np.flatnonzero(lengths > 0)
+    with np.errstate(over="ignore"):
+        for skip in range(0, NAME_WIDTH, WORD_WIDTH):
+            window = windows[starts[rows] + skip]
+            window[offsets >= (lengths[rows] - skip)[:, None]] = 0
+            h = hashes[rows]
+            for word in window.view("<u8").T:
+                h = _mix(h ^ word)
+            hashes[rows] = h
+            rows = rows[lengths[rows] > skip + WORD_WIDTH]
+    plain = (lengths > 0) & (lengths <= NAME_WIDTH) & _UPPER[buffer[starts]] & _NAME[buffer[ends - 1]]
+    hashes[~plain] = 0
+    return hashes
+
+
+def _name(buffer, start, end):
+    return buffer[start:end].tobytes().decode("ascii")
+
+
+def _type_codes(buffer, hashes, starts, ends, names):
+    """Type code of each hashed name, adding new names to names; -1 for hash 0"""
+    codes = np.full(len(hashes), -1, dtype=np.int32)
+    rows = np.flatnonzero(hashes)
+    keys, first, inverse = np.unique(hashes[rows], return_index=True, return_inverse=True)
+    lookup = np.array([names.setdefault(_name(buffer, starts[row], ends[row]), len(names))
+                       for row in rows[first].tolist()], dtype=np.int32)
+    codes[rows] = lookup[inverse.reshape(-1)]
+    return codes
+
+
+def _complex_codes(buffer, opens, closes, names):
+    """Type codes of the complex entities buffer[opens[i]:closes[i]], from their '('
+
+    The components are the names before the parentheses that open depth 2,
+    outside strings. Entities without a plain component name get -1.
+    """
+    # Quotes and parentheses are the consecutive bytes 39 to 41
+    tokens = np.flatnonzero(buffer - np.uint8(_QUOTE) <= _CLOSE - _QUOTE)
+    rows = np.searchsorted(opens, tokens, side="right") - 1
+    inside = (rows >= 0) & (tokens < closes[np.maximum(rows, 0)])
+    tokens, rows = tokens[inside], rows[inside]
+    text = buffer[tokens]
+
+    # Each statement holds whole strings and balanced parentheses, so both
+    # running sums restart at every statement
+    in_string = np.cumsum(text == _QUOTE) % 2 == 1
+    step = (text == _OPEN).astype(np.int32) - (text == _CLOSE)
+    step[in_string] = 0
+    component = (np.cumsum(step) == 2) & (step == 1)
+    ends, rows = tokens[component], rows[component]
+
+    # Walk back from each '(' over the name characters; a window clamped at
+    # the start of the buffer runs past the '(', so those bytes count as name
+    first = np.maximum(ends - NAME_WIDTH, 0)
+    window = np.lib.stride_tricks.sliding_window_view(buffer, NAME_WIDTH)[first]
+    name = _NAME[window] | (np.arange(NAME_WIDTH) >= (ends - first)[:, None])
+    starts = first + NAME_WIDTH - np.argmin(name[:, ::-1], axis=1)
+    hashes = _name_hashes(buffer, starts, ends)
+
+    # One key per entity: its component hashes, mixed and summed
+    keys = np.zeros(len(opens), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        np.add.at(keys, rows, _mix(hashes))
+    counts = np.bincount(rows, minlength=len(opens))
+    plain = np.bincount(rows, weights=hashes == 0, minlength=len(opens)) == 0
+
+    codes = np.full(len(opens), -1, dtype=np.int32)
+    styled = np.flatnonzero((counts > 0) & plain)
+    unique_keys, first, inverse = np.unique(keys[styled], return_index=True, return_inverse=True)
+    first_component = np.searchsorted(rows, styled[first])
+    lookup = np.empty(len(unique_keys), dtype=np.int32)
+    for key_index, (row, begin) in enumerate(zip(styled[first].tolist(), first_component.tolist())):
+        name = COMPONENT_SEPARATOR.join(_name(buffer, starts[i], ends[i])
+                                        for i in range(begin, begin + counts[row]))
+        lookup[key_index] = names.setdefault(name, len(names))
+    codes[styled] = lookup[inverse.reshape(-1)]
+    return codes
+
+
+def _parse_chunk(path, start, end, in_string, first, data_end):
+    """Tokenize the statements that begin after the statement ends of one chunk
+
+    first also parses a statement at start (the beginning of the DATA
+    section). Returns (ids, local type codes, offsets, ends, type names).
+    """
+    columns = []
+    names = {}
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        ends = _statement_ends(mm, start, end, in_string)
+        heads = np.concatenate([[start], ends]) if first else ends
+        heads = heads[heads < data_end]
+
+        for block_start in range(start, end, BLOCK_SIZE):
+            block_heads = heads[(heads >= block_start) & (heads < block_start + BLOCK_SIZE)]
+            if not len(block_heads):
+                continue
+            base = int(block_heads[0])
+            limit = min(int(block_heads[-1]) + HEAD_MARGIN, data_end) - base
+            # Zero padding stops every scan inside the buffer
+            buffer = np.frombuffer(mm[base:base + limit] + b"\0" * NAME_WIDTH, dtype=np.uint8)
+            ids, offsets, starts, kind = _parse_heads(buffer, block_heads - base)
+            codes = np.zeros(len(block_heads), dtype=np.int32)
+
+            # Statements that run past the buffer, or past the chunk, are
+            # parsed one by one below
+            closes = np.append(ends - base, limit + 1)[np.searchsorted(ends, block_heads, side="right")]
+            kind[(kind != 0) & (closes > limit)] = 3
+
+            # A simple entity's name runs up to the next '('; the padding
+            # byte at the end fails the name checks of _name_hashes
+            simple = np.flatnonzero(kind == 1)
+            parens = np.append(np.flatnonzero(buffer == _OPEN), len(buffer) - 1)
+            name_ends = parens[np.searchsorted(parens, starts[simple])]
+            hashes = _name_hashes(buffer, starts[simple], name_ends)
+            codes[simple] = _type_codes(buffer, hashes, starts[simple], name_ends, names)
+            complex_rows = np.flatnonzero(kind == 2)
+            if len(complex_rows):
+                codes[complex_rows] = _complex_codes(buffer, starts[complex_rows], closes[complex_rows], names)
+            kind[(kind != 0) & (codes < 0)] = 3
+
+            for row in np.flatnonzero(kind == 3).tolist():
+                match = _HEAD_RE.match(mm, int(block_heads[row]), data_end)
+                if match is None:
+                    kind[row] = 0
+                    continue
+                name = match.group(2)
+                if name is None:
+                    components, _ = complex_components(mm, match.end(), data_end)
+                    name = COMPONENT_SEPARATOR.join(components)
+                else:
+                    name = name.decode("ascii")
+                ids[row] = int(match.group(1))
+                codes[row] = names.setdefault(name, len(names))
+
+            valid = kind != 0
+            columns.append((ids[valid], codes[valid], offsets[valid] + base))
+
+    if columns:
+        ids, codes, offsets = (np.concatenate(column) for column in zip(*columns))
+    else:
+        ids = offsets = np.zeros(0, dtype=np.int64)
+        codes = np.zeros(0, dtype=np.int32)
+    return ids, codes, offsets, ends, list(names)
+
+
+def _chunk_bounds(start, end, workers):
+    """Cut points of [start, end) into at most workers chunks of MIN_CHUNK_SIZE or more"""
+    count = max(1, min(workers, (end - start) // MIN_CHUNK_SIZE))
+    return np.linspace(start, end, count + 1).astype(np.int64).tolist()
+
+
+def parse_entity_table(path, workers=None):
+    """EntityTable of a STEP file, tokenized on up to workers processes
+
+    Small files, and calls from daemonic processes (which cannot start
+    children), are parsed in the calling process.
+    """
+    start_time = time.perf_counter()
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        data_start, data_end = data_section(mm)
+        header_quotes = mm[:data_start].count(b"'")
+
+    workers = workers or os.cpu_count() or 1
+    if multiprocessing.current_process().daemon:
+        workers = 1
+    bounds = _chunk_bounds(data_start, data_end, workers)
+    spans = list(zip(bounds[:-1], bounds[1:]))
+
+    if len(spans) == 1:
+        chunks = [_parse_chunk(path, data_start, data_end, header_quotes % 2, True, data_end)]
+    else:
+        # spawn, like the worker pools: forking a process that runs Qt or OCCT threads is unsafe
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=len(spans), mp_context=context) as executor:
+            quotes = list(executor.map(_count_quotes, [path] * len(spans), *zip(*spans)))
+            in_string = (header_quotes + np.cumsum([0] + quotes[:-1])) % 2
+            futures = [executor.submit(_parse_chunk, path, start, end, int(parity), index == 0, data_end)
+                       for index, ((start, end), parity) in enumerate(zip(spans, in_string))]
+            chunks = [future.result() for future in futures]
+
+    # Map the type codes of each chunk to codes of the whole file
+    type_codes = {}
+    for _, codes, _, _, names in chunks:
+        lookup = np.array([type_codes.setdefault(name, len(type_codes)) for name in names], dtype=np.int32)
+        if len(codes):
+            codes[:] = lookup[codes]
+
+    ids, codes, offsets, statement_ends = (np.concatenate(column) for column in list(zip(*chunks))[:4])
+    # A statement ends at the first statement end after its head
+    ends = statement_ends[np.minimum(np.searchsorted(statement_ends, offsets, side="right"),
+                                     len(statement_ends) - 1)] if len(statement_ends) else offsets
+
+    table = EntityTable(path, ids, codes, offsets, ends, list(type_codes), data_start, data_end)
+    table.workers = len(spans)
+    table.seconds = time.perf_counter() - start_time
+    return table
@@ -0,0 +1,130 @@
+"""
+Face adjacency graph stored as CSR arrays, and graph coloring on it
+"""
+
+import heapq
+
+import numpy as np
+
+from core import occ_backend as occ
+
+
+class FaceGraph:
+    """Undirected face adjacency graph in compressed sparse row form
+
+    The neighbors of face i are indices[indptr[i]:indptr[i + 1]], using the
+    same face numbering as FaceTable.
+    """
+
+    def __init__(self, indptr, indices):
+        self.indptr = indptr
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @property
+    def degree(self):
+        return np.diff(self.indptr).astype(np.int32)
+
+    def neighbors(self, face_index):
+        return self.indices[self.indptr[face_index]:self.indptr[face_index + 1]]
+
+    @classmethod
+    def from_pairs(cls, pairs, count):
+        """Build the graph from an (m, 2) array of adjacent face index pairs"""
+        pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+        pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+
+        # Both directions, deduplicated and sorted by source face
+        src = np.concatenate([pairs[:, 0], pairs[:, 1]])
+        dst = np.concatenate([pairs[:, 1], pairs[:, 0]])
+        keys = np.unique(src * count + dst)
+        src, dst = keys // count, keys % count
+
+        indptr = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=count), out=indptr[1:])
+        return cls(indptr, dst.astype(np.int32))
+
+    @classmethod
+    def from_shape(cls, shape, face_map):
+        """Build the graph of faces sharing an edge, numbered like face_map"""
+        edge_map = occ.TopTools_IndexedDataMapOfShapeListOfShape()
+        occ.static(occ.TopExp, "MapShapesAndAncestors")(shape, occ.TopAbs_EDGE, occ.TopAbs_FACE, edge_map)
+
+        pairs = []
+        for i in range(1, edge_map.Extent() + 1):
+            indices = [face_map.FindIndex(face) - 1 for face in occ.iter_shape_list(edge_map.FindFromIndex(i))]
+            # Usually exactly two faces per edge; non-manifold edges give more
+            for a in range(len(indices)):
+                for b in range(a + 1, len(indices)):
+                    pairs.append((indices[a], indices[b]))
+
+        return cls.from_pairs(pairs, face_map.Extent())
+
+    @classmethod
+    def concatenate(cls, graphs):
+        """Disjoint union of the graphs of several bodies"""
+        indptr = [np.zeros(1, dtype=np.int64)]
+        indices = [np.zeros(0, dtype=np.int32)]
+        edge_offset = 0
+        face_offset = 0
+        for graph in graphs:
+            indptr.append(graph.indptr[1:] + edge_offset)
+            indices.append(graph.indices + face_offset)
+            edge_offset += len(graph.indices)
+            face_offset += len(graph)
+        return cls(np.concatenate(indptr), np.concatenate(indices).astype(np.int32))
+
+
+def greedy_coloring(graph):
+    """Largest-degree-first greedy coloring; returns one color index per face"""
+    indptr = graph.indptr.tolist()
+    indices = graph.indices.tolist()
+    colors = [-1] * len(graph)
+
+    for face in np.argsort(-graph.degree, kind="stable").tolist():
+        used = {colors[n] for n in indices[indptr[face]:indptr[face + 1]]}
+        color = 0
+        while color in used:
+            color += 1
+        colors[face] = color
+
+    return np.array(colors, dtype=np.int32)
+
+
+def dsatur_coloring(graph):
+    """DSatur coloring; returns one color index per face
+
+    Faces are colored in order of saturation (number of distinct colors
+    among their neighbors), ties broken by degree, each taking the smallest
+    color not used by a neighbor. This usually needs fewer colors than
+    plain greedy coloring.
+    """
+    count = len(graph)
+    indptr = graph.indptr.tolist()
+    indices = graph.indices.tolist()
+    degree = graph.degree.tolist()
+    colors = [-1] * count
+    neighbor_colors = [set() for _ in range(count)]
+
+    heap = [(0, -degree[face], face) for face in range(count)]
+    heapq.heapify(heap)
+    while heap:
+        saturation, _, face = heapq.heappop(heap)
+        # Skip stale heap entries
+        if colors[face] >= 0 or -saturation != len(neighbor_colors[face]):
+            continue
+
+        used = neighbor_colors[face]
+        color = 0
+        while color in used:
+            color += 1
+        colors[face] = color
+
+        for neighbor in indices[indptr[face]:indptr[face + 1]]:
+            if colors[neighbor] < 0 and color not in neighbor_colors[neighbor]:
+                neighbor_colors[neighbor].add(color)
+                heapq.heappush(heap, (-len(neighbor_colors[neighbor]), -degree[neighbor], neighbor))
+
+    return np.array(colors, dtype=np.int32)
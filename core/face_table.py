@@ -0,0 +1,130 @@
+"""
+Per-face geometric features packed into NumPy arrays
+"""
+
+import numpy as np
+
+from core import occ_backend as occ
+from core.face_graph import FaceGraph
+
+# Names of the GeomAbs_SurfaceType values, in enum order
+SURFACE_TYPES = (
+    "plane",
+    "cylinder",
+    "cone",
+    "sphere",
+    "torus",
+    "bezier",
+    "bspline",
+    "revolution",
+    "extrusion",
+    "offset",
+    "other",
+)
+
+# Normals are averaged over an N x N grid of UV samples
+NORMAL_SAMPLES = 3
+
+
+class FaceTable:
+    """Packed per-face arrays for every face of a shape
+
+    Row i of every array describes faces[i]:
+        area          (n,)    float64
+        centroid      (n, 3)  float64
+        normal        (n, 3)  float64, unit average normal, respecting face orientation
+        surface_type  (n,)    int8, index into SURFACE_TYPES
+        bbox          (n, 6)  float64, xmin ymin zmin xmax ymax zmax
+        degree        (n,)    int32, number of distinct neighboring faces
+
+    graph is the FaceGraph of faces sharing an edge, in the same numbering.
+    """
+
+    def __init__(self, faces, area, centroid, normal, surface_type, bbox, graph):
+        self.faces = faces
+        self.area = area
+        self.centroid = centroid
+        self.normal = normal
+        self.surface_type = surface_type
+        self.bbox = bbox
+        self.graph = graph
+        self.degree = graph.degree
+
+    def __len__(self):
+        return len(self.faces)
+
+    @classmethod
+    def concatenate(cls, tables):
+        """Stack the tables of several bodies into one; no tables give an empty table"""
+        faces = [face for table in tables for face in table.faces]
+        return cls(
+            faces,
+            np.concatenate([np.zeros(0)] + [table.area for table in tables]),
+            np.concatenate([np.zeros((0, 3))] + [table.centroid for table in tables]).reshape(-1, 3),
+            np.concatenate([np.zeros((0, 3))] + [table.normal for table in tables]).reshape(-1, 3),
+            np.concatenate([np.zeros(0, dtype=np.int8)] + [table.surface_type for table in tables]),
+            np.concatenate([np.zeros((0, 6))] + [table.bbox for table in tables]).reshape(-1, 6),
+            FaceGraph.concatenate([table.graph for table in tables]),
+        )
+
+    @classmethod
+    def from_shape(cls, shape):
+        """Build the table in a single pass over the faces of shape"""
+        face_map = occ.TopTools_IndexedMapOfShape()
+        occ.static(occ.TopExp, "MapShapes")(shape, occ.TopAbs_FACE, face_map)
+        count = face_map.Extent()
+
+        faces = []
+        area = np.zeros(count)
+        centroid = np.zeros((count, 3))
+        normal = np.zeros((count, 3))
+        surface_type = np.zeros(count, dtype=np.int8)
+        bbox = np.zeros((count, 6))
+
+        surface_properties = occ.static(occ.BRepGProp, "SurfaceProperties")
+        add_to_box = occ.static(occ.BRepBndLib, "Add")
+        for i in range(count):
+            face = occ.to_face(face_map.FindKey(i + 1))
+            faces.append(face)
+
+            props = occ.GProp_GProps()
+            surface_properties(face, props)
+            area[i] = props.Mass()
+            center = props.CentreOfMass()
+            centroid[i] = (center.X(), center.Y(), center.Z())
+
+            adaptor = occ.BRepAdaptor_Surface(face, True)
+            surface_type[i] = int(adaptor.GetType())
+            normal[i] = _average_normal(adaptor, face.Orientation() == occ.TopAbs_REVERSED)
+
+            box = occ.Bnd_Box()
+            add_to_box(face, box)
+            if not box.IsVoid():
+                lo, hi = box.CornerMin(), box.CornerMax()
+                bbox[i] = (lo.X(), lo.Y(), lo.Z(), hi.X(), hi.Y(), hi.Z())
+
+        graph = FaceGraph.from_shape(shape, face_map)
+
+        return cls(faces, area, centroid, normal, surface_type, bbox, graph)
+
+
+def _average_normal(adaptor, reversed_face):
+    """Average unit normal over a grid of UV samples of the face"""
+    u0, u1 = adaptor.FirstUParameter(), adaptor.LastUParameter()
+    v0, v1 = adaptor.FirstVParameter(), adaptor.LastVParameter()
+    steps = (np.arange(NORMAL_SAMPLES) + 0.5) / NORMAL_SAMPLES
+
+    total = np.zeros(3)
+    for s in steps:
+        for t in steps:
+            props = occ.BRepLProp_SLProps(adaptor, u0 + s * (u1 - u0), v0 + t * (v1 - v0), 1, 1e-7)
+            if props.IsNormalDefined():
+                n = props.Normal()
+                total += (n.X(), n.Y(), n.Z())
+
+    length = np.linalg.norm(total)
+    if length == 0:
+        return total
+    total /= length
+    return -total if reversed_face else total
+
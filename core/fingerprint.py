@@ -0,0 +1,118 @@
+"""
+Stable face fingerprints and color map sidecar files
+
+A face fingerprint is a 64-bit hash of its surface type and its quantized
+area, centroid and normal, computed over all rows of a FaceTable at once.
+Unlike TopoDS_Face objects, fingerprints survive a reload and match the
+unchanged faces of a new revision of a part.
+
+A color map stores the RGB of every fingerprint of a colored file as a
+sorted structured .npy array next to the output. It is opened memory-mapped
+and joined with the fingerprints of another file by binary search, so a
+revision keeps the colors of its unchanged faces.
+"""
+
+import os
+
+import numpy as np
+
+# Quantization steps: positions in model units (mm), normals as unit vector
+# components, areas as a relative step on a log scale
+POSITION_QUANTUM = 1e-3
+NORMAL_QUANTUM = 1e-3
+AREA_RELATIVE_QUANTUM = 1e-4
+
+COLOR_MAP_SUFFIX = ".colors.npy"
+
+# One color map record: fingerprint and RGB in 0..1
+COLOR_MAP_DTYPE = np.dtype([("fingerprint", "<u8"), ("rgb", "<f4", (3,))])
+
+_SEED = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _mix(h):
+    """splitmix64 finalizer over a uint64 array"""
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+
+def _quantize(values, quantum):
+    """Integer bins of values as uint64 bit patterns"""
+    return np.rint(np.asarray(values, dtype=float) / quantum).astype(np.int64).view(np.uint64)
+
+
+def face_fingerprints(face_table, matrix=None):
+    """uint64 fingerprint of every face of face_table
+
+    matrix is the 3x4 [rotation | translation] the shape was oriented with;
+    centroids and normals are taken back to the frame of the file, so the
+    fingerprints do not depend on the orientation.
+    """
+    centroid = face_table.centroid
+    normal = face_table.normal
+    if matrix is not None:
+        rotation, translation = matrix[:, :3], matrix[:, 3]
+        centroid = (centroid - translation) @ rotation
+        normal = normal @ rotation
+
+    log_area = np.log(np.maximum(face_table.area, np.finfo(float).tiny))
+    columns = [
+        face_table.surface_type.astype(np.uint64),
+        _quantize(log_area, np.log1p(AREA_RELATIVE_QUANTUM)),
+    ]
+    columns.extend(_quantize(centroid[:, axis], POSITION_QUANTUM) for axis in range(3))
+    columns.extend(_quantize(normal[:, axis], NORMAL_QUANTUM) for axis in range(3))
+
+    with np.errstate(over="ignore"):
+        h = np.full(len(face_table.area), _SEED, dtype=np.uint64)
+        for column in columns:
+            h = _mix(h ^ column)
+    return h
+
+
+def color_map_path(output_path):
+    """Sidecar color map path of a colored output file"""
+    return os.path.splitext(output_path)[0] + COLOR_MAP_SUFFIX
+
+
+def write_color_map(path, fingerprints, face_rgb):
+    """Store the RGB of each fingerprint, sorted by fingerprint"""
+    order = np.argsort(fingerprints, kind="stable")
+    records = np.empty(len(order), dtype=COLOR_MAP_DTYPE)
+    records["fingerprint"] = fingerprints[order]
+    records["rgb"] = np.asarray(face_rgb, dtype=float).reshape(-1, 3)[order]
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, records)
+    os.replace(tmp_path, path)
+
+
+def read_color_map(path):
+    """Memory-mapped color map records of a sidecar file"""
+    try:
+        records = np.load(path, mmap_mode="r")
+    except (OSError, ValueError) as e:
+        raise Exception(f"Cannot read color map {path}: {e}")
+    if records.dtype != COLOR_MAP_DTYPE:
+        raise Exception(f"Not a color map: {path}")
+    return records
+
+
+def lookup_colors(records, fingerprints):
+    """(rgb (n, 3), found (n,) bool) of fingerprints in a color map
+
+    Faces whose fingerprint is not in the map get found=False and black.
+    """
+    keys = np.ascontiguousarray(records["fingerprint"])
+    rgb = np.zeros((len(fingerprints), 3))
+    if len(keys) == 0:
+        return rgb, np.zeros(len(fingerprints), dtype=bool)
+
+    # Searching with sorted queries walks the keys in order: a merge join, cache friendly
+    order = np.argsort(fingerprints)
+    index = np.empty(len(fingerprints), dtype=np.intp)
+    index[order] = np.minimum(np.searchsorted(keys, fingerprints[order]), len(keys) - 1)
+    found = keys[index] == fingerprints
+    rgb[found] = records["rgb"][index[found]]
+    return rgb, found
@@ -0,0 +1,171 @@
+"""
+Colored triangle mesh export to binary glTF 2.0 (.glb) and binary PLY
+
+Both writers take a tessellation.Mesh and the (n, 3) per-face RGB of the
+coloring, and stream NumPy buffers straight to disk.
+"""
+
+import json
+import os
+import struct
+
+import numpy as np
+
+MESH_FORMATS = ("glb", "ply")
+
+# glTF chunk and component type constants
+GLB_MAGIC = 0x46546C67
+GLB_JSON_CHUNK = 0x4E4F534A
+GLB_BIN_CHUNK = 0x004E4942
+GLTF_FLOAT = 5126
+GLTF_UNSIGNED_INT = 5125
+GLTF_ARRAY_BUFFER = 34962
+GLTF_ELEMENT_ARRAY_BUFFER = 34963
+
+# STEP is Z-up in millimeters, glTF is Y-up in meters: -90 degrees about X, then scale
+GLTF_ROOT_ROTATION = [-0.5 ** 0.5, 0.0, 0.0, 0.5 ** 0.5]
+GLTF_ROOT_SCALE = [0.001, 0.001, 0.001]
+
+
+def mesh_format(path):
+    """Export format of a path from its extension"""
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    if ext not in MESH_FORMATS:
+        raise ValueError(f"Unsupported mesh format: .{ext} (expected one of {', '.join(MESH_FORMATS)})")
+    return ext
+
+
+def srgb_to_linear(rgb):
+    """Linear RGB of sRGB components in 0..1 (glTF material factors are linear)"""
+    rgb = np.asarray(rgb, dtype=float)
+    return np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+
+
+def triangles_by_material(mesh, face_rgb):
+    """(materials (k, 3) RGB, triangles grouped by material, per-material triangle counts)
+
+    Faces of the same color share one material; triangles are reordered so
+    that the triangles of each material are contiguous.
+    """
+    materials, face_material = np.unique(np.asarray(face_rgb, dtype=float).reshape(-1, 3),
+                                         axis=0, return_inverse=True)
+    triangle_material = face_material.reshape(-1)[mesh.face_ids]
+    order = np.argsort(triangle_material, kind="stable")
+    counts = np.bincount(triangle_material, minlength=len(materials))
+    return materials, mesh.triangles[order], counts
+
+
+def _pad(data, fill):
+    """Pad bytes to a multiple of 4 as GLB chunks require"""
+    return data + fill * (-len(data) % 4)
+
+
+def write_glb(mesh, face_rgb, output_path):
+    """Write a binary glTF with one shared vertex buffer and one primitive per material"""
+    if len(mesh) == 0:
+        # A glTF mesh needs at least one primitive
+        raise ValueError(f"Cannot write {output_path}: the mesh has no triangles")
+    materials, triangles, counts = triangles_by_material(mesh, face_rgb)
+    vertices = np.ascontiguousarray(mesh.vertices, dtype="<f4")
+    indices = np.ascontiguousarray(triangles, dtype="<u4")
+
+    positions_bytes = vertices.nbytes
+    buffer_length = positions_bytes + indices.nbytes
+
+    accessors = [{
+        "bufferView": 0,
+        "componentType": GLTF_FLOAT,
+        "count": len(vertices),
+        "type": "VEC3",
+        "min": vertices.min(axis=0).tolist() if len(vertices) else [0.0, 0.0, 0.0],
+        "max": vertices.max(axis=0).tolist() if len(vertices) else [0.0, 0.0, 0.0],
+    }]
+    primitives = []
+    offset = 0
+    for material, count in enumerate(counts.tolist()):
+        if count == 0:
+            continue
+        primitives.append({"attributes": {"POSITION": 0}, "indices": len(accessors), "material": material})
+        accessors.append({
+            "bufferView": 1,
+            "byteOffset": offset * 12,
+            "componentType": GLTF_UNSIGNED_INT,
+            "count": count * 3,
+            "type": "SCALAR",
+        })
+        offset += count
+
+    document = {
+        "asset": {"version": "2.0", "generator": "STEP File Face Coloring Tool"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"mesh": 0, "rotation": GLTF_ROOT_ROTATION, "scale": GLTF_ROOT_SCALE}],
+        "meshes": [{"primitives": primitives}],
+        "materials": [
+            {"pbrMetallicRoughness": {"baseColorFactor": rgb.tolist() + [1.0],
+                                      "metallicFactor": 0.0, "roughnessFactor": 0.8}}
+            for rgb in srgb_to_linear(materials)
+        ],
+        "accessors": accessors,
+        "bufferViews": [
+            {"buffer": 0, "byteOffset": 0, "byteLength": positions_bytes, "target": GLTF_ARRAY_BUFFER},
+            {"buffer": 0, "byteOffset": positions_bytes, "byteLength": indices.nbytes,
+             "target": GLTF_ELEMENT_ARRAY_BUFFER},
+        ],
+        "buffers": [{"byteLength": buffer_length}],
+    }
+    json_chunk = _pad(json.dumps(document, separators=(",", ":")).encode("utf-8"), b" ")
+    bin_padding = -buffer_length % 4
+    total = 12 + 8 + len(json_chunk) + 8 + buffer_length + bin_padding
+
+    with open(output_path, "wb") as f:
+        f.write(struct.pack("<III", GLB_MAGIC, 2, total))
+        f.write(struct.pack("<II", len(json_chunk), GLB_JSON_CHUNK))
+        f.write(json_chunk)
+        f.write(struct.pack("<II", buffer_length + bin_padding, GLB_BIN_CHUNK))
+        vertices.tofile(f)
+        indices.tofile(f)
+        f.write(b"\0" * bin_padding)
+
+
+# One PLY face record: vertex count, three vertex indices and an RGB color
+PLY_FACE_DTYPE = np.dtype([("count", "u1"), ("indices", "<i4", (3,)), ("color", "u1", (3,))])
+
+
+def write_ply(mesh, face_rgb, output_path):
+    """Write a binary little-endian PLY with per-triangle colors"""
+    faces = np.empty(len(mesh.triangles), dtype=PLY_FACE_DTYPE)
+    faces["count"] = 3
+    faces["indices"] = mesh.triangles
+    mesh.triangle_colors(np.asarray(face_rgb, dtype=float), out=faces["color"])
+
+    header = (
+        "ply\n"
+        "format binary_little_endian 1.0\n"
+        "comment STEP File Face Coloring Tool\n"
+        f"element vertex {len(mesh.vertices)}\n"
+        "property float x\n"
+        "property float y\n"
+        "property float z\n"
+        f"element face {len(faces)}\n"
+        "property list uchar int vertex_indices\n"
+        "property uchar red\n"
+        "property uchar green\n"
+        "property uchar blue\n"
+        "end_header\n"
+    )
+    with open(output_path, "wb") as f:
+        f.write(header.encode("ascii"))
+        np.ascontiguousarray(mesh.vertices, dtype="<f4").tofile(f)
+        faces.tofile(f)
+
+
+WRITERS = {
+    "glb": write_glb,
+    "ply": write_ply,
+}
+
+
+def write_mesh(mesh, face_rgb, output_path):
+    """Write a colored mesh in the format given by the extension of output_path"""
+    WRITERS[mesh_format(output_path)](mesh, face_rgb, output_path)
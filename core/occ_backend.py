@@ -0,0 +1,116 @@
+"""
+Single place where the OCC Python binding is resolved
+
+Both cadquery-ocp (OCP) and pythonocc-core (OCC.Core) are supported. The
+binding is picked on first use and symbols are imported lazily, so
+
+    from core import occ_backend as occ
+
+costs nothing; the OCCT libraries are only loaded when a symbol such as
+occ.STEPControl_Reader is first accessed. OCCT names are looked up in the
+package named by their prefix (gp_Trsf -> gp, TopAbs_FACE -> TopAbs,
+BRepBndLib -> BRepBndLib).
+"""
+
+import importlib
+
+# (distribution name, package prefix), in order of preference
+BINDINGS = (
+    ("cadquery-ocp", "OCP"),
+    ("pythonocc-core", "OCC.Core"),
+)
+
+_binding = None
+_face_cast = None
+
+
+def _resolve():
+    """Find the installed binding and return its package prefix"""
+    global _binding
+    if _binding is None:
+        for name, prefix in BINDINGS:
+            try:
+                importlib.import_module(prefix)
+            except ImportError:
+                continue
+            _binding = (name, prefix)
+            break
+        else:
+            raise ImportError("No OCC/OCCP module found. Please install cadquery-ocp or pythonocc-core")
+    return _binding[1]
+
+
+def binding_name():
+    """Distribution name of the binding in use"""
+    _resolve()
+    return _binding[0]
+
+
+def is_available():
+    """True when one of the bindings can be imported"""
+    try:
+        _resolve()
+    except ImportError:
+        return False
+    return True
+
+
+def module(package):
+    """Import an OCCT package, e.g. module('STEPControl')"""
+    return importlib.import_module(f"{_resolve()}.{package}")
+
+
+def symbol(name):
+    """Import an OCCT symbol by name, e.g. symbol('STEPControl_Reader')"""
+    return getattr(module(name.split("_")[0]), name)
+
+
+def __getattr__(name):
+    # Only OCCT-style names are resolved; anything private is a real miss
+    if name.startswith("_"):
+        raise AttributeError(name)
+    try:
+        value = symbol(name)
+    except (ImportError, AttributeError) as e:
+        raise AttributeError(f"OCC symbol {name} not found: {e}") from e
+    globals()[name] = value
+    return value
+
+
+def static(cls, name):
+    """Return a static OCCT method under either binding's naming"""
+    # OCP exposes static methods with an '_s' suffix
+    method = getattr(cls, name + "_s", None)
+    if method is None:
+        method = getattr(cls, name)
+    return method
+
+
+def to_face(shape):
+    """Downcast a TopoDS_Shape to a TopoDS_Face"""
+    global _face_cast
+    if _face_cast is None:
+        topods = module("TopoDS")
+        if hasattr(topods, "topods"):
+            _face_cast = topods.topods.Face
+        else:
+            _face_cast = static(topods.TopoDS, "Face")
+    return _face_cast(shape)
+
+
+def iter_shape_list(shape_list):
+    """Iterate over a TopTools_ListOfShape"""
+    iterator = symbol("TopTools_ListIteratorOfListOfShape")(shape_list)
+    while iterator.More():
+        yield iterator.Value()
+        iterator.Next()
+
+
+def rgb_color(r, g, b):
+    """Quantity_Color from RGB components in 0..1 as they should appear in files"""
+    quantity = module("Quantity")
+    # sRGB matches the values written to STEP by OCCT 7.5+; older versions only have RGB
+    color_type = getattr(quantity, "Quantity_TOC_sRGB", None)
+    if color_type is None:
+        color_type = quantity.Quantity_TOC_RGB
+    return quantity.Quantity_Color(float(r), float(g), float(b), color_type)
@@ -0,0 +1,95 @@
+"""
+Principal-axes orientation from the inertia tensor of a shape
+"""
+
+import numpy as np
+
+from core import occ_backend as occ
+
+# Below this volume the shape is treated as a shell and the face table is used
+MIN_VOLUME = 1e-9
+
+
+def volume_inertia(shape):
+    """Return (volume, center, 3x3 inertia tensor about the center) of a shape"""
+    props = occ.GProp_GProps()
+    occ.static(occ.BRepGProp, "VolumeProperties")(shape, props)
+
+    center = props.CentreOfMass()
+    matrix = props.MatrixOfInertia()
+    tensor = np.array([[matrix.Value(i, j) for j in (1, 2, 3)] for i in (1, 2, 3)])
+
+    return props.Mass(), np.array([center.X(), center.Y(), center.Z()]), tensor
+
+
+def surface_inertia(face_table):
+    """Area-weighted inertia of the face centroids, for shapes without volume"""
+    area = face_table.area
+    total = area.sum()
+    if total <= 0:
+        return 0.0, np.zeros(3), np.eye(3)
+
+    center = (face_table.centroid * area[:, None]).sum(axis=0) / total
+    offsets = face_table.centroid - center
+    second_moment = np.einsum("i,ij,ik->jk", area, offsets, offsets)
+    tensor = np.trace(second_moment) * np.eye(3) - second_moment
+
+    return total, center, tensor
+
+
+def combine_inertia(parts):
+    """Combine (mass, center, tensor) of several bodies with the parallel axis theorem"""
+    total = sum(mass for mass, _, _ in parts)
+    if total <= 0:
+        return 0.0, np.zeros(3), np.eye(3)
+
+    center = sum(mass * part_center for mass, part_center, _ in parts) / total
+    tensor = np.zeros((3, 3))
+    for mass, part_center, part_tensor in parts:
+        d = part_center - center
+        tensor += part_tensor + mass * (d @ d * np.eye(3) - np.outer(d, d))
+
+    return total, center, tensor
+
+
+def principal_axes(tensor):
+    """Right-handed rotation whose rows are the principal axes
+
+    Axes are ordered by increasing moment of inertia, so the longest extent of
+    the part ends up along X. Each axis is signed so that its largest component
+    is positive, which keeps the result stable between runs.
+    """
+    _, vectors = np.linalg.eigh(tensor)
+    axes = vectors.T.copy()
+
+    for axis in axes:
+        if axis[np.argmax(np.abs(axis))] < 0:
+            axis *= -1
+
+    if np.linalg.det(axes) < 0:
+        axes[2] *= -1
+
+    return axes
+
+
+def principal_axes_matrix(center, tensor):
+    """3x4 [rotation | translation] moving center to the origin and the principal axes onto XYZ"""
+    rotation = principal_axes(tensor)
+    return np.column_stack([rotation, -rotation @ center])
+
+
+def principal_axes_trsf(center, tensor):
+    """Build the gp_Trsf moving center to the origin and the principal axes onto XYZ"""
+    return matrix_trsf(principal_axes_matrix(center, tensor))
+
+
+def matrix_trsf(matrix):
+    """gp_Trsf of a 3x4 [rotation | translation] matrix"""
+    trsf = occ.gp_Trsf()
+    trsf.SetValues(*np.asarray(matrix, dtype=float).ravel().tolist())
+    return trsf
+
+
+def apply_trsf(shape, trsf):
+    """Apply a rigid transform without copying the underlying geometry"""
+    return occ.BRepBuilderAPI_Transform(shape, trsf, False).Shape()
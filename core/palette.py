@@ -0,0 +1,148 @@
+"""
+Deterministic palettes and the palette-indexed coloring of faces
+
+Palettes are (count, 3) sRGB arrays in 0..1, generated in one vectorized
+step and cached per (method, count, seed). Hues are spaced in CIELAB
+(LCh) so that neighboring colors differ by about the same perceived amount:
+
+    random     golden-ratio hue sequence from a seeded start hue, cycling
+               through three lightness levels
+    distinct   evenly spaced hues at one lightness
+    gradient   blue to red
+    palette    the five basic colors
+
+The same seed always gives the same colors, so reruns write identical
+files.
+"""
+
+import functools
+
+import numpy as np
+
+from core import occ_backend as occ
+
+DEFAULT_SEED = 0
+
+# Golden ratio conjugate: successive hues never land close to earlier ones
+GOLDEN_RATIO_CONJUGATE = (5 ** 0.5 - 1) / 2
+
+# LCh lightness levels and chroma of generated colors
+RANDOM_LIGHTNESS = (70.0, 55.0, 85.0)
+DISTINCT_LIGHTNESS = 70.0
+CHROMA = 50.0
+
+BASIC_PALETTE = (
+    (1.0, 0.0, 0.0),  # Red
+    (0.0, 1.0, 0.0),  # Green
+    (0.0, 0.0, 1.0),  # Blue
+    (1.0, 1.0, 0.0),  # Yellow
+    (1.0, 0.0, 1.0),  # Magenta
+)
+
+# D65 reference white and the XYZ to linear sRGB matrix
+_WHITE = np.array([0.95047, 1.0, 1.08883])
+_XYZ_TO_LINEAR_RGB = np.array([
+    [3.2404542, -1.5371385, -0.4985314],
+    [-0.9692660, 1.8760108, 0.0415560],
+    [0.0556434, -0.2040259, 1.0572252],
+])
+
+
+def lch_to_srgb(lightness, chroma, hue):
+    """(n, 3) sRGB in 0..1 of CIE LCh colors (hue in turns); out-of-gamut colors are clipped"""
+    angle = 2 * np.pi * np.asarray(hue, dtype=float)
+    fy = (np.asarray(lightness, dtype=float) + 16) / 116
+    f = np.column_stack(np.broadcast_arrays(fy + chroma * np.cos(angle) / 500, fy,
+                                            fy - chroma * np.sin(angle) / 200))
+    xyz = np.where(f > 6 / 29, f ** 3, 3 * (6 / 29) ** 2 * (f - 4 / 29)) * _WHITE
+
+    linear = np.clip(xyz @ _XYZ_TO_LINEAR_RGB.T, 0.0, 1.0)
+    return np.where(linear <= 0.0031308, 12.92 * linear, 1.055 * linear ** (1 / 2.4) - 0.055)
+
+
+def random_palette(count, seed=DEFAULT_SEED):
+    """Golden-ratio hues from a start hue drawn from seed"""
+    start = np.random.default_rng(seed).random()
+    steps = np.arange(count)
+    hue = (start + steps * GOLDEN_RATIO_CONJUGATE) % 1.0
+    lightness = np.asarray(RANDOM_LIGHTNESS)[steps % len(RANDOM_LIGHTNESS)]
+    return lch_to_srgb(lightness, CHROMA, hue)
+
+
+def distinct_palette(count):
+    """Evenly spaced hues"""
+    return lch_to_srgb(DISTINCT_LIGHTNESS, CHROMA, np.arange(count) / max(count, 1))
+
+
+def gradient_palette(count):
+    """Blue to red"""
+    t = np.arange(count) / (count - 1) if count > 1 else np.zeros(count)
+    return np.column_stack([t, 0.5 * (1 - np.abs(2 * t - 1)), 1 - t])
+
+
+@functools.lru_cache(maxsize=256)
+def _cached_palette(method, count, seed):
+    if method == "random":
+        colors = random_palette(count, seed)
+    elif method == "distinct":
+        colors = distinct_palette(count)
+    elif method == "gradient":
+        colors = gradient_palette(count)
+    else:
+        colors = np.array(BASIC_PALETTE)
+    colors = np.ascontiguousarray(colors, dtype=float).reshape(-1, 3)
+    colors.flags.writeable = False  # Shared between callers
+    return colors
+
+
+def make_palette(method, count, seed=None):
+    """Cached read-only (count, 3) palette; unknown methods give the basic palette"""
+    if method not in ("random", "distinct", "gradient"):
+        method, count = "palette", len(BASIC_PALETTE)
+    if method != "random":
+        seed = None
+    elif seed is None:
+        seed = DEFAULT_SEED
+    return _cached_palette(method, max(int(count), 1), seed)
+
+
+def rgb_keys(rgb):
+    """One int64 key per RGB row (components to 6 decimals), for grouping equal colors"""
+    levels = np.rint(np.clip(np.asarray(rgb, dtype=float).reshape(-1, 3), 0.0, 1.0) * 1e6).astype(np.int64)
+    return (levels[:, 0] << 40) | (levels[:, 1] << 20) | levels[:, 2]
+
+
+def keys_rgb(keys):
+    """(n, 3) RGB of rgb_keys"""
+    return np.column_stack([keys >> 40, (keys >> 20) & 0xFFFFF, keys & 0xFFFFF]) / 1e6
+
+
+class FaceColoring:
+    """Palette index of every face and the (k, 3) RGB palette
+
+    The color of face i is palette[labels[i]]; per-face RGB is a single
+    gather instead of a per-face mapping.
+    """
+
+    def __init__(self, faces, labels, palette):
+        self.faces = faces
+        self.labels = np.asarray(labels, dtype=np.int32).reshape(-1)
+        self.palette = np.asarray(palette, dtype=float).reshape(-1, 3)
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def rgb(self):
+        """(n, 3) RGB of every face"""
+        return self.palette[self.labels]
+
+    def override(self, mask, rgb):
+        """Give the faces of mask the colors rgb (one row per masked face)"""
+        keys, inverse = np.unique(rgb_keys(rgb), return_inverse=True)
+        self.labels[mask] = len(self.palette) + inverse.reshape(-1)
+        self.palette = np.concatenate([self.palette, keys_rgb(keys)])
+
+    def quantity_colors(self):
+        """Quantity_Color of every palette entry"""
+        return [occ.rgb_color(*rgb) for rgb in self.palette.tolist()]
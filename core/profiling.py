@@ -0,0 +1,181 @@
+"""
+Per-stage timing and memory profiling of the processing pipeline
+"""
+
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# Pipeline stages in execution order
+STAGES = ("read", "transfer", "orient", "features", "color", "write")
+
+
+def _windows_memory_counters():
+    """PROCESS_MEMORY_COUNTERS of the current process (Windows only)"""
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+        return None
+    return counters
+
+
+def _proc_status_bytes(field):
+    """A kB field of /proc/self/status in bytes, or None"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process (since the last reset_peak_rss), or None if unknown"""
+    if sys.platform == "win32":
+        counters = _windows_memory_counters()
+        return counters.PeakWorkingSetSize if counters else None
+    # VmHWM follows reset_peak_rss; ru_maxrss never goes down
+    peak = _proc_status_bytes("VmHWM")
+    if peak is not None:
+        return peak
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def reset_peak_rss():
+    """Restart peak RSS tracking from the current RSS; False where unsupported (non-Linux)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def current_rss_bytes():
+    """Current resident set size of this process, or None if unknown"""
+    if sys.platform == "win32":
+        counters = _windows_memory_counters()
+        return counters.WorkingSetSize if counters else None
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return peak_rss_bytes()
+
+
+class PipelineProfiler:
+    """Times pipeline stages and reports them through a callback
+
+    The callback receives one dict per event:
+        {"stage": name, "event": "start" | "end", "progress": 0-100,
+         "seconds": float (end only), "peak_rss": bytes (end only)}
+    plus any info given to or added inside stage() on end events (e.g. reused=True).
+    A stage whose block raises still gets its record and end event, with
+    "error": message.
+
+    Where the peak RSS can be reset (Linux), peak_rss of a stage is the peak
+    during that stage alone; elsewhere it is the process peak so far.
+    """
+
+    def __init__(self, callback=None, stages=STAGES):
+        self.callback = callback
+        self.stages = list(stages)
+        self.records = []
+        self.start = time.perf_counter()
+        self.peak_rss = peak_rss_bytes()
+
+    def _emit(self, event):
+        if self.callback is not None:
+            self.callback(event)
+
+    def _progress(self, done):
+        return int(100 * done / max(1, len(self.stages)))
+
+    @contextmanager
+    def stage(self, name, **info):
+        """Time the enclosed block as stage name
+
+        Yields the info dict, so the block can add results known only at the
+        end (e.g. a triangle count) to the record and the end event. An
+        exception from the block is recorded as error and re-raised.
+        """
+        index = self.stages.index(name) if name in self.stages else len(self.records)
+        self._emit({"stage": name, "event": "start", "progress": self._progress(index)})
+
+        reset_peak_rss()
+        stage_start = time.perf_counter()
+        try:
+            yield info
+        except Exception as e:
+            info["error"] = str(e) or type(e).__name__
+            raise
+        finally:
+            seconds = time.perf_counter() - stage_start
+
+            stage_peak = peak_rss_bytes()
+            if stage_peak is not None:
+                self.peak_rss = max(self.peak_rss or 0, stage_peak)
+            record = {
+                "stage": name,
+                "offset": stage_start - self.start,
+                "seconds": seconds,
+                "peak_rss": stage_peak,
+                "rss": current_rss_bytes(),
+            }
+            record.update(info)
+            self.records.append(record)
+
+            event = {"stage": name, "event": "end", "progress": self._progress(index + 1),
+                     "seconds": seconds, "peak_rss": record["peak_rss"]}
+            event.update(info)
+            self._emit(event)
+
+    def stage_seconds(self):
+        """Mapping of stage name to seconds"""
+        return {record["stage"]: record["seconds"] for record in self.records}
+
+    def report(self):
+        """Structured report of all recorded stages"""
+        return {
+            "total_seconds": time.perf_counter() - self.start,
+            "peak_rss": max(self.peak_rss or 0, peak_rss_bytes() or 0) or None,
+            "stages": list(self.records),
+        }
+
+    def write_report(self, path):
+        """Write the JSON report to path and a flamegraph-compatible '.folded' file next to it"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
+
+        # Collapsed stack format understood by flamegraph.pl / speedscope (microseconds)
+        with open(os.path.splitext(path)[0] + ".folded", "w", encoding="utf-8") as f:
+            for record in self.records:
+                f.write(f"process_file;{record['stage']} {int(record['seconds'] * 1e6)}\n")
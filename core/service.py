@@ -0,0 +1,356 @@
+"""
+Local processing service: a small HTTP/JSON job API over a warm worker pool
+
+Runs on asyncio over TCP or a Unix socket. Jobs run on a WorkerPool, so
+neither Python start-up nor the OCCT import is paid per file.
+
+    POST   /jobs               {"input": path, "output": path?, "orientation": "auto",
+                                "coloring": {...}, "mesh_formats": ["glb"]}
+                               -> 202 {"job_id": ..., "status": "pending"}
+    GET    /jobs/<id>          -> job status
+    GET    /jobs/<id>/result   -> 200 with the summary once finished, else 202;
+                                  ?wait=<seconds> waits for the job to finish
+    DELETE /jobs/<id>          -> cancel
+    GET    /health             -> worker count and jobs per state
+
+A submission whose file content (SHA-256), criteria and output match a
+pending, running or successful job returns that job instead of a new one.
+More than max_pending queued jobs gives 429, too many open connections
+503, both with Retry-After.
+"""
+
+import asyncio
+import collections
+import json
+import os
+import re
+import signal
+import traceback
+from urllib.parse import urlsplit, parse_qs
+
+from core.batch import output_path_for
+from core.mesh_export import MESH_FORMATS
+from core.shape_cache import file_sha256
+from core.worker_pool import WorkerPool, PENDING, RUNNING, OK, FINISHED
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_PENDING = 256
+DEFAULT_MAX_CONNECTIONS = 64
+DEFAULT_JOBS_KEPT = 10000
+
+MAX_BODY_BYTES = 1024 * 1024
+MAX_HEADERS = 64
+READ_TIMEOUT = 30.0
+MAX_WAIT_SECONDS = 300.0
+RETRY_AFTER_SECONDS = 1
+
+REASONS = {
+    200: "OK",
+    202: "Accepted",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    413: "Payload Too Large",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+JOB_PATH = re.compile(r"^/jobs/(\d+)(/result)?$")
+
+
+class HttpError(Exception):
+    """Error answered with an HTTP status and a JSON error body"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class JobService:
+    """Job bookkeeping between HTTP requests and the worker pool"""
+
+    def __init__(self, workers=None, output_dir=None, max_pending=DEFAULT_MAX_PENDING,
+                 jobs_kept=DEFAULT_JOBS_KEPT, **pool_options):
+        self.workers = workers
+        self.output_dir = output_dir
+        self.max_pending = max_pending
+        self.jobs_kept = jobs_kept
+        self.pool_options = pool_options
+        self.pool = None
+        self.loop = None
+
+        self._done_events = {}
+        self._job_of_key = {}
+        self._key_of_job = {}
+        self._finished = collections.deque()
+
+    def start(self):
+        """Start the worker pool; call from the running event loop"""
+        self.loop = asyncio.get_running_loop()
+        if self.output_dir is not None:
+            os.makedirs(self.output_dir, exist_ok=True)
+        self.pool = WorkerPool(workers=self.workers, on_update=self._on_update, **self.pool_options)
+
+    def close(self):
+        """Stop the worker pool"""
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def _on_update(self, job, kind, payload):
+        # Called on the pool's dispatcher thread
+        if kind == "finished":
+            self.loop.call_soon_threadsafe(self._job_finished, job.job_id)
+
+    def _job_finished(self, job_id):
+        event = self._done_events.get(job_id)
+        if event is not None:
+            event.set()
+
+        # Keep a bounded history of finished jobs
+        self._finished.append(job_id)
+        while len(self._finished) > self.jobs_kept:
+            old = self._finished.popleft()
+            self.pool.forget(old)
+            self._done_events.pop(old, None)
+            key = self._key_of_job.pop(old, None)
+            if key is not None and self._job_of_key.get(key) == old:
+                del self._job_of_key[key]
+
+    def _job(self, job_id):
+        job = self.pool.jobs.get(job_id)
+        if job is None:
+            raise HttpError(404, f"Unknown job {job_id}")
+        return job
+
+    def describe(self, job, deduplicated=False):
+        """JSON-able status of a job"""
+        status = {
+            "job_id": job.job_id,
+            "status": job.status,
+            "progress": job.progress,
+            "stage": job.stage,
+            "input": job.input_path,
+            "output": job.output_path,
+            "elapsed": round(job.elapsed, 4),
+            "error": job.error,
+        }
+        if deduplicated:
+            status["deduplicated"] = True
+        return status
+
+    async def submit(self, request):
+        """Queue a job from a request body; returns (http status, body)"""
+        input_path = request.get("input")
+        if not isinstance(input_path, str) or not os.path.isfile(input_path):
+            raise HttpError(400, f"Input file not found: {input_path}")
+        input_path = os.path.abspath(input_path)
+        output_path = os.path.abspath(request.get("output") or output_path_for(input_path, self.output_dir))
+        orientation = request.get("orientation", "auto")
+        coloring = request.get("coloring", {"method": "random"})
+        mesh_formats = request.get("mesh_formats", [])
+        if not isinstance(coloring, dict) or not isinstance(mesh_formats, list):
+            raise HttpError(400, "'coloring' must be an object and 'mesh_formats' a list")
+        unsupported = [fmt for fmt in mesh_formats if fmt not in MESH_FORMATS]
+        if unsupported:
+            raise HttpError(400, f"Unsupported mesh formats {unsupported}; expected {', '.join(MESH_FORMATS)}")
+
+        if self.pool.counts()[PENDING] >= self.max_pending:
+            raise HttpError(429, f"Queue is full ({self.max_pending} pending jobs)")
+
+        # Same content, criteria and output as a live or successful job: return that job
+        digest = await self.loop.run_in_executor(None, file_sha256, input_path)
+        key = json.dumps([digest, output_path, orientation, coloring, sorted(mesh_formats)],
+                         sort_keys=True)
+        existing = self.pool.jobs.get(self._job_of_key.get(key))
+        if existing is not None and (existing.status in (PENDING, RUNNING) or
+                                     (existing.status == OK and os.path.exists(existing.output_path))):
+            return 200, self.describe(existing, deduplicated=True)
+
+        job = self.pool.submit(input_path, output_path, orientation, coloring, mesh_formats)
+        self._done_events[job.job_id] = asyncio.Event()
+        self._job_of_key[key] = job.job_id
+        self._key_of_job[job.job_id] = key
+        return 202, self.describe(job)
+
+    def status(self, job_id):
+        return 200, self.describe(self._job(job_id))
+
+    async def result(self, job_id, wait=0.0):
+        """Summary of a finished job, waiting up to wait seconds for it"""
+        job = self._job(job_id)
+        if job.status not in FINISHED and wait > 0:
+            event = self._done_events.setdefault(job_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(event.wait(), min(wait, MAX_WAIT_SECONDS))
+            except asyncio.TimeoutError:
+                pass
+
+        body = self.describe(job)
+        if job.status not in FINISHED:
+            return 202, body
+        body["summary"] = job.summary
+        return 200, body
+
+    def cancel(self, job_id):
+        job = self._job(job_id)
+        if not self.pool.cancel(job_id):
+            raise HttpError(409, f"Job {job_id} has already finished")
+        return 200, self.describe(job)
+
+    def health(self):
+        return 200, {"workers": self.pool.size, "jobs": dict(self.pool.counts())}
+
+
+class HttpServer:
+    """Minimal HTTP/1.1 front end (JSON bodies, keep-alive) for a JobService"""
+
+    def __init__(self, service, max_connections=DEFAULT_MAX_CONNECTIONS, log=print):
+        self.service = service
+        self.max_connections = max_connections
+        self.log = log
+        self.connections = 0
+
+    async def route(self, method, target, body):
+        """Dispatch one request; returns (http status, body)"""
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+
+        if url.path == "/health" and method == "GET":
+            return self.service.health()
+        if url.path == "/jobs":
+            if method != "POST":
+                raise HttpError(405, "Use POST to submit a job")
+            try:
+                request = json.loads(body or b"{}")
+            except ValueError as e:
+                raise HttpError(400, f"Invalid JSON: {e}")
+            if not isinstance(request, dict):
+                raise HttpError(400, "Request body must be a JSON object")
+            return await self.service.submit(request)
+
+        match = JOB_PATH.match(url.path)
+        if match is None:
+            raise HttpError(404, f"No such endpoint: {url.path}")
+        job_id = int(match.group(1))
+        if match.group(2):
+            if method != "GET":
+                raise HttpError(405, "Use GET for results")
+            try:
+                wait = float(query.get("wait", ["0"])[0])
+            except ValueError:
+                raise HttpError(400, "'wait' must be a number of seconds")
+            return await self.service.result(job_id, wait)
+        if method == "GET":
+            return self.service.status(job_id)
+        if method == "DELETE":
+            return self.service.cancel(job_id)
+        raise HttpError(405, f"{method} is not supported on jobs")
+
+    async def read_request(self, reader):
+        """(method, target, headers, body) of the next request, or None at end of stream"""
+        line = await asyncio.wait_for(reader.readline(), READ_TIMEOUT)
+        if not line.strip():
+            return None
+        try:
+            method, target, _ = line.decode("latin-1").split()
+        except ValueError:
+            raise HttpError(400, "Malformed request line")
+
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), READ_TIMEOUT)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise HttpError(400, "Too many headers")
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            raise HttpError(400, "Invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, f"Request body over {MAX_BODY_BYTES} bytes")
+        body = await asyncio.wait_for(reader.readexactly(length), READ_TIMEOUT) if length else b""
+        return method.upper(), target, headers, body
+
+    def write_response(self, writer, status, body, keep_alive):
+        payload = json.dumps(body).encode("utf-8")
+        headers = [
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(payload)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if status in (429, 503):
+            headers.append(f"Retry-After: {RETRY_AFTER_SECONDS}")
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + payload)
+
+    async def handle(self, reader, writer):
+        """Serve the requests of one connection"""
+        self.connections += 1
+        try:
+            if self.connections > self.max_connections:
+                self.write_response(writer, 503, {"error": "Too many connections"}, False)
+                return
+
+            while True:
+                keep_alive = False
+                try:
+                    request = await self.read_request(reader)
+                    if request is None:
+                        return
+                    method, target, headers, body = request
+                    keep_alive = headers.get("connection", "keep-alive").lower() != "close"
+                    status, response = await self.route(method, target, body)
+                except HttpError as e:
+                    status, response = e.status, {"error": str(e)}
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    return
+                except Exception as e:
+                    # Any other failure is the service's fault: answer it and keep serving
+                    self.log(f"Internal error: {e}\n{traceback.format_exc()}")
+                    status, response = 500, {"error": f"Internal error: {e}"}
+                self.write_response(writer, status, response, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    return
+        finally:
+            self.connections -= 1
+            try:
+                await writer.drain()
+                writer.close()
+            except ConnectionError:
+                pass
+
+
+async def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None,
+                max_connections=DEFAULT_MAX_CONNECTIONS, log=print):
+    """Run the service until cancelled"""
+    service.start()
+    server = HttpServer(service, max_connections, log)
+    try:
+        if socket_path:
+            listener = await asyncio.start_unix_server(server.handle, path=socket_path)
+            log(f"Serving on unix:{socket_path} with {service.pool.size} worker(s)")
+        else:
+            listener = await asyncio.start_server(server.handle, host, port)
+            log(f"Serving on http://{host}:{port} with {service.pool.size} worker(s)")
+        # Stop cleanly on SIGTERM too (not available on Windows event loops)
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, listener.close)
+        except (NotImplementedError, AttributeError):
+            pass
+        async with listener:
+            try:
+                await listener.serve_forever()
+            except asyncio.CancelledError:
+                pass
+    finally:
+        service.close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
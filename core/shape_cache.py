@@ -0,0 +1,112 @@
+"""
+Persistent content-addressed cache of transferred shapes
+
+Shapes are stored in OCCT's binary BRep format under the SHA-256 of the
+STEP file plus the reader settings, so a file that was parsed once never
+has to go through STEPControl_Reader again.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+from core import occ_backend as occ
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "step-face-coloring", "shapes")
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3  # 2 GB
+CACHE_EXTENSION = ".bbrep"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(file_path):
+    """SHA-256 of a file's content, read in chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ShapeCache:
+    """On-disk LRU cache of shapes keyed by file content and reader settings"""
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or os.environ.get("STEP_COLORING_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key_for(self, file_path, settings=None):
+        """Cache key for a STEP file read with the given reader settings"""
+        digest = hashlib.sha256(file_sha256(file_path).encode("ascii"))
+        digest.update(json.dumps(settings or {}, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + CACHE_EXTENSION)
+
+    def get(self, key):
+        """Return the cached shape for key, or None on a miss"""
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+
+        shape = occ.TopoDS_Shape()
+        try:
+            ok = occ.static(occ.BinTools, "Read")(shape, path)
+        except Exception:
+            ok = False
+        if ok is False or shape.IsNull():
+            # Corrupt or truncated entry; drop it and treat as a miss
+            self._remove(path)
+            return None
+
+        # Mark as recently used for LRU eviction
+        os.utime(path, None)
+        return shape
+
+    def put(self, key, shape):
+        """Store a shape under key and evict old entries beyond max_bytes"""
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.cache_dir)
+        os.close(fd)
+        try:
+            occ.static(occ.BinTools, "Write")(shape, tmp_path)
+            # Atomic so that concurrent workers never see a partial file
+            os.replace(tmp_path, self._path(key))
+        finally:
+            self._remove(tmp_path)
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(CACHE_EXTENSION):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        """Remove every cached shape"""
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(CACHE_EXTENSION):
+                self._remove(entry.path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
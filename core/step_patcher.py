@@ -0,0 +1,285 @@
+"""
+Face colors added to a STEP file without re-exporting its geometry
+
+When the shape is not transformed, the colored file is the input file with
+a few presentation entities appended to its DATA section: one style chain
+(COLOUR_RGB ... PRESENTATION_STYLE_ASSIGNMENT) per distinct color, one
+STYLED_ITEM per face and one MECHANICAL_DESIGN_GEOMETRIC_PRESENTATION_REPRESENTATION
+per representation context, listing the styled faces of that context.
+
+The EntityTable of the input (see entity_table) gives the largest id in
+use and the records that matter: each face is followed up through its
+shell and solid to the shape representation holding it, whose context the
+presentation uses, and a face that already has a STYLED_ITEM gets that
+record rewritten in place instead of a second one. Every other entity is
+copied byte for byte, so the cost is close to a file copy instead of a
+full OCCT transfer and write.
+"""
+
+import mmap
+import os
+import re
+import time
+
+import numpy as np
+
+from core.entity_table import parse_entity_table
+from core.palette import rgb_keys, keys_rgb
+
+# Bytes copied per read
+COPY_CHUNK_SIZE = 16 * 1024 * 1024
+
+# AP203 first edition has no presentation entities to carry colors
+UNSTYLED_SCHEMAS = ("CONFIG_CONTROL_DESIGN",)
+
+# Representations whose items are the solids and shells holding the faces;
+# their last parameter is the context_of_items
+SHAPE_REPRESENTATIONS = (
+    "ADVANCED_BREP_SHAPE_REPRESENTATION",
+    "MANIFOLD_SURFACE_SHAPE_REPRESENTATION",
+    "FACETED_BREP_SHAPE_REPRESENTATION",
+    "GEOMETRICALLY_BOUNDED_SURFACE_SHAPE_REPRESENTATION",
+    "SHAPE_REPRESENTATION",
+)
+
+# Entities between a face and its shape representation
+FACE_CONTAINERS = (
+    "ORIENTED_FACE",
+    "CONNECTED_FACE_SET",
+    "CLOSED_SHELL",
+    "OPEN_SHELL",
+    "ORIENTED_CLOSED_SHELL",
+    "ORIENTED_OPEN_SHELL",
+    "MANIFOLD_SOLID_BREP",
+    "BREP_WITH_VOIDS",
+    "FACETED_BREP",
+    "SHELL_BASED_SURFACE_MODEL",
+)
+
+# Styled items listed per line of a presentation representation
+ITEMS_PER_LINE = 8
+
+_SCHEMA_RE = re.compile(rb"FILE_SCHEMA\s*\(\s*\(\s*'([^'\s]*)")
+_STRING_RE = re.compile(rb"'(?:[^']|'')*'")
+_REFERENCE_RE = re.compile(rb"#(\d+)")
+_DIMENSION_RE = re.compile(rb"GEOMETRIC_REPRESENTATION_CONTEXT\s*\(\s*(\d+)\s*\)")
+
+
+def face_entity_ids(reader, faces):
+    """STEP entity id (#n) of each face, from the transfer results of reader
+
+    Faces that do not come from a single file entity get id 0.
+    """
+    transfer_reader = reader.WS().TransferReader()
+    model = reader.StepModel()
+
+    ids = np.zeros(len(faces), dtype=np.int64)
+    for row, face in enumerate(faces):
+        entity = transfer_reader.EntityFromShapeResult(face, 1)
+        if entity is None or model.Number(entity) == 0:
+            continue
+        ident = model.IdentLabel(entity)
+        if ident <= 0:
+            raise Exception("The STEP model did not keep the entity ids of the file")
+        ids[row] = ident
+    return ids
+
+
+def _real(value):
+    """STEP REAL literal"""
+    return f"{value:.6f}".rstrip("0")
+
+
+def _references(record):
+    """Entity ids referenced by a statement, in order, outside string literals"""
+    params = _STRING_RE.sub(b"''", record[record.index(b"=") + 1:])
+    return [int(n) for n in _REFERENCE_RE.findall(params)]
+
+
+def _records(mm, table, names):
+    """{entity id: referenced ids} of the entities of the given types"""
+    rows = np.unique(np.concatenate([table.rows_of(name) for name in names]))
+    return {int(table.ids[row]): _references(mm[table.offsets[row]:table.ends[row]])
+            for row in rows.tolist()}
+
+
+def face_contexts(mm, table, face_ids):
+    """Context id of the shape representation holding each face, 0 where none does
+
+    Walks from every face up its containers (oriented face, shell, solid)
+    until a shape representation lists one of them as an item.
+    """
+    representations = _records(mm, table, SHAPE_REPRESENTATIONS)
+    parents = {}
+    for parent, children in _records(mm, table, FACE_CONTAINERS + SHAPE_REPRESENTATIONS).items():
+        for child in children:
+            parents.setdefault(child, parent)
+
+    contexts = np.zeros(len(face_ids), dtype=np.int64)
+    for row, entity in enumerate(face_ids.tolist()):
+        seen = set()
+        while entity in parents and entity not in seen:
+            seen.add(entity)
+            entity = parents[entity]
+            if entity in representations:
+                contexts[row] = representations[entity][-1]
+                break
+    return contexts
+
+
+def styled_items(mm, table):
+    """{styled entity id: row} of the plain STYLED_ITEM records of the file"""
+    styled = {}
+    for row in table.rows_of("STYLED_ITEM").tolist():
+        if table.type_names[table.type_codes[row]] != "STYLED_ITEM":
+            continue  # Complex entity, left alone
+        references = _references(mm[table.offsets[row]:table.ends[row]])
+        if references:
+            styled.setdefault(references[-1], row)
+    return styled
+
+
+def model_context(mm, table):
+    """Id of the first 3D GEOMETRIC_REPRESENTATION_CONTEXT with units, the fallback context
+
+    Parametric (2D) contexts are GEOMETRIC_REPRESENTATION_CONTEXTs too, so
+    the context must also be a GLOBAL_UNIT_ASSIGNED_CONTEXT of dimension 3.
+    """
+    for row in table.rows_of("GEOMETRIC_REPRESENTATION_CONTEXT").tolist():
+        if "GLOBAL_UNIT_ASSIGNED_CONTEXT" not in table.components(table.type_codes[row]):
+            continue
+        match = _DIMENSION_RE.search(_STRING_RE.sub(b"''", mm[table.offsets[row]:table.ends[row]]))
+        if match and int(match.group(1)) == 3:
+            return int(table.ids[row])
+    return 0
+
+
+def style_chains(colors, next_id):
+    """(lines, PRESENTATION_STYLE_ASSIGNMENT id of each color) of one style chain per color"""
+    lines = []
+    assignment_ids = np.empty(len(colors), dtype=np.int64)
+    for index, (r, g, b) in enumerate(colors.tolist()):
+        n = next_id
+        lines.append(f"#{n}=COLOUR_RGB('',{_real(r)},{_real(g)},{_real(b)});\n")
+        lines.append(f"#{n + 1}=FILL_AREA_STYLE_COLOUR('',#{n});\n")
+        lines.append(f"#{n + 2}=FILL_AREA_STYLE('',(#{n + 1}));\n")
+        lines.append(f"#{n + 3}=SURFACE_STYLE_FILL_AREA(#{n + 2});\n")
+        lines.append(f"#{n + 4}=SURFACE_SIDE_STYLE('',(#{n + 3}));\n")
+        lines.append(f"#{n + 5}=SURFACE_STYLE_USAGE(.BOTH.,#{n + 4});\n")
+        lines.append(f"#{n + 6}=PRESENTATION_STYLE_ASSIGNMENT((#{n + 5}));\n")
+        assignment_ids[index] = n + 6
+        next_id += 7
+    return lines, assignment_ids
+
+
+def styled_item(entity_id, assignment_id, face_id):
+    """STYLED_ITEM statement giving face_id the style assignment_id"""
+    return f"#{entity_id}=STYLED_ITEM('color',(#{assignment_id}),#{face_id});"
+
+
+def presentation(entity_id, styled_ids, context_id):
+    """MECHANICAL_DESIGN_GEOMETRIC_PRESENTATION_REPRESENTATION lines listing styled_ids"""
+    rows = [",".join(f"#{n}" for n in styled_ids[i:i + ITEMS_PER_LINE])
+            for i in range(0, len(styled_ids), ITEMS_PER_LINE)]
+    items = ",\n  ".join(rows)
+    return f"#{entity_id}=MECHANICAL_DESIGN_GEOMETRIC_PRESENTATION_REPRESENTATION('',(\n  {items}),#{context_id});\n"
+
+
+def _copy(src, dst, length):
+    """Copy length bytes from src to dst"""
+    remaining = length
+    while remaining > 0:
+        chunk = src.read(min(COPY_CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        dst.write(chunk)
+        remaining -= len(chunk)
+
+
+def patch_step_colors(input_path, output_path, entity_ids, face_rgb, table=None):
+    """Write output_path as input_path with a surface color on each face entity
+
+    entity_ids holds the face entity id of each row of face_rgb (0 to skip
+    the row); table is the EntityTable of input_path, parsed here when not
+    given. Returns a summary dict.
+    """
+    start = time.perf_counter()
+    if os.path.abspath(input_path) == os.path.abspath(output_path):
+        raise Exception("The patched file must not overwrite its input")
+    if table is None:
+        table = parse_entity_table(input_path)
+    elif table.size != os.path.getsize(input_path):
+        raise Exception("The entity table does not match the input file")
+
+    entity_ids = np.asarray(entity_ids, dtype=np.int64)
+    face_rgb = np.asarray(face_rgb, dtype=float).reshape(-1, 3)
+    keep = entity_ids > 0
+    # A face shared by several instances is styled once, with its first color
+    face_ids, first = np.unique(entity_ids[keep], return_index=True)
+    keys, face_color = np.unique(rgb_keys(face_rgb[keep][first]), return_inverse=True)
+    face_color = face_color.reshape(-1)
+    colors = keys_rgb(keys)
+
+    with open(input_path, "rb") as src, mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        match = _SCHEMA_RE.search(mm, 0, min(len(mm), 64 * 1024))
+        schema = match.group(1).decode("latin-1") if match else None
+        if schema in UNSTYLED_SCHEMAS:
+            raise Exception(f"Schema {schema} cannot carry colors")
+
+        contexts = face_contexts(mm, table, face_ids)
+        if not contexts.all():
+            fallback = model_context(mm, table)
+            if fallback == 0:
+                raise Exception("No 3D GEOMETRIC_REPRESENTATION_CONTEXT with units in the file")
+            contexts[contexts == 0] = fallback
+        existing = styled_items(mm, table)
+
+        lines, assignment_ids = style_chains(colors, table.max_id + 1)
+        next_id = table.max_id + 1 + len(lines)
+        face_assignment = assignment_ids[face_color]
+
+        # Faces styled already: their STYLED_ITEM is rewritten where it stands
+        restyled = {}
+        new_rows = []
+        for row, (face_id, assignment_id) in enumerate(zip(face_ids.tolist(), face_assignment.tolist())):
+            existing_row = existing.get(face_id)
+            if existing_row is None:
+                new_rows.append(row)
+            else:
+                record = styled_item(int(table.ids[existing_row]), assignment_id, face_id)
+                restyled[int(table.offsets[existing_row])] = (int(table.ends[existing_row]), record)
+
+        styled_ids = np.arange(next_id, next_id + len(new_rows))
+        lines.extend(styled_item(n, a, f) + "\n" for n, a, f in zip(
+            styled_ids.tolist(), face_assignment[new_rows].tolist(), face_ids[new_rows].tolist()))
+        next_id += len(new_rows)
+
+        # One presentation per representation context
+        new_contexts = contexts[new_rows]
+        for context_id in np.unique(new_contexts).tolist():
+            lines.append(presentation(next_id, styled_ids[new_contexts == context_id].tolist(), context_id))
+            next_id += 1
+
+        with open(output_path, "wb") as dst:
+            # Original entities, unchanged but for the rewritten styled items
+            position = 0
+            for offset in sorted(restyled):
+                end, record = restyled[offset]
+                dst.write(mm[position:offset])
+                dst.write(record.encode("ascii"))
+                position = end
+            src.seek(position)
+            _copy(src, dst, table.data_end - position)
+            dst.write("".join(lines).encode("ascii"))
+            # ENDSEC; END-ISO-10303-21;
+            src.seek(table.data_end)
+            _copy(src, dst, len(mm) - table.data_end)
+
+    return {
+        "faces": len(face_ids),
+        "colors": len(colors),
+        "contexts": len(np.unique(contexts)),
+        "restyled": len(restyled),
+        "entities_added": next_id - table.max_id - 1,
+        "seconds": time.perf_counter() - start,
+    }
@@ -3,237 +3,459 @@ STEP File Processor for face coloring and orientation
 """
 
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
-# Try different import patterns for different OCC distributions
-try:
-    # For cadquery-ocp (recommended)
-    from OCP import STEPControl_Reader, TopExp_Explorer, TopAbs_FACE, BRep_Tool
-    from OCP import gp_Pnt, gp_Vec, gp_Dir, gp_Ax3, gp_Trsf, BRepBuilderAPI_Transform
-    from OCP import Quantity_Color, XCAFPrs_Style, XCAFPrs_IndexedDataMapOfShapeStyle
-    from OCP import TCollection_AsciiString, TDF_Label, XCAFDoc_ColorTool
-    from OCP import STEPCAFControl_Reader, TDocStd_Document, XCAFApp_Application
-    from OCP import TCollection_ExtendedString
-    from OCP import STEPControl_Writer, Interface_Static
-    from OCP import Bnd_Box, BRepBndLib
-    print("Using OCP (cadquery-ocp)")
-except ImportError:
-    try:
-        # For pythonocc-core (pip)
-        from OCC.Core import STEPControl_Reader, TopExp_Explorer, TopAbs_FACE, BRep_Tool
-        from OCC.Core import gp_Pnt, gp_Vec, gp_Dir, gp_Ax3, gp_Trsf, BRepBuilderAPI_Transform
-        from OCC.Core import Quantity_Color, XCAFPrs_Style, XCAFPrs_IndexedDataMapOfShapeStyle
-        from OCC.Core import TCollection_AsciiString, TDF_Label, XCAFDoc_ColorTool
-        from OCC.Core import STEPCAFControl_Reader, TDocStd_Document, XCAFApp_Application
-        from OCC.Core import TCollection_ExtendedString
-        from OCC.Core import STEPControl_Writer, Interface_Static
-        from OCC.Core import Bnd_Box, BRepBndLib
-        print("Using OCC.Core (pythonocc-core)")
-    except ImportError:
-        try:
-            # For OCC (conda-forge)
-            from OCC.Core.STEPControl_Reader import STEPControl_Reader
-            from OCC.Core.TopExp import TopExp_Explorer
-            from OCC.Core.TopAbs import TopAbs_FACE
-            from OCC.Core.BRep_Tool import BRep_Tool
-            from OCC.Core.gp import gp_Pnt, gp_Vec, gp_Dir, gp_Ax3, gp_Trsf
-            from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_Transform
-            from OCC.Core.Quantity import Quantity_Color
-            from OCC.Core.XCAFPrs import XCAFPrs_Style, XCAFPrs_IndexedDataMapOfShapeStyle
-            from OCC.Core.TCollection import TCollection_AsciiString, TCollection_ExtendedString
-            from OCC.Core.TDF import TDF_Label
-            from OCC.Core.XCAFDoc import XCAFDoc_ColorTool
-            from OCC.Core.STEPCAFControl_Reader import STEPCAFControl_Reader
-            from OCC.Core.TDocStd import TDocStd_Document
-            from OCC.Core.XCAFApp import XCAFApp_Application
-            from OCC.Core.STEPControl_Writer import STEPControl_Writer
-            from OCC.Core.Interface import Interface_Static
-            from OCC.Core.Bnd import Bnd_Box
-            from OCC.Core.BRepBndLib import BRepBndLib
-            print("Using OCC.Core (conda-forge)")
-        except ImportError:
-            print("Error: No OCC/OCCP module found. Please install cadquery-ocp or pythonocc-core")
-            raise ImportError("No OCC/OCCP module found")
+from core import occ_backend as occ
+from core.face_table import FaceTable
+from core.face_graph import dsatur_coloring
+from core import orientation
+from core import coloring_rules
+from core.bodies import split_bodies, make_compound
+from core.step_writer import write_colored_step
+from core.step_patcher import face_entity_ids, patch_step_colors
+from core.entity_table import parse_entity_table
+from core.palette import FaceColoring, make_palette
+from core.fingerprint import face_fingerprints, color_map_path, write_color_map, read_color_map, lookup_colors
+from core.tessellation import MeshCache, lod_deflection, tessellate
+from core.mesh_export import write_mesh
+from core.profiling import PipelineProfiler, STAGES, current_rss_bytes
+
+
+def _file_key(file_path):
+    """Identity of a file's current content for session reuse"""
+    stat = os.stat(file_path)
+    return (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+
+
+# Coloring method names as they come from the GUI combo box
+METHOD_ALIASES = {
+    "random_colors": "random",
+    "custom_palette": "palette",
+}
+
+# Orientation criteria that move the shape; any other leaves the geometry as read
+TRANSFORMING_ORIENTATIONS = (None, "auto", "principal_axes")
+
+# Settings that affect the transferred shape; part of the shape cache key
+READER_SETTINGS = {
+    "reader": "STEPControl_Reader",
+    "roots": "all",
+}
 
 
 class StepProcessor:
     """Main class for processing STEP files with face coloring and orientation"""
     
-    def __init__(self):
+    def __init__(self, shape_cache=None, max_workers=None, low_memory=False, rss_limit=None,
+                 parse_workers=None):
+        self.shape_cache = shape_cache
+        self.max_workers = max_workers  # 1 turns off OCCT's parallel meshing
+        self.low_memory = low_memory  # Free the STEP model right after the transfer
+        self.rss_limit = rss_limit  # Bytes; above it meshing runs on one thread
+        self.parse_workers = parse_workers  # Processes building the EntityTable beside ReadFile (experimental)
         self.reader = None
+        self.entity_table = None
         self.shape = None
+        self.bodies = []
         self.document = None
-        self.color_tool = None
+        self.face_colors = None  # FaceColoring of the last color_faces call
+        self.face_rgb = None
+        self.face_table = None
+        self.reused_colors = 0
+        self.mesh_cache = MeshCache()
+        self.orientation_matrix = None  # 3x4 [rotation | translation] applied by orient_shape
+        self.orientation_time = None
+        self.profile = None
+        self._inertia_cache = {}
+        self._cache_key = None
+        self._features_shape = None
+        self._face_entity_ids = None
+        self._fingerprints = None
+        
+        # Session state reused between process_file calls on the same file
+        self.oriented_shape = None
+        self._loaded_key = None
+        self._oriented_key = None
+    
+    @property
+    def session_key(self):
+        """Identity of the loaded file and orientation; equal keys give equal oriented shapes"""
+        if self.oriented_shape is None:
+            return None
+        return (self._loaded_key, self._oriented_key)
+    
+    def invalidate(self):
+        """Forget the loaded shape and everything derived from it"""
+        self.reader = None
+        self.shape = None
+        self.bodies = []
+        self.oriented_shape = None
+        self.face_table = None
+        self.entity_table = None
+        self._features_shape = None
+        self._face_entity_ids = None
+        self._fingerprints = None
+        self.orientation_matrix = None
+        self._loaded_key = None
+        self._oriented_key = None
+        self._inertia_cache.clear()
+        self.mesh_cache.clear()
         
+    def over_rss_limit(self):
+        """True when the process is above the RSS ceiling"""
+        if self.rss_limit is None:
+            return False
+        rss = current_rss_bytes()
+        return rss is not None and rss > self.rss_limit
+    
+    def _worker_count(self):
+        """Threads for meshing; one (sequential) above the RSS ceiling"""
+        return 1 if self.over_rss_limit() else self.max_workers
+    
     def load_step_file(self, file_path):
-        """Load a STEP file and return the shape"""
+        """Load a STEP file and return the shape
+        
+        In low-memory mode the parsed STEP model and the transfer results
+        are freed right after the transfer.
+        """
         try:
-            # Create STEP reader
-            self.reader = STEPControl_Reader()
-            
-            # Read the file
-            status = self.reader.ReadFile(file_path)
-            if status != 1:  # IFSelect_RetDone
-                raise Exception(f"Failed to read STEP file: {file_path}")
-            
-            # Transfer to shape
-            self.reader.TransferRoots()
-            nb_shapes = self.reader.NbShapes()
-            
-            if nb_shapes == 0:
-                raise Exception("No shapes found in STEP file")
-            
-            # Get the first shape (assuming single solid)
-            self.shape = self.reader.Shape(1)
-            
-            return self.shape
+            shape = self.read_step_file(file_path)
+            if shape is None:
+                shape = self.transfer_roots()
+            return shape
             
         except Exception as e:
             raise Exception(f"Error loading STEP file: {str(e)}")
     
+    def read_step_file(self, file_path):
+        """Parse a STEP file; returns the shape directly on a shape cache hit, else None"""
+        # Reuse a previously transferred shape for the same file content
+        self._cache_key = None
+        if self.shape_cache is not None:
+            self._cache_key = self.shape_cache.key_for(file_path, READER_SETTINGS)
+            cached_shape = self.shape_cache.get(self._cache_key)
+            if cached_shape is not None:
+                self.reader = None
+                self.shape = cached_shape
+                self.bodies = split_bodies(cached_shape)
+                return self.shape
+        
+        # Create STEP reader
+        self.reader = occ.STEPControl_Reader()
+        
+        # Read the file; in parallel-parse mode the entity table is built by
+        # worker processes meanwhile, for the patcher to use
+        if self.parse_workers:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                table = executor.submit(parse_entity_table, file_path, self.parse_workers)
+                status = self.reader.ReadFile(file_path)
+                try:
+                    self.entity_table = table.result()
+                except Exception:
+                    # Only an aid to the patcher, which can scan the file itself
+                    self.entity_table = None
+        else:
+            status = self.reader.ReadFile(file_path)
+        if status != occ.IFSelect_RetDone:
+            raise Exception(f"Failed to read STEP file: {file_path}")
+        
+        return None
+    
+    def transfer_roots(self):
+        """Transfer the roots parsed by read_step_file into one shape"""
+        self.reader.TransferRoots()
+        roots = [self.reader.Shape(i) for i in range(1, self.reader.NbShapes() + 1)]
+        if self.low_memory:
+            # Every root is kept for the whole pipeline, so transferring them
+            # one at a time would not lower the peak; what can go is the model
+            self.release_reader()
+        
+        if not roots:
+            raise Exception("No shapes found in STEP file")
+        
+        # Keep every root; several roots are grouped into one compound
+        self.shape = make_compound(roots)
+        self.bodies = split_bodies(self.shape)
+        
+        if self._cache_key is not None:
+            self.shape_cache.put(self._cache_key, self.shape)
+        
+        return self.shape
+    
+    def release_reader(self):
+        """Free the parsed STEP model and the transfer results held by the reader"""
+        if self.reader is None:
+            return
+        work_session = self.reader.WS()
+        work_session.ClearData(7)  # Transfer results (entity to shape map)
+        work_session.ClearData(1)  # The StepData model itself
+        self.reader = None
+    
     def orient_shape(self, shape, orientation_criteria=None):
         """Orient the shape based on specified criteria"""
         if orientation_criteria is None:
             orientation_criteria = "auto"  # Default to automatic orientation
         
-        # For now, implement basic orientation logic
-        # This can be extended based on specific requirements
+        start = time.perf_counter()
         
-        if orientation_criteria == "auto":
-            # Calculate bounding box and orient based on principal axes
-            bbox = self._get_bounding_box(shape)
-            center = bbox.Center()
-            
-            # Simple orientation: align with coordinate system
-            # This is a placeholder - implement specific orientation logic as needed
-            return shape
+        self.orientation_matrix = None
+        if orientation_criteria in TRANSFORMING_ORIENTATIONS:
+            # Move the center of mass to the origin and the principal axes onto XYZ
+            volume, center, tensor = self._get_inertia(shape)
+            self.orientation_matrix = orientation.principal_axes_matrix(center, tensor)
+            shape = orientation.apply_trsf(shape, orientation.matrix_trsf(self.orientation_matrix))
         
+        self.orientation_time = time.perf_counter() - start
         return shape
     
+    def _get_inertia(self, shape):
+        """Get (volume, center, inertia tensor) of the shape, computed once per shape"""
+        if shape not in self._inertia_cache:
+            # Mass properties of each solid, combined
+            parts = [self._body_inertia(body) for body in split_bodies(shape)]
+            self._inertia_cache[shape] = orientation.combine_inertia(parts)
+        return self._inertia_cache[shape]
+    
+    def _body_inertia(self, body):
+        """Get (volume, center, inertia tensor) of a single body"""
+        inertia = orientation.volume_inertia(body)
+        if inertia[0] < orientation.MIN_VOLUME:
+            # Open shells have no volume; fall back to the face table
+            inertia = orientation.surface_inertia(FaceTable.from_shape(body))
+        return inertia
+    
     def color_faces(self, shape, coloring_criteria=None):
-        """Color faces of the shape based on specified criteria"""
+        """Color faces of the shape based on specified criteria; returns a FaceColoring"""
         if coloring_criteria is None:
             coloring_criteria = {"method": "random"}  # Default coloring
         
-        # Create a new document for colored output
-        app = XCAFApp_Application.GetApplication()
-        self.document = app.NewDocument(TCollection_ExtendedString("STEP"))
-        
-        # Get color tool
-        self.color_tool = XCAFDoc_ColorTool.Set(self.document.Main())
+        # Color from the per-face arrays, extracting them first if needed
+        if self._features_shape is not shape:
+            self.extract_features(shape)
+        return self._assign_face_colors(self.face_table, coloring_criteria)
+    
+    def extract_features(self, shape):
+        """Build the face table of the shape, one solid at a time"""
+        tables = [FaceTable.from_shape(body) for body in split_bodies(shape)]
+        self.face_table = FaceTable.concatenate(tables)
+        self._features_shape = shape
+        self._face_entity_ids = None
+        self._fingerprints = None
+        return self.face_table
+    
+    def face_fingerprints(self):
+        """Fingerprints of the face table rows, independent of the orientation applied"""
+        if self._fingerprints is None:
+            self._fingerprints = face_fingerprints(self.face_table, self.orientation_matrix)
+        return self._fingerprints
+    
+    def tessellate(self, shape=None, lod="fine"):
+        """Triangle mesh of shape (default: the oriented shape) at a level of detail
         
-        # Process faces
-        face_colors = self._assign_face_colors(shape, coloring_criteria)
+        Triangles carry the FaceTable row of their face; meshes are cached per
+        shape and deflection, so recoloring never re-meshes. Faces are meshed
+        in parallel by OCCT unless max_workers is 1 or the RSS ceiling is
+        exceeded; mesh.timings splits the seconds between OCCT meshing
+        ("mesh") and packing the NumPy buffers ("gather").
+        """
+        if shape is None:
+            shape = self.oriented_shape
+        if self._features_shape is not shape:
+            self.extract_features(shape)
         
-        return face_colors
+        linear, angular = lod_deflection(self._get_bounding_box(shape), lod)
+        mesh = self.mesh_cache.get(shape, linear)
+        if mesh is None:
+            mesh = tessellate(shape, self.face_table.faces, linear, angular, parallel=self._worker_count() != 1)
+            self.mesh_cache.put(shape, linear, mesh)
+        return mesh
     
     def _get_bounding_box(self, shape):
         """Get bounding box of the shape"""
-        from OCC.Core import Bnd_Box, BRepBndLib
-        bbox = Bnd_Box()
-        BRepBndLib.Add(shape, bbox)
+        bbox = occ.Bnd_Box()
+        occ.static(occ.BRepBndLib, "Add")(shape, bbox)
         return bbox
     
-    def _assign_face_colors(self, shape, criteria):
-        """Assign colors to faces based on criteria"""
-        colors = []
-        face_colors = {}
+    def _assign_face_colors(self, face_table, criteria):
+        """Assign colors to faces based on criteria; returns a FaceColoring
+        
+        Also keeps the (n, 3) RGB of every face in face_rgb for previews and
+        mesh export. Generated palettes are seeded by criteria["seed"] (default
+        0), so a rerun gives the same colors. With criteria["color_map"] (a
+        sidecar written by process_file), faces whose fingerprint is in the
+        map keep its color.
+        """
+        method = METHOD_ALIASES.get(criteria.get("method"), criteria.get("method"))
+        count = criteria.get("count", 10)
         
-        # Generate colors based on criteria
-        if criteria.get("method") == "random":
-            colors = self._generate_random_colors(10)  # Generate 10 random colors
-        elif criteria.get("method") == "gradient":
-            colors = self._generate_gradient_colors(10)
+        if method in coloring_rules.METHODS:
+            # Geometric criteria are evaluated as masks over the face table
+            color_indices, palette = coloring_rules.evaluate(face_table, dict(criteria, method=method))
+        elif method == "adjacency":
+            # Neighboring faces never share a color; uses as few colors as DSatur finds
+            color_indices = dsatur_coloring(face_table.graph)
+            palette = make_palette("distinct", int(color_indices.max(initial=0)) + 1)
         else:
-            # Default colors
-            colors = [
-                Quantity_Color(1.0, 0.0, 0.0, 1),  # Red
-                Quantity_Color(0.0, 1.0, 0.0, 1),  # Green
-                Quantity_Color(0.0, 0.0, 1.0, 1),  # Blue
-                Quantity_Color(1.0, 1.0, 0.0, 1),  # Yellow
-                Quantity_Color(1.0, 0.0, 1.0, 1),  # Magenta
-            ]
-        
-        # Assign colors to faces
-        face_index = 0
-        explorer = TopExp_Explorer(shape, TopAbs_FACE)
-        
-        while explorer.More():
-            face = explorer.Current()
-            color_index = face_index % len(colors)
-            face_colors[face] = colors[color_index]
-            face_index += 1
-            explorer.Next()
-        
-        return face_colors
-    
-    def _generate_random_colors(self, count):
-        """Generate random colors"""
-        colors = []
-        for i in range(count):
-            r = np.random.random()
-            g = np.random.random()
-            b = np.random.random()
-            colors.append(Quantity_Color(r, g, b, 1))
-        return colors
-    
-    def _generate_gradient_colors(self, count):
-        """Generate gradient colors from blue to red"""
-        colors = []
-        for i in range(count):
-            t = i / (count - 1) if count > 1 else 0
-            r = t
-            g = 0.5 * (1 - abs(2 * t - 1))
-            b = 1 - t
-            colors.append(Quantity_Color(r, g, b, 1))
-        return colors
-    
-    def save_colored_step(self, shape, face_colors, output_path):
+            # random, gradient, or the basic palette for anything else
+            palette = make_palette(method, count, criteria.get("seed"))
+            
+            # Cycle through the palette in face order
+            color_indices = np.arange(len(face_table)) % len(palette)
+        
+        coloring = FaceColoring(face_table.faces, color_indices, palette)
+        self.reused_colors = 0
+        if criteria.get("color_map"):
+            # Faces already colored in an earlier revision keep their color
+            previous_rgb, found = lookup_colors(read_color_map(criteria["color_map"]), self.face_fingerprints())
+            coloring.override(found, previous_rgb[found])
+            self.reused_colors = int(found.sum())
+        
+        self.face_rgb = coloring.rgb
+        return coloring
+    
+    def save_colored_step(self, shape, coloring, output_path, schema="AP214"):
         """Save the colored shape as a new STEP file"""
         try:
-            # Create STEP writer with colors
-            writer = STEPCAFControl_Reader()
-            
-            # This is a simplified approach - in practice, you'd need to properly
-            # set up the document with colored faces
-            # For now, we'll save the basic shape
-            
-            from OCC.Core import STEPControl_Writer, Interface_Static
-            step_writer = STEPControl_Writer()
-            
-            # Set precision
-            Interface_Static.SetCVal("write.step.schema", "AP203")
-            Interface_Static.SetCVal("write.step.unit", "MM")
-            
-            # Transfer shape
-            step_writer.Transfer(shape, 1)
-            
-            # Write file
-            status = step_writer.Write(output_path)
-            if status != 1:
-                raise Exception(f"Failed to write STEP file: {output_path}")
-            
+            # Build the XCAF document with shared colors and write it in one transfer
+            self.document = write_colored_step(shape, coloring, output_path, schema)
             return True
             
         except Exception as e:
             raise Exception(f"Error saving colored STEP file: {str(e)}")
     
-    def process_file(self, input_path, output_path, orientation_criteria=None, coloring_criteria=None):
-        """Main processing function"""
+    def can_patch(self, orientation_criteria):
+        """True when the colored file can be written by patching the input (see step_patcher)
+        
+        Needs an untransformed shape and the reader's transfer results, so
+        not after a shape cache hit or in low-memory mode.
+        """
+        return (orientation_criteria not in TRANSFORMING_ORIENTATIONS and self.reader is not None
+                and not self.low_memory)
+    
+    def patch_colored_step(self, input_path, output_path):
+        """Write output_path as input_path plus a color style per face; returns the patch summary"""
         try:
-            # Load STEP file
-            shape = self.load_step_file(input_path)
+            if self._face_entity_ids is None:
+                self._face_entity_ids = face_entity_ids(self.reader, self.face_table.faces)
+            return patch_step_colors(input_path, output_path, self._face_entity_ids, self.face_rgb,
+                                     table=self.entity_table)
             
-            # Orient shape
-            oriented_shape = self.orient_shape(shape, orientation_criteria)
+        except Exception as e:
+            raise Exception(f"Error patching STEP file: {str(e)}")
+    
+    def export_mesh(self, output_path, lod="fine", shape=None):
+        """Write the colored mesh of the last colored shape as .glb or .ply
+        
+        Uses the face colors of the last color_faces call; returns the Mesh.
+        """
+        if self.face_rgb is None:
+            raise Exception("No face colors to export; color the shape first")
+        try:
+            mesh = self.tessellate(shape, lod)
+            write_mesh(mesh, self.face_rgb, output_path)
+            return mesh
+            
+        except Exception as e:
+            raise Exception(f"Error exporting mesh: {str(e)}")
+    
+    def process_file(self, input_path, output_path, orientation_criteria=None, coloring_criteria=None,
+                     progress_callback=None, profile_path=None, mesh_paths=()):
+        """Main processing function
+        
+        Calling it again for the same unchanged file reuses the loaded shape,
+        and also the oriented shape and face table when the orientation
+        criteria are unchanged, so only coloring and writing are redone.
+        progress_callback receives the stage events of PipelineProfiler; when
+        profile_path is given, a JSON report and a '.folded' flamegraph file
+        are written there. Each of mesh_paths (.glb / .ply) also receives the
+        colored mesh. When the orientation leaves the shape as read, the
+        output is the input file with color styles appended (patched=True in
+        the write stage) instead of an OCCT re-export. The face colors are
+        also saved as a color map next to the output (see fingerprint).
+        Every stage records its peak RSS, and the mesh stage whether the RSS
+        ceiling forced meshing onto one thread (rss_limited).
+        """
+        stages = STAGES + ("mesh", "export") if mesh_paths else STAGES
+        profiler = PipelineProfiler(progress_callback, stages)
+        self.profile = None
+        try:
+            # A different file (or a changed one) starts a new session
+            file_key = _file_key(input_path)
+            if file_key != self._loaded_key:
+                self.invalidate()
+            
+            # Load STEP file (a shape cache hit skips parsing and transfer)
+            loaded = self.shape is not None
+            with profiler.stage("read", reused=loaded) as info:
+                shape = self.shape if loaded else self.read_step_file(input_path)
+                if self.entity_table is not None and not loaded:
+                    info.update(entities=len(self.entity_table),
+                                entity_table_seconds=round(self.entity_table.seconds, 4))
+            cached = shape is not None
+            with profiler.stage("transfer", reused=loaded, cached=cached):
+                if not cached:
+                    shape = self.transfer_roots()
+            self._loaded_key = file_key
+            
+            # Orient shape, unless it is already oriented with the same criteria
+            oriented = self.oriented_shape is not None and self._oriented_key == orientation_criteria
+            with profiler.stage("orient", reused=oriented):
+                if not oriented:
+                    self.oriented_shape = self.orient_shape(shape, orientation_criteria)
+                    self._oriented_key = orientation_criteria
+            oriented_shape = self.oriented_shape
+            
+            # Extract per-face features of the oriented shape
+            extracted = self._features_shape is oriented_shape
+            with profiler.stage("features", reused=extracted):
+                if not extracted:
+                    self.extract_features(oriented_shape)
             
             # Color faces
-            face_colors = self.color_faces(oriented_shape, coloring_criteria)
+            with profiler.stage("color") as info:
+                face_colors = self.color_faces(oriented_shape, coloring_criteria)
+                self.face_colors = face_colors
+                if coloring_criteria and coloring_criteria.get("color_map"):
+                    info["reused_colors"] = self.reused_colors
             
-            # Save colored STEP file
-            self.save_colored_step(oriented_shape, face_colors, output_path)
+            # Save colored STEP file; an unmoved shape only needs styles appended to the input
+            with profiler.stage("write") as info:
+                patched = False
+                if self.can_patch(orientation_criteria):
+                    try:
+                        summary = self.patch_colored_step(input_path, output_path)
+                        info.update(patched=True, styled_faces=summary["faces"], colors=summary["colors"])
+                        self.document = None
+                        patched = True
+                    except Exception as e:
+                        info["patch_error"] = str(e)
+                if not patched:
+                    self.save_colored_step(oriented_shape, face_colors, output_path)
+                # Face fingerprints and colors, for reuse by later revisions
+                write_color_map(color_map_path(output_path), self.face_fingerprints(), self.face_rgb)
+                if self.low_memory:
+                    # The XCAF document is only needed while writing
+                    self.document = None
+            
+            # Colored mesh exports
+            if mesh_paths:
+                with profiler.stage("mesh", rss_limited=self.over_rss_limit()) as info:
+                    mesh = self.tessellate(oriented_shape)
+                    info.update(triangles=len(mesh), triangles_per_s=round(mesh.triangles_per_second),
+                                mesh_seconds=mesh.timings.get("mesh", 0.0),
+                                gather_seconds=mesh.timings.get("gather", 0.0))
+                with profiler.stage("export"):
+                    for mesh_path in mesh_paths:
+                        self.export_mesh(mesh_path, shape=oriented_shape)
             
             return True
             
         except Exception as e:
             raise Exception(f"Processing failed: {str(e)}")
+        
+        finally:
+            self.profile = profiler.report()
+            if profile_path is not None:
+                profiler.write_report(profile_path)
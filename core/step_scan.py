@@ -0,0 +1,199 @@
+"""
+Streaming STEP pre-scanner
+
+Reads a STEP file through a memory map and counts entity types, reads the
+header schema and the length unit, without building any geometry. This is
+pure Python and does not import OCC, so it is cheap enough to run on every
+file selection and for scheduling batches. Given the EntityTable of the
+file (see entity_table), the counts come from its arrays instead.
+"""
+
+import mmap
+import os
+import re
+import time
+from collections import Counter
+
+# Regions of the DATA section are scanned in windows of this size
+WINDOW_SIZE = 64 * 1024 * 1024
+
+FACE_TYPES = ("ADVANCED_FACE", "FACE_SURFACE")
+SOLID_TYPES = ("MANIFOLD_SOLID_BREP", "BREP_WITH_VOIDS")
+BSPLINE_SURFACE_TYPES = ("B_SPLINE_SURFACE", "B_SPLINE_SURFACE_WITH_KNOTS")
+
+_ENTITY_RE = re.compile(rb"#(\d+)\s*=\s*([A-Z][A-Z0-9_]*)?\s*\(")
+_COMPLEX_RE = re.compile(rb"#(\d+)\s*=\s*\(")
+_TOKEN_RE = re.compile(rb"'(?:[^']|'')*'|([A-Z][A-Z0-9_]*)\s*\(|[();]")
+_SCHEMA_RE = re.compile(rb"FILE_SCHEMA\s*\(\s*\(\s*'([^']*)'")
+_SI_UNIT_RE = re.compile(rb"SI_UNIT\s*\(\s*(?:\.(\w+)\.|\$)\s*,\s*\.(\w+)\.\s*\)")
+_CONVERSION_UNIT_RE = re.compile(rb"CONVERSION_BASED_UNIT\s*\(\s*'([^']*)'")
+
+
+class StepFileStats:
+    """Entity statistics of a STEP file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.schema = None
+        self.length_unit = None
+        self.entity_counts = Counter()
+        self.entity_total = 0
+        self.max_entity_id = 0
+        self.seconds = 0.0
+
+    @property
+    def face_count(self):
+        return sum(self.entity_counts[t] for t in FACE_TYPES)
+
+    @property
+    def solid_count(self):
+        return sum(self.entity_counts[t] for t in SOLID_TYPES)
+
+    @property
+    def bspline_surface_count(self):
+        # Rational B-spline surfaces are complex entities that contain both names
+        return max(self.entity_counts[t] for t in BSPLINE_SURFACE_TYPES)
+
+    @property
+    def is_multi_body(self):
+        return self.solid_count > 1
+
+    def summary(self):
+        """One line description for status displays"""
+        text = f"{self.face_count:,} faces, {self.solid_count} solid(s)"
+        if self.bspline_surface_count:
+            text += f", {self.bspline_surface_count:,} B-spline surfaces"
+        if self.length_unit:
+            text += f", units: {self.length_unit}"
+        return text
+
+    def to_dict(self):
+        return {
+            "path": self.path,
+            "size": self.size,
+            "schema": self.schema,
+            "length_unit": self.length_unit,
+            "entities": self.entity_total,
+            "max_entity_id": self.max_entity_id,
+            "faces": self.face_count,
+            "solids": self.solid_count,
+            "bspline_surfaces": self.bspline_surface_count,
+            "multi_body": self.is_multi_body,
+            "entity_counts": dict(self.entity_counts),
+            "seconds": self.seconds,
+        }
+
+
+def scan_step_file(path, table=None):
+    """Scan a STEP file and return its StepFileStats; table is an EntityTable of the file"""
+    start = time.perf_counter()
+    stats = StepFileStats(path)
+    if stats.size == 0:
+        return stats
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        header_end = mm.find(b"ENDSEC;")
+        if header_end < 0:
+            header_end = 0
+        match = _SCHEMA_RE.search(mm, 0, header_end)
+        if match:
+            stats.schema = match.group(1).decode("latin-1").split()[0]
+
+        if table is not None:
+            _scan_table(mm, table, stats)
+        else:
+            pos = header_end
+            while pos < stats.size:
+                end = _window_end(mm, pos, stats.size)
+                _scan_window(mm, pos, end, stats)
+                pos = end
+
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def _window_end(mm, pos, size):
+    """End of the window starting at pos, aligned just after a statement end"""
+    end = pos + WINDOW_SIZE
+    if end >= size:
+        return size
+    boundary = mm.find(b";", end)
+    return size if boundary < 0 else boundary + 1
+
+
+def _scan_window(mm, start, end, stats):
+    """Count the entities of one window"""
+    matches = _ENTITY_RE.findall(mm, start, end)
+    if not matches:
+        return
+
+    ids, types = zip(*matches)
+    stats.entity_total += len(ids)
+    stats.max_entity_id = max(stats.max_entity_id, max(map(int, ids)))
+
+    counts = Counter(types)
+    complex_count = counts.pop(b"", 0)
+    for name, count in counts.items():
+        stats.entity_counts[name.decode("ascii")] += count
+
+    if complex_count:
+        for match in _COMPLEX_RE.finditer(mm, start, end):
+            _scan_complex_entity(mm, match.end(), end, stats)
+
+
+def _scan_table(mm, table, stats):
+    """Counts of an EntityTable; only the unit definitions are read from the text"""
+    stats.entity_total = len(table)
+    stats.max_entity_id = table.max_id
+    stats.entity_counts.update(table.type_counts())
+
+    for row in table.rows_of("LENGTH_UNIT")[:1].tolist():
+        _read_length_unit(mm[table.offsets[row]:table.ends[row]], stats)
+
+
+def complex_components(mm, pos, end):
+    """Names of the top-level components of a complex entity starting at pos
+
+    Returns (names, end offset of the entity).
+    """
+    names = []
+    depth = 0
+    for token in _TOKEN_RE.finditer(mm, pos, end):
+        name = token.group(1)
+        if name is not None:
+            if depth == 0:
+                names.append(name.decode("ascii"))
+            depth += 1
+            continue
+        value = token.group()
+        if value == b"(":
+            depth += 1
+        elif value == b")":
+            depth -= 1
+            if depth < 0:
+                return names, token.end()
+        elif value == b";":
+            return names, token.end()
+    return names, end
+
+
+def _scan_complex_entity(mm, pos, end, stats):
+    """Count the components of a complex entity and pick up unit definitions"""
+    names, entity_end = complex_components(mm, pos, end)
+    for name in names:
+        stats.entity_counts[name] += 1
+
+    if "LENGTH_UNIT" in names and stats.length_unit is None:
+        _read_length_unit(mm[pos:entity_end], stats)
+
+
+def _read_length_unit(text, stats):
+    """Set stats.length_unit from the text of a LENGTH_UNIT entity"""
+    si_unit = _SI_UNIT_RE.search(text)
+    conversion = _CONVERSION_UNIT_RE.search(text)
+    if conversion:
+        stats.length_unit = conversion.group(1).decode("latin-1")
+    elif si_unit:
+        prefix, name = si_unit.groups()
+        stats.length_unit = ((prefix or b"") + name).decode("ascii")
@@ -0,0 +1,80 @@
+"""
+Writer for STEP files with per-face colors through an XCAF document
+"""
+
+from core import occ_backend as occ
+
+# Values of write.step.schema for the application protocols we can write
+STEP_SCHEMAS = {
+    "AP203": "AP203",
+    "AP214": "AP214IS",
+    "AP242": "AP242DIS",
+}
+
+
+def color_key(color):
+    """Hashable RGB key of a Quantity_Color"""
+    return (round(color.Red(), 6), round(color.Green(), 6), round(color.Blue(), 6))
+
+
+def build_colored_document(shape, coloring):
+    """Create an XCAF document holding shape with one surface color per face
+
+    coloring is a palette.FaceColoring. Each distinct color is added to the
+    color table once and every face label links to that shared entry, so
+    the writer emits one style per color instead of one per face.
+    """
+    document = occ.TDocStd_Document(occ.TCollection_ExtendedString("MDTV-XCAF"))
+    occ.static(occ.XCAFApp_Application, "GetApplication")().InitDocument(document)
+
+    shape_tool = occ.static(occ.XCAFDoc_DocumentTool, "ShapeTool")(document.Main())
+    color_tool = occ.static(occ.XCAFDoc_DocumentTool, "ColorTool")(document.Main())
+    new_child = occ.static(occ.TDF_TagSource, "NewChild")
+    shape_label = shape_tool.AddShape(shape, False)
+
+    # Color table entry of each palette index, added on first use
+    colors = coloring.quantity_colors()
+    palette_labels = [None] * len(colors)
+    color_labels = {}
+    for face, index in zip(coloring.faces, coloring.labels.tolist()):
+        color_label = palette_labels[index]
+        if color_label is None:
+            key = color_key(colors[index])
+            color_label = color_labels.get(key)
+            if color_label is None:
+                color_label = color_tool.AddColor(colors[index])
+                color_labels[key] = color_label
+            palette_labels[index] = color_label
+
+        # Faces come from a unique face map, so the sub-shape label is created
+        # directly instead of through AddSubShape, which searches the existing
+        # children first and would make this loop quadratic
+        face_label = new_child(shape_label)
+        occ.TNaming_Builder(face_label).Generated(face)
+        color_tool.SetColor(face_label, color_label, occ.XCAFDoc_ColorSurf)
+
+    return document
+
+
+def write_colored_step(shape, coloring, output_path, schema="AP214"):
+    """Write shape with the face colors of coloring to output_path and return the document"""
+    if schema not in STEP_SCHEMAS:
+        raise ValueError(f"Unsupported STEP schema: {schema}")
+
+    document = build_colored_document(shape, coloring)
+
+    set_cval = occ.static(occ.Interface_Static, "SetCVal")
+    set_cval("write.step.schema", STEP_SCHEMAS[schema])
+    set_cval("write.step.unit", "MM")
+
+    writer = occ.STEPCAFControl_Writer()
+    writer.SetColorMode(True)
+    writer.SetNameMode(True)
+    if not writer.Transfer(document, occ.STEPControl_AsIs):
+        raise Exception("Failed to transfer colored document to STEP")
+
+    status = writer.Write(output_path)
+    if status != occ.IFSelect_RetDone:
+        raise Exception(f"Failed to write STEP file: {output_path}")
+
+    return document
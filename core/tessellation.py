@@ -0,0 +1,214 @@
+"""
+Triangulation of shapes into packed NumPy buffers for preview and export
+"""
+
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from core import occ_backend as occ
+
+# Level of detail: (linear deflection as a fraction of the bounding box
+# diagonal, angular deflection in radians)
+LOD_SETTINGS = {
+    "coarse": (0.01, 0.8),
+    "fine": (0.001, 0.3),
+}
+
+
+class Mesh:
+    """Triangle mesh of a shape packed into NumPy arrays
+
+        vertices   (v, 3)  float32
+        triangles  (t, 3)  int64, indices into vertices
+        face_ids   (t,)    int32, row in the FaceTable of the face of every triangle
+        face_offsets (n+1,) int64, triangles of face i are face_offsets[i]:face_offsets[i + 1]
+
+    Coloring a mesh is a gather of per-face colors through face_ids, so the
+    same mesh serves every coloring of its shape. Triangles are int64, the
+    vtkCellArray connectivity type, so the preview wraps them without a
+    copy. timings holds the seconds spent meshing and gathering.
+    """
+
+    def __init__(self, vertices, triangles, face_ids, face_offsets=None):
+        self.vertices = vertices
+        self.triangles = triangles
+        self.face_ids = face_ids
+        if face_offsets is None:
+            face_offsets = np.searchsorted(face_ids, np.arange(int(face_ids.max(initial=-1)) + 2))
+        self.face_offsets = face_offsets
+        self.timings = {}
+
+    def __len__(self):
+        return len(self.triangles)
+
+    @property
+    def seconds(self):
+        return sum(self.timings.values())
+
+    @property
+    def triangles_per_second(self):
+        return len(self) / self.seconds if self.seconds > 0 else 0.0
+
+    def save(self, path):
+        """Write the mesh buffers to an uncompressed .npz file"""
+        names = list(self.timings)
+        np.savez(path, vertices=self.vertices, triangles=self.triangles,
+                 face_ids=self.face_ids, face_offsets=self.face_offsets,
+                 timing_names=np.array(names, dtype=str),
+                 timing_seconds=np.array([self.timings[name] for name in names], dtype=float))
+
+    @classmethod
+    def load(cls, path):
+        """Read a mesh written by save()"""
+        with np.load(path) as data:
+            # Meshes saved before triangles were int64 are widened once here
+            mesh = cls(data["vertices"], data["triangles"].astype(np.int64, copy=False),
+                       data["face_ids"], data["face_offsets"])
+            mesh.timings = dict(zip(data["timing_names"].tolist(), data["timing_seconds"].tolist()))
+        return mesh
+
+    def triangle_colors(self, face_rgb, out=None):
+        """(t, 3) uint8 colors of the triangles from (n, 3) per-face RGB in 0..1, rounded"""
+        levels = np.rint(np.clip(face_rgb[self.face_ids], 0.0, 1.0) * 255.0)
+        if out is None:
+            return levels.astype(np.uint8)
+        out[...] = levels
+        return out
+
+
+class MeshCache:
+    """Small LRU cache of meshes keyed by shape and linear deflection"""
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def _key(self, shape, deflection):
+        return (shape, round(float(deflection), 9))
+
+    def get(self, shape, deflection):
+        """Cached mesh of shape at deflection, or None"""
+        key = self._key(shape, deflection)
+        mesh = self._entries.get(key)
+        if mesh is not None:
+            self._entries.move_to_end(key)
+        return mesh
+
+    def put(self, shape, deflection, mesh):
+        """Store a mesh, dropping the least recently used ones beyond max_entries"""
+        self._entries[self._key(shape, deflection)] = mesh
+        self._entries.move_to_end(self._key(shape, deflection))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every cached mesh"""
+        self._entries.clear()
+
+
+def lod_deflection(bbox, lod):
+    """(linear, angular) deflection of a level of detail for a Bnd_Box"""
+    if lod not in LOD_SETTINGS:
+        raise ValueError(f"Unknown level of detail: {lod}")
+    fraction, angular = LOD_SETTINGS[lod]
+    if bbox.IsVoid():
+        return fraction, angular
+    lo, hi = bbox.CornerMin(), bbox.CornerMax()
+    diagonal = np.linalg.norm([hi.X() - lo.X(), hi.Y() - lo.Y(), hi.Z() - lo.Z()])
+    return max(diagonal * fraction, 1e-6), angular
+
+
+def _trsf_matrix(trsf):
+    """3x4 matrix of a gp_Trsf"""
+    return np.array([[trsf.Value(i, j) for j in (1, 2, 3, 4)] for i in (1, 2, 3)])
+
+
+def _face_triangulation(face):
+    """(Poly_Triangulation, TopLoc_Location) of a meshed face, or (None, location)"""
+    location = occ.TopLoc_Location()
+    triangulation = occ.static(occ.BRep_Tool, "Triangulation")(face, location)
+    if triangulation is not None and triangulation.NbTriangles() == 0:
+        triangulation = None
+    return triangulation, location
+
+
+def _fill_face(face, triangulation, location, vertices, triangles):
+    """Write the nodes and face-local triangles of one face into buffer slices
+
+    Nodes are moved to global coordinates and triangles are wound so that
+    their normal follows the face orientation. Values are streamed into
+    flat arrays with np.fromiter, without a Python tuple per node.
+    """
+    node = triangulation.Node
+    coords = np.fromiter(
+        (c for p in map(node, range(1, len(vertices) + 1)) for c in (p.X(), p.Y(), p.Z())),
+        dtype=float, count=3 * len(vertices),
+    ).reshape(-1, 3)
+    if not location.IsIdentity():
+        matrix = _trsf_matrix(location.Transformation())
+        coords = coords @ matrix[:, :3].T + matrix[:, 3]
+    vertices[:] = coords
+
+    a, b, c = (1, 3, 2) if face.Orientation() == occ.TopAbs_REVERSED else (1, 2, 3)
+    triangle = triangulation.Triangle
+    triangles[:] = np.fromiter(
+        (n for t in map(triangle, range(1, len(triangles) + 1)) for n in (t.Value(a), t.Value(b), t.Value(c))),
+        dtype=np.int64, count=3 * len(triangles),
+    ).reshape(-1, 3)
+
+
+def mesh_faces(faces):
+    """Pack the triangulations of already meshed faces into one Mesh
+
+    Sizes are counted first, so every face is written straight into its
+    slice of one preallocated vertex and triangle buffer; the face-local,
+    1-based indices are then shifted to global ones in a single vectorized
+    step. The gather runs serially: reading nodes through the binding holds
+    the GIL, so threads would not speed it up.
+    """
+    start = time.perf_counter()
+    parts = [_face_triangulation(face) for face in faces]
+    node_counts = np.array([t.NbNodes() if t is not None else 0 for t, _ in parts], dtype=np.int64)
+    triangle_counts = np.array([t.NbTriangles() if t is not None else 0 for t, _ in parts], dtype=np.int64)
+
+    vertex_offsets = np.zeros(len(faces) + 1, dtype=np.int64)
+    np.cumsum(node_counts, out=vertex_offsets[1:])
+    face_offsets = np.zeros(len(faces) + 1, dtype=np.int64)
+    np.cumsum(triangle_counts, out=face_offsets[1:])
+
+    vertices = np.empty((vertex_offsets[-1], 3), dtype=np.float32)
+    triangles = np.empty((face_offsets[-1], 3), dtype=np.int64)
+
+    for index, (triangulation, location) in enumerate(parts):
+        if triangulation is None:
+            continue
+        _fill_face(
+            faces[index], triangulation, location,
+            vertices[vertex_offsets[index]:vertex_offsets[index + 1]],
+            triangles[face_offsets[index]:face_offsets[index + 1]],
+        )
+
+    triangles += (np.repeat(vertex_offsets[:-1], triangle_counts) - 1)[:, None]
+    face_ids = np.repeat(np.arange(len(faces), dtype=np.int32), triangle_counts)
+
+    mesh = Mesh(vertices, triangles, face_ids, face_offsets)
+    mesh.timings["gather"] = time.perf_counter() - start
+    return mesh
+
+
+def tessellate(shape, faces, linear_deflection, angular_deflection=0.5, parallel=True):
+    """Mesh shape with BRepMesh_IncrementalMesh and pack faces (FaceTable order)
+
+    With parallel set, OCCT meshes the faces concurrently on all cores. The
+    triangulation is stored on the shape's faces by OCCT, so meshing a
+    shape that already holds a fine enough triangulation is nearly free.
+    """
+    start = time.perf_counter()
+    occ.BRepMesh_IncrementalMesh(shape, linear_deflection, False, angular_deflection, parallel)
+    mesh_seconds = time.perf_counter() - start
+
+    mesh = mesh_faces(faces)
+    mesh.timings["mesh"] = mesh_seconds
+    return mesh
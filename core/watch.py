@@ -0,0 +1,419 @@
+"""
+Watch-folder mode: color STEP files as they are dropped into a directory
+
+Changes are picked up with inotify on Linux (through ctypes, no extra
+package) and by polling the directory elsewhere. A file is submitted once
+its writer closed it, or once it stayed unchanged for `settle` seconds, and
+it ends with the STEP trailer. Files whose content was already colored with
+the same criteria are skipped, by stat first and by SHA-256 second; a new
+name for already colored content gets the earlier outputs linked. Jobs
+run on a WorkerPool of warm processes; at most max_pending jobs are queued
+in the pool, the rest wait in a local queue.
+
+Counters (queue depth, files seen, skipped, processed, failed) and the
+drop-to-start and drop-to-done latencies are logged every stats_interval
+seconds and optionally written to a JSON file.
+"""
+
+import collections
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import shutil
+import struct
+import threading
+import time
+
+from core.batch import (criteria_key, is_step_file, is_up_to_date, mesh_paths_for, output_path_for,
+                        summary_path_for, write_summary)
+from core.fingerprint import color_map_path
+from core.shape_cache import file_sha256
+from core.step_scan import scan_step_file
+from core.worker_pool import WorkerPool, PENDING, RUNNING, OK, FAILED, CANCELLED
+
+# Seconds a file must stay unchanged before it is processed, unless its writer closed it
+SETTLE_SECONDS = 0.5
+# Seconds after which a file without the STEP trailer is processed anyway (and reported)
+INCOMPLETE_TIMEOUT = 60.0
+# Seconds between directory scans of the polling watcher
+POLL_INTERVAL = 0.5
+# Seconds between counter reports
+STATS_INTERVAL = 30.0
+# Latencies kept for the percentiles
+LATENCY_SAMPLES = 1000
+
+TRAILER = b"END-ISO-10303-21"
+
+# inotify event masks (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+# struct inotify_event header: wd, mask, cookie, len; the name follows
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _step_files(directory):
+    return [entry.path for entry in os.scandir(directory) if entry.is_file() and is_step_file(entry.path)]
+
+
+class InotifyWatcher:
+    """Changed files of a directory from Linux inotify"""
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self.directory = directory
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"Cannot watch {directory}")
+
+    def wait(self, timeout):
+        """[(path, closed)] of the files changed within timeout seconds
+
+        closed is True when the writer closed the file (or moved it in).
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        changes = []
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length].rstrip(b"\0")
+            offset += _EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped; look at everything again
+                changes.extend((path, False) for path in _step_files(self.directory))
+            elif name:
+                path = os.path.join(self.directory, os.fsdecode(name))
+                if is_step_file(path):
+                    changes.append((path, bool(mask & (IN_CLOSE_WRITE | IN_MOVED_TO))))
+        return changes
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Changed files of a directory from periodic scans"""
+
+    def __init__(self, directory, interval=POLL_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self._snapshot = {}
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        snapshot = {}
+        for path in _step_files(self.directory):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+        changes = [(path, False) for path, key in snapshot.items() if self._snapshot.get(path) != key]
+        self._snapshot = snapshot
+        return changes
+
+    def close(self):
+        pass
+
+
+def make_watcher(directory, polling=False):
+    """inotify watcher when available, else a polling one"""
+    if not polling:
+        try:
+            return InotifyWatcher(directory)
+        except OSError:
+            pass
+    return PollingWatcher(directory)
+
+
+class _Candidate:
+    """A file seen changing, waiting to settle"""
+
+    def __init__(self, now):
+        self.detected = now
+        self.changed = now
+        self.closed = False
+        self.stat = None
+
+
+class WatchStats:
+    """Counters and latencies of a FolderWatcher"""
+
+    def __init__(self):
+        self.counts = collections.Counter()
+        self.start_latency = collections.deque(maxlen=LATENCY_SAMPLES)
+        self.total_latency = collections.deque(maxlen=LATENCY_SAMPLES)
+        self.queue_depth = 0
+
+    @staticmethod
+    def _percentiles(samples):
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+        return {"p50": pick(0.5), "p95": pick(0.95), "max": round(ordered[-1], 3)}
+
+    def to_dict(self):
+        return {
+            "queue_depth": self.queue_depth,
+            "counts": dict(self.counts),
+            "drop_to_start_seconds": self._percentiles(self.start_latency),
+            "drop_to_done_seconds": self._percentiles(self.total_latency),
+        }
+
+    def summary(self):
+        """One line description for logs"""
+        start = self._percentiles(self.start_latency)
+        text = (f"queue {self.queue_depth}, seen {self.counts['seen']}, done {self.counts[OK]}, "
+                f"failed {self.counts[FAILED]}, skipped {self.counts['skipped']}")
+        if start:
+            text += f", drop to start p50 {start['p50']}s p95 {start['p95']}s"
+        return text
+
+
+def _link_or_copy(source, target):
+    """Hardlink source to target (a copy where links fail), with a fresh mtime"""
+    tmp_path = target + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, target)
+    os.utime(target)
+
+
+class FolderWatcher:
+    """Color every STEP file that lands in directory"""
+
+    def __init__(self, directory, output_dir=None, orientation_criteria="auto", coloring_criteria=None,
+                 mesh_formats=(), workers=None, max_pending=None, settle=SETTLE_SECONDS, polling=False,
+                 stats_path=None, stats_interval=STATS_INTERVAL, log=print, **pool_options):
+        self.directory = os.path.abspath(directory)
+        self.output_dir = output_dir
+        self.orientation_criteria = orientation_criteria
+        self.coloring_criteria = coloring_criteria or {"method": "random"}
+        self.mesh_formats = tuple(mesh_formats)
+        self.criteria = criteria_key(orientation_criteria, self.coloring_criteria, self.mesh_formats)
+        self.settle = settle
+        self.stats_path = stats_path
+        self.stats_interval = stats_interval
+        self.log = log
+        self.stats = WatchStats()
+
+        self._candidates = {}
+        self._ready = collections.deque()
+        self._processed_stat = {}  # path -> (size, mtime_ns) last submitted
+        self._processed_hash = {}  # content hash -> output of a successful job
+        self._lock = threading.Lock()
+        self._last_report = time.monotonic()
+
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+        self.watcher = make_watcher(self.directory, polling)
+        self.pool = WorkerPool(workers=workers, on_update=self._on_update, **pool_options)
+        self.max_pending = max_pending or 2 * self.pool.size
+
+    def run(self, stop_event=None):
+        """Process files until stop_event is set (or forever)"""
+        self.log(f"Watching {self.directory} ({type(self.watcher).__name__}, {self.pool.size} worker(s))")
+        now = time.time()
+        for path in _step_files(self.directory):
+            self._touch(path, False, now)
+
+        while stop_event is None or not stop_event.is_set():
+            for path, closed in self.watcher.wait(0.1 if self._candidates else 1.0):
+                self._touch(path, closed, time.time())
+            self._check_candidates()
+            self._submit_ready()
+            self._report()
+
+    def close(self):
+        self.watcher.close()
+        self.pool.shutdown()
+        self._write_stats()
+
+    def _count(self, name):
+        with self._lock:
+            self.stats.counts[name] += 1
+
+    def _touch(self, path, closed, now):
+        candidate = self._candidates.get(path)
+        if candidate is None:
+            candidate = self._candidates[path] = _Candidate(now)
+            self._count("seen")
+        candidate.changed = now
+        candidate.closed = candidate.closed or closed
+
+    def _check_candidates(self):
+        """Move settled files to the ready queue"""
+        now = time.time()
+        for path, candidate in list(self._candidates.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # Removed or renamed before it settled
+                del self._candidates[path]
+                continue
+
+            key = (stat.st_size, stat.st_mtime_ns)
+            if key != candidate.stat:
+                # Still being written
+                candidate.stat = key
+                candidate.changed = now
+                if not candidate.closed:
+                    continue
+            if not candidate.closed and now - candidate.changed < self.settle:
+                continue
+            if not self._has_trailer(path):
+                if now - candidate.detected < INCOMPLETE_TIMEOUT:
+                    candidate.closed = False
+                    continue
+                self.log(f"Warning: {os.path.basename(path)} still has no STEP trailer after "
+                         f"{INCOMPLETE_TIMEOUT:.0f}s; processing it anyway")
+
+            del self._candidates[path]
+            self._ready.append((path, key, candidate.detected))
+
+    @staticmethod
+    def _has_trailer(path):
+        """True when the file ends with the STEP trailer, i.e. was written completely"""
+        try:
+            with open(path, "rb") as f:
+                f.seek(max(0, os.path.getsize(path) - 256))
+                return TRAILER in f.read()
+        except OSError:
+            return False
+
+    def _submit_ready(self):
+        """Submit queued files while the pool has room"""
+        while self._ready and self.pool.counts()[PENDING] < self.max_pending:
+            path, key, detected = self._ready.popleft()
+            self._submit(path, key, detected)
+        counts = self.pool.counts()
+        self.stats.queue_depth = len(self._ready) + counts[PENDING] + counts[RUNNING]
+
+    def _submit(self, path, key, detected):
+        output_path = output_path_for(path, self.output_dir)
+
+        # Same file version as last time, or an output already newer than the input
+        if self._processed_stat.get(path) == key or is_up_to_date(path, output_path, self.criteria):
+            self._count("skipped")
+            return
+        try:
+            # Same content already colored (a copy or a re-export of an unchanged part)
+            digest = file_sha256(path)
+            with self._lock:
+                done = self._processed_hash.get(digest)
+            if done is not None and os.path.exists(done) and self._reuse_outputs(path, output_path, done):
+                self._processed_stat[path] = key
+                with self._lock:
+                    self.stats.counts[OK] += 1
+                    self.stats.total_latency.append(time.time() - detected)
+                return
+
+            stats = scan_step_file(path)
+        except OSError as e:
+            self.log(f"Cannot read {path}: {e}")
+            self._count(FAILED)
+            return
+        if stats.entity_total == 0:
+            self.log(f"Skipped {os.path.basename(path)}: no STEP entities")
+            self._count("skipped")
+            return
+
+        self._processed_stat[path] = key
+        # The context travels with the job, so no update can arrive before it is known
+        self.pool.submit(path, output_path, self.orientation_criteria, self.coloring_criteria,
+                         self.mesh_formats, context=(detected, digest))
+        self.log(f"Queued {os.path.basename(path)} ({stats.summary()})")
+
+    def _reuse_outputs(self, path, output_path, done):
+        """Give path the outputs of done, colored from the same content; False if they are gone"""
+        try:
+            with open(summary_path_for(done), encoding="utf-8") as f:
+                summary = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if os.path.abspath(done) != os.path.abspath(output_path):
+            pairs = [(done, output_path), (color_map_path(done), color_map_path(output_path))]
+            pairs += zip(mesh_paths_for(done, self.mesh_formats), mesh_paths_for(output_path, self.mesh_formats))
+            try:
+                for source, target in pairs:
+                    if os.path.exists(source):
+                        _link_or_copy(source, target)
+            except OSError as e:
+                self.log(f"Cannot reuse {done} for {path}: {e}")
+                return False
+        else:
+            os.utime(output_path)
+
+        summary.update(input=path, output=output_path, seconds=0.0, reused=done)
+        if "meshes" in summary:
+            summary["meshes"] = mesh_paths_for(output_path, self.mesh_formats)
+        write_summary(summary)
+        self.log(f"Colored {os.path.basename(path)}: same content as {os.path.basename(done)} -> {output_path}")
+        return True
+
+    def _on_update(self, job, kind, payload):
+        # Called on the pool's dispatcher thread
+        if job.context is None:
+            return
+        detected, digest = job.context
+        with self._lock:
+            if kind == "started":
+                self.stats.start_latency.append(job.started - detected)
+                return
+            if kind != "finished":
+                return
+
+            self.stats.counts[job.status] += 1
+            if job.status != CANCELLED:
+                self.stats.total_latency.append(job.finished - detected)
+            if job.status == OK:
+                self._processed_hash[digest] = job.output_path
+
+        if job.summary is not None:
+            write_summary(job.summary)
+        name = os.path.basename(job.input_path)
+        if job.status == OK:
+            self.log(f"Colored {name} in {job.elapsed:.1f}s -> {job.output_path}")
+        else:
+            self.log(f"Failed {name}: {job.error}")
+
+    def _report(self):
+        now = time.monotonic()
+        if now - self._last_report < self.stats_interval:
+            return
+        self._last_report = now
+        self.log(self.stats.summary())
+        self._write_stats()
+
+    def _write_stats(self):
+        if self.stats_path is None:
+            return
+        tmp_path = self.stats_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.stats.to_dict(), f, indent=2)
+        os.replace(tmp_path, self.stats_path)
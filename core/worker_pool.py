@@ -0,0 +1,476 @@
+"""
+Pool of persistent worker processes running StepProcessor jobs
+
+Workers are started once with OCCT already imported, so a job starts
+without paying the import cost, and a crash or hang inside OCCT only takes
+down one worker process. Every worker has its own pipes; a dispatcher
+thread in the parent waits on all of them and on the process sentinels, so
+a worker that dies is noticed at once and replaced.
+
+    pool = WorkerPool(workers=2, on_update=lambda job, kind, payload: print(job.status, kind))
+    job = pool.submit("part.stp", "part_colored.step", "auto", {"method": "random"})
+    pool.cancel(job.job_id)
+    pool.shutdown()
+
+on_update(job, kind, payload) is called on the dispatcher thread, never
+with the pool lock held, with kind one of "submitted", "started", "stage",
+"colors", "mesh", "message" and "finished". Updates raised by submit and
+cancel are queued and delivered by the dispatcher, in order.
+"""
+
+import collections
+import itertools
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import traceback
+from multiprocessing.connection import wait
+
+from core import batch
+
+# Job states; finished jobs use the batch summary statuses
+PENDING = "pending"
+RUNNING = "running"
+OK = "ok"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (OK, FAILED, CANCELLED)
+
+DEFAULT_WORKERS = 2
+
+# OCCT symbols imported when a worker starts, so that the first job does not pay for them
+WARM_SYMBOLS = (
+    "STEPControl_Reader",
+    "STEPCAFControl_Writer",
+    "XCAFApp_Application",
+    "BRepGProp",
+    "BRepAdaptor_Surface",
+    "BRepMesh_IncrementalMesh",
+)
+
+# Preview meshes sent back to the parent, in order
+PREVIEW_LODS = ("coarse", "fine")
+
+# Seconds between liveness and timeout checks of the dispatcher
+POLL_INTERVAL = 0.2
+
+# Workers dying before they are ready, in a row, after which the pool gives up
+MAX_STARTUP_FAILURES = 3
+
+
+class Job:
+    """One file to process and its current state"""
+
+    def __init__(self, job_id, input_path, output_path, orientation_criteria, coloring_criteria,
+                 mesh_formats=(), preview=False, preview_key=None, context=None):
+        self.job_id = job_id
+        self.input_path = input_path
+        self.output_path = output_path
+        self.orientation_criteria = orientation_criteria
+        self.coloring_criteria = coloring_criteria
+        self.mesh_formats = tuple(mesh_formats)
+        self.preview = preview
+        self.preview_key = preview_key  # Session key of the mesh the caller already has
+        self.context = context  # Caller data, there from the first update on; not sent to the worker
+
+        self.status = PENDING
+        self.progress = 0
+        self.stage = None
+        self.summary = None
+        self.error = None
+        self.worker = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        """Seconds spent running so far"""
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def spec(self):
+        """Picklable description sent to the worker"""
+        return {
+            "job_id": self.job_id,
+            "input": self.input_path,
+            "output": self.output_path,
+            "orientation": self.orientation_criteria,
+            "coloring": self.coloring_criteria,
+            "mesh_formats": self.mesh_formats,
+            "preview": self.preview,
+            "preview_key": self.preview_key,
+        }
+
+
+def _send_preview(processor, job_id, preview_key, events, preview_dir):
+    """Send the face colors and, unless the caller has it already, the preview meshes"""
+    key = processor.session_key
+    events.send(("colors", job_id, {"key": key, "face_rgb": processor.face_rgb}))
+    if key == preview_key:
+        return
+
+    for lod in PREVIEW_LODS:
+        path = os.path.join(preview_dir, f"job{job_id}_{lod}.npz")
+        processor.tessellate(lod=lod).save(path)
+        events.send(("mesh", job_id, {"key": key, "lod": lod, "path": path}))
+
+
+def _worker_main(inbox, events, init_args, preview_dir):
+    """Entry point of a worker process"""
+    batch._init_worker(*init_args)
+    from core import occ_backend as occ
+    try:
+        for name in WARM_SYMBOLS:
+            getattr(occ, name)
+    except AttributeError:
+        # No usable binding; every job reports the import error instead
+        pass
+    events.send(("ready", None, None))
+
+    while True:
+        try:
+            spec = inbox.recv()
+        except EOFError:
+            return
+        if spec is None:
+            return
+
+        job_id = spec["job_id"]
+        summary = batch._process_one(
+            spec["input"], spec["output"], spec["orientation"], spec["coloring"],
+            mesh_formats=spec["mesh_formats"],
+            progress_callback=lambda event: events.send(("stage", job_id, event)),
+        )
+        if summary["status"] == OK and spec["preview"]:
+            try:
+                _send_preview(batch._processor, job_id, spec["preview_key"], events, preview_dir)
+            except Exception as e:
+                events.send(("message", job_id, f"Preview failed: {str(e)}"))
+        events.send(("done", job_id, summary))
+
+
+class _Worker:
+    """Parent-side handle of one worker process"""
+
+    def __init__(self, context, init_args, preview_dir):
+        inbox_reader, self.inbox = context.Pipe(duplex=False)
+        self.events, events_writer = context.Pipe(duplex=False)
+        self.process = context.Process(
+            target=_worker_main,
+            args=(inbox_reader, events_writer, init_args, preview_dir),
+            daemon=True,
+        )
+        self.process.start()
+        # The child owns these ends; closing ours lets a dead child show up as EOF
+        inbox_reader.close()
+        events_writer.close()
+
+        self.ready = False
+        self.job = None
+        self.last_input = None
+        self.kill_requested = False
+
+    def kill(self):
+        """Kill the process and release its pipes"""
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.inbox.close()
+        self.events.close()
+
+
+class WorkerPool:
+    """Persistent worker processes fed from a job queue"""
+
+    def __init__(self, workers=None, use_cache=True, cache_dir=None, cache_max_bytes=None,
+                 job_timeout=None, on_update=None, low_memory=False, rss_limit=None, parse_workers=None):
+        # spawn everywhere: forking a process that runs Qt or OCCT threads is unsafe
+        self._context = multiprocessing.get_context("spawn")
+        self._init_args = (use_cache, cache_dir, cache_max_bytes, low_memory, rss_limit, parse_workers)
+        self.job_timeout = job_timeout
+        self.on_update = on_update
+        self.preview_dir = tempfile.mkdtemp(prefix="step-coloring-")
+
+        self.jobs = {}
+        self._pending = collections.deque()
+        self._updates = collections.deque()  # (job, kind, payload) waiting for on_update
+        self._ids = itertools.count(1)
+        self._lock = threading.RLock()
+        self._wakeup_reader, self._wakeup_writer = self._context.Pipe(duplex=False)
+        self._wakeup_sent = False
+        self._closed = False
+        self._startup_failures = 0
+        self._startup_error = None
+
+        self._target_size = max(1, workers or DEFAULT_WORKERS)
+        self._workers = [self._spawn() for _ in range(self._target_size)]
+        self._thread = threading.Thread(target=self._run, name="worker-pool", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    @property
+    def size(self):
+        return self._target_size
+
+    def resize(self, workers):
+        """Change the number of worker processes; busy workers retire when their job ends"""
+        with self._lock:
+            self._target_size = max(1, workers)
+            while len(self._workers) < self._target_size and self._startup_error is None:
+                self._workers.append(self._spawn())
+            self._wakeup()
+
+    def submit(self, input_path, output_path, orientation_criteria=None, coloring_criteria=None,
+               mesh_formats=(), preview=False, preview_key=None, context=None):
+        """Queue a file and return its Job; context is kept on the job for on_update"""
+        with self._lock:
+            if self._closed:
+                raise Exception("Worker pool is shut down")
+            job = Job(next(self._ids), input_path, output_path, orientation_criteria,
+                      coloring_criteria, mesh_formats, preview, preview_key, context)
+            self.jobs[job.job_id] = job
+            self._notify(job, "submitted")
+            if self._startup_error is not None:
+                self._finish(job, FAILED, self._startup_error)
+            else:
+                self._pending.append(job)
+            self._wakeup()
+        return job
+
+    def cancel(self, job_id):
+        """Cancel a pending job, or kill the worker running it; True if it was cancelled"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status in FINISHED:
+                return False
+            self._cancel(job)
+            self._wakeup()
+        return True
+
+    def cancel_all(self):
+        """Cancel every job that has not finished"""
+        with self._lock:
+            for job in [job for job in self.jobs.values() if job.status not in FINISHED]:
+                self._cancel(job)
+            self._wakeup()
+
+    def forget(self, job_id):
+        """Drop a finished job from the job table"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is not None and job.status in FINISHED:
+                del self.jobs[job_id]
+
+    def counts(self):
+        """Number of jobs in each state"""
+        with self._lock:
+            return collections.Counter(job.status for job in self.jobs.values())
+
+    def shutdown(self, timeout=5.0):
+        """Cancel pending jobs, stop the workers and remove the preview files"""
+        with self._lock:
+            if self._closed:
+                return
+            for job in list(self._pending):
+                self._finish(job, CANCELLED)
+            self._pending.clear()
+            self._closed = True
+            self._wakeup()
+        self._thread.join()
+
+        for worker in self._workers:
+            try:
+                worker.inbox.send(None)
+            except OSError:
+                pass
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            worker.process.join(max(0.0, deadline - time.monotonic()))
+            worker.kill()
+        self._wakeup_reader.close()
+        self._wakeup_writer.close()
+        shutil.rmtree(self.preview_dir, ignore_errors=True)
+
+    def _spawn(self):
+        return _Worker(self._context, self._init_args, self.preview_dir)
+
+    def _wakeup(self):
+        # Called with the lock held: at most one wakeup waits in the pipe, so
+        # a writer can never block on a full pipe while the dispatcher waits
+        # for the lock to drain it
+        if not self._wakeup_sent:
+            self._wakeup_sent = True
+            self._wakeup_writer.send(None)
+
+    def _cancel(self, job):
+        if job.status == PENDING:
+            self._pending.remove(job)
+        else:
+            # The dispatcher kills and replaces the worker on its next pass
+            job.worker.kill_requested = True
+        self._finish(job, CANCELLED)
+
+    def _notify(self, job, kind, payload=None):
+        # Called with the lock held; _deliver runs on_update once it is released
+        if self.on_update is not None:
+            self._updates.append((job, kind, payload))
+
+    def _deliver(self):
+        """Dispatcher thread, without the lock: pass queued updates to on_update"""
+        while self._updates:
+            job, kind, payload = self._updates.popleft()
+            try:
+                self.on_update(job, kind, payload)
+            except Exception:
+                # A failing listener must not stop the dispatcher
+                traceback.print_exc()
+
+    def _finish(self, job, status, error=None):
+        job.status = status
+        if error is not None:
+            job.error = error
+        job.finished = time.time()
+        self._notify(job, "finished")
+
+    def _run(self):
+        """Dispatcher thread: start jobs, forward worker events, replace dead workers"""
+        while True:
+            with self._lock:
+                if self._closed:
+                    break
+                self._check_workers()
+                self._dispatch()
+                readers = {worker.events: worker for worker in self._workers}
+                sentinels = [worker.process.sentinel for worker in self._workers]
+
+            self._deliver()
+            ready = wait(list(readers) + sentinels + [self._wakeup_reader], timeout=POLL_INTERVAL)
+
+            with self._lock:
+                for obj in ready:
+                    if obj is self._wakeup_reader:
+                        while self._wakeup_reader.poll():
+                            self._wakeup_reader.recv()
+                        self._wakeup_sent = False
+                    elif obj in readers:
+                        self._receive(readers[obj])
+            self._deliver()
+        # Jobs cancelled by shutdown
+        self._deliver()
+
+    def _receive(self, worker):
+        """Handle every message waiting from one worker"""
+        try:
+            while worker.events.poll():
+                self._handle(worker, *worker.events.recv())
+        except (EOFError, OSError):
+            # The process is gone; _check_workers replaces it
+            pass
+
+    def _handle(self, worker, kind, job_id, payload):
+        if kind == "ready":
+            worker.ready = True
+            self._startup_failures = 0
+            return
+
+        job = self.jobs.get(job_id)
+        if job is None or job.worker is not worker or job.status != RUNNING:
+            # Late message of a cancelled or timed out job
+            return
+
+        if kind == "stage":
+            job.stage = payload["stage"]
+            job.progress = payload["progress"]
+            self._notify(job, "stage", payload)
+        elif kind == "done":
+            job.summary = payload
+            job.progress = 100
+            worker.job = None
+            self._finish(job, payload["status"], payload.get("error"))
+        else:
+            self._notify(job, kind, payload)
+
+    def _check_workers(self):
+        """Replace workers that died, timed out or run a cancelled job
+
+        Workers that keep dying before they are ready (a broken binding or
+        environment) are not replaced forever: after MAX_STARTUP_FAILURES in
+        a row the pending jobs fail, and so does every later submission.
+        """
+        for index, worker in enumerate(self._workers):
+            job = worker.job
+            if worker.kill_requested:
+                pass
+            elif not worker.process.is_alive():
+                self._receive(worker)
+                job = worker.job
+                if job is not None and job.status == RUNNING:
+                    self._finish(job, FAILED, f"Worker process exited with code {worker.process.exitcode}")
+                if not worker.ready:
+                    self._startup_failures += 1
+                    if self._startup_failures >= MAX_STARTUP_FAILURES:
+                        self._startup_error = (f"Worker processes exit while starting "
+                                               f"(last exit code {worker.process.exitcode})")
+            elif job is not None and self.job_timeout and job.elapsed > self.job_timeout:
+                self._finish(job, FAILED, f"Timed out after {self.job_timeout:.0f}s")
+            else:
+                continue
+
+            worker.kill()
+            self._workers[index] = None if self._startup_error is not None else self._spawn()
+
+        if self._startup_error is not None:
+            self._workers = [worker for worker in self._workers if worker is not None]
+            for job in list(self._pending):
+                self._finish(job, FAILED, self._startup_error)
+            self._pending.clear()
+
+    def _dispatch(self):
+        """Start pending jobs on idle workers, keeping a file on the worker that has it loaded"""
+        # Shrink to the requested size by stopping idle workers
+        for worker in [w for w in self._workers if w.job is None]:
+            if len(self._workers) <= self._target_size:
+                break
+            self._workers.remove(worker)
+            worker.kill()
+
+        idle = [worker for worker in self._workers if worker.job is None]
+        if not idle or not self._pending:
+            return
+
+        # Same file as a worker's last job first: it reuses that worker's session
+        for job in list(self._pending):
+            worker = next((w for w in idle if w.last_input == job.input_path), None)
+            if worker is not None:
+                self._start(job, worker)
+                idle.remove(worker)
+
+        # Then the remaining jobs in order, warmed-up workers first
+        idle.sort(key=lambda worker: not worker.ready)
+        while idle and self._pending:
+            self._start(self._pending[0], idle.pop(0))
+
+    def _start(self, job, worker):
+        self._pending.remove(job)
+        try:
+            worker.inbox.send(job.spec())
+        except OSError:
+            # Dead worker; the job waits for its replacement
+            self._pending.appendleft(job)
+            return
+        job.status = RUNNING
+        job.worker = worker
+        job.started = time.time()
+        worker.job = job
+        worker.last_input = job.input_path
+        self._notify(job, "started")
@@ -0,0 +1,171 @@
+"""
+Table model of the file queue shown in the main window
+"""
+
+import os
+
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QTimer
+from PyQt5.QtGui import QColor
+
+from core.batch import output_path_for
+from core.worker_pool import PENDING, RUNNING, OK, FAILED, CANCELLED
+
+# Status of a file that has not been submitted yet
+READY = "ready"
+
+STATUS_COLORS = {
+    RUNNING: QColor("#1565c0"),
+    OK: QColor("#2e7d32"),
+    FAILED: QColor("#c62828"),
+    CANCELLED: QColor("#757575"),
+}
+
+# Milliseconds between batched view updates
+FLUSH_INTERVAL = 200
+
+
+class JobRow:
+    """One file in the queue and the job processing it, if any"""
+
+    def __init__(self, input_path, output_path):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.job = None
+
+    @property
+    def status(self):
+        return self.job.status if self.job is not None else READY
+
+    @property
+    def active(self):
+        return self.status in (PENDING, RUNNING)
+
+
+class JobTableModel(QAbstractTableModel):
+    """Per-file status, face count, elapsed time and output path
+
+    Job updates only mark rows as changed; a timer emits one dataChanged for
+    the changed range every FLUSH_INTERVAL ms, so thousands of updates from
+    a large queue do not flood the view.
+    """
+
+    COLUMNS = ("File", "Status", "Faces", "Elapsed", "Output")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        self._row_of_input = {}
+        self._row_of_job = {}
+        self._dirty = set()
+        self._running = set()
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(FLUSH_INTERVAL)
+        self._timer.timeout.connect(self.flush)
+        self._timer.start()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        column = index.column()
+
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return os.path.basename(row.input_path)
+            if column == 1:
+                if row.status == RUNNING and row.job.stage:
+                    return f"{RUNNING} ({row.job.stage})"
+                return row.status
+            if column == 2:
+                summary = row.job.summary if row.job is not None else None
+                return f"{summary['faces']:,}" if summary and summary.get("faces") else ""
+            if column == 3:
+                return f"{row.job.elapsed:.1f}s" if row.job is not None and row.job.started else ""
+            if column == 4:
+                return row.output_path
+        elif role == Qt.ToolTipRole:
+            if column == 1 and row.job is not None and row.job.error:
+                return row.job.error
+            if column in (0, 4):
+                return row.input_path if column == 0 else row.output_path
+        elif role == Qt.ForegroundRole and column == 1:
+            return STATUS_COLORS.get(row.status)
+        elif role == Qt.TextAlignmentRole and column in (2, 3):
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def add_files(self, paths, output_dir=None):
+        """Append files that are not queued yet; returns the number added"""
+        new_paths = []
+        for path in paths:
+            path = os.path.abspath(path)
+            if path not in self._row_of_input and path not in new_paths:
+                new_paths.append(path)
+        if not new_paths:
+            return 0
+
+        first = len(self.rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(new_paths) - 1)
+        for offset, path in enumerate(new_paths):
+            self._row_of_input[path] = first + offset
+            self.rows.append(JobRow(path, output_path_for(path, output_dir)))
+        self.endInsertRows()
+        return len(new_paths)
+
+    def clear_inactive(self):
+        """Remove every row whose job is not pending or running"""
+        self.beginResetModel()
+        self.rows = [row for row in self.rows if row.active]
+        self._row_of_input = {row.input_path: i for i, row in enumerate(self.rows)}
+        self._row_of_job = {row.job.job_id: i for i, row in enumerate(self.rows)}
+        self._running = {i for i, row in enumerate(self.rows) if row.status == RUNNING}
+        self._dirty.clear()
+        self.endResetModel()
+
+    def row_at(self, row_index):
+        return self.rows[row_index]
+
+    def attach_job(self, row, job):
+        """Link a submitted job to its row"""
+        row.job = job
+        self._row_of_job[job.job_id] = self._row_of_input[row.input_path]
+        self._dirty.add(self._row_of_job[job.job_id])
+
+    def update_job(self, job):
+        """Mark the row of job as changed; the view is updated on the next flush"""
+        row_index = self._row_of_job.get(job.job_id)
+        if row_index is None:
+            return
+        self._dirty.add(row_index)
+        if job.status == RUNNING:
+            self._running.add(row_index)
+        else:
+            self._running.discard(row_index)
+
+    def flush(self):
+        """Emit one dataChanged for the changed rows and the running ones (elapsed time)"""
+        dirty = self._dirty | self._running
+        if not dirty:
+            return
+        self._dirty = set()
+        last_column = len(self.COLUMNS) - 1
+        self.dataChanged.emit(self.index(min(dirty), 0), self.index(max(dirty), last_column))
+
+    def counts(self):
+        """Number of rows in each status"""
+        counts = {}
+        for row in self.rows:
+            counts[row.status] = counts.get(row.status, 0) + 1
+        return counts
@@ -7,87 +7,96 @@ import os
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QPushButton, QLabel, QFileDialog, 
                              QComboBox, QGroupBox, QTextEdit, QProgressBar,
-                             QMessageBox, QFrame, QGridLayout)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
+                             QMessageBox, QFrame, QGridLayout, QSpinBox,
+                             QTableView, QAbstractItemView, QHeaderView)
+from PyQt5.QtCore import Qt, QObject, QThread, QItemSelectionModel, pyqtSignal
 from PyQt5.QtGui import QFont, QIcon, QPalette, QColor
 
-from core.step_processor import StepProcessor
+from core.batch import collect_input_files, is_step_file
+from core.step_scan import scan_step_file
+from core.tessellation import Mesh
+from core.worker_pool import WorkerPool, OK, CANCELLED
+from gui.job_table import JobTableModel
+from gui.preview import PreviewWidget
 
 
-class ProcessingThread(QThread):
-    """Thread for processing STEP files to avoid GUI freezing"""
+class PoolEvents(QObject):
+    """Carries worker pool updates from the dispatcher thread to the GUI thread"""
     
-    progress = pyqtSignal(int)
-    status = pyqtSignal(str)
-    finished = pyqtSignal(bool, str)
+    update = pyqtSignal(object, str, object)
+
+
+class ScanThread(QThread):
+    """Pre-scans one STEP file off the GUI thread"""
     
-    def __init__(self, input_path, output_path, orientation_criteria, coloring_criteria):
-        super().__init__()
-        self.input_path = input_path
-        self.output_path = output_path
-        self.orientation_criteria = orientation_criteria
-        self.coloring_criteria = coloring_criteria
-        self.processor = StepProcessor()
+    scanned = pyqtSignal(str, str)
+    
+    def __init__(self, file_path, parent=None):
+        super().__init__(parent)
+        self.file_path = file_path
     
     def run(self):
         try:
-            self.status.emit("Loading STEP file...")
-            self.progress.emit(20)
-            
-            self.status.emit("Processing orientation...")
-            self.progress.emit(40)
-            
-            self.status.emit("Applying face colors...")
-            self.progress.emit(60)
-            
-            self.status.emit("Saving colored STEP file...")
-            self.progress.emit(80)
-            
-            # Process the file
-            success = self.processor.process_file(
-                self.input_path, 
-                self.output_path, 
-                self.orientation_criteria, 
-                self.coloring_criteria
-            )
-            
-            self.progress.emit(100)
-            self.status.emit("Processing complete!")
-            
-            if success:
-                self.finished.emit(True, f"Successfully created: {os.path.basename(self.output_path)}")
-            else:
-                self.finished.emit(False, "Processing failed")
-                
-        except Exception as e:
-            self.finished.emit(False, f"Error: {str(e)}")
+            file_size = os.path.getsize(self.file_path)
+            stats = scan_step_file(self.file_path)
+            text = f"File size: {file_size:,} bytes | {stats.summary()}"
+        except (OSError, ValueError) as e:
+            text = f"Could not pre-scan {os.path.basename(self.file_path)}: {e}"
+        self.scanned.emit(self.file_path, text)
 
 
 class MainWindow(QMainWindow):
     """Main application window"""
     
+    STAGE_MESSAGES = {
+        "read": "Loading STEP file...",
+        "transfer": "Transferring shapes...",
+        "orient": "Processing orientation...",
+        "features": "Extracting face features...",
+        "color": "Applying face colors...",
+        "write": "Saving colored STEP file...",
+    }
+    
+    # Files processed at the same time by default (worker processes kept warm with OCCT loaded)
+    DEFAULT_JOBS = 2
+    
     def __init__(self):
         super().__init__()
-        self.input_file_path = None
-        self.output_file_path = None
-        self.processing_thread = None
+        self.preview_job = None
+        self.scan_path = None
+        self.scan_threads = set()  # Running pre-scans, kept alive until they finish
+        
+        # OCCT runs in worker processes: a crash there cannot take down the
+        # GUI, and a job can be killed. A worker keeps the last file loaded,
+        # so changing only the coloring does not reload it.
+        self.pool_events = PoolEvents()
+        self.pool_events.update.connect(self.on_pool_update)
+        self.pool = WorkerPool(workers=self.DEFAULT_JOBS, on_update=self.pool_events.update.emit)
         
         self.init_ui()
         self.setup_styles()
+        
+        # Files and folders can be dropped anywhere on the window
+        self.setAcceptDrops(True)
     
     def init_ui(self):
         """Initialize the user interface"""
         self.setWindowTitle("STEP File Face Coloring Tool")
-        self.setGeometry(100, 100, 800, 600)
+        self.setGeometry(100, 100, 1400, 800)
         
         # Central widget
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
         
+        # Controls on the left, 3D preview on the right
+        root_layout = QHBoxLayout(central_widget)
+        root_layout.setContentsMargins(20, 20, 20, 20)
+        root_layout.setSpacing(20)
+        
         # Main layout
-        main_layout = QVBoxLayout(central_widget)
+        main_layout = QVBoxLayout()
         main_layout.setSpacing(20)
-        main_layout.setContentsMargins(20, 20, 20, 20)
+        root_layout.addLayout(main_layout, 1)
         
         # Title
         title_label = QLabel("STEP File Face Coloring Tool")
@@ -114,28 +123,45 @@ class MainWindow(QMainWindow):
         status_group = self.create_status_group()
         main_layout.addWidget(status_group)
         
-        # Add stretch to push everything to the top
-        main_layout.addStretch()
+        # Preview section
+        preview_group = self.create_preview_group()
+        root_layout.addWidget(preview_group, 1)
     
     def create_file_selection_group(self):
-        """Create file selection group"""
-        group = QGroupBox("File Selection")
+        """Create file queue group"""
+        group = QGroupBox("Files")
         layout = QVBoxLayout(group)
         
-        # Input file selection
-        input_layout = QHBoxLayout()
-        self.input_file_label = QLabel("No file selected")
-        self.input_file_label.setStyleSheet("border: 1px solid #ccc; padding: 8px; background-color: #f9f9f9;")
-        input_layout.addWidget(self.input_file_label, 1)
+        # Buttons to add files and folders; both can also be dropped on the window
+        buttons_layout = QHBoxLayout()
+        self.select_file_btn = QPushButton("Add Files")
+        self.select_file_btn.clicked.connect(self.select_input_files)
+        buttons_layout.addWidget(self.select_file_btn)
         
-        self.select_file_btn = QPushButton("Select File")
-        self.select_file_btn.clicked.connect(self.select_input_file)
-        input_layout.addWidget(self.select_file_btn)
+        self.select_folder_btn = QPushButton("Add Folder")
+        self.select_folder_btn.clicked.connect(self.select_input_folder)
+        buttons_layout.addWidget(self.select_folder_btn)
         
-        layout.addLayout(input_layout)
+        self.clear_btn = QPushButton("Clear Finished")
+        self.clear_btn.clicked.connect(self.clear_finished)
+        buttons_layout.addWidget(self.clear_btn)
+        layout.addLayout(buttons_layout)
+        
+        # Job table
+        self.job_model = JobTableModel(self)
+        self.job_table = QTableView()
+        self.job_table.setModel(self.job_model)
+        self.job_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.job_table.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.job_table.verticalHeader().setVisible(False)
+        self.job_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.job_table.horizontalHeader().setStretchLastSection(True)
+        self.job_table.setMinimumHeight(200)
+        self.job_table.selectionModel().currentRowChanged.connect(self.on_current_row_changed)
+        layout.addWidget(self.job_table)
         
         # File info
-        self.file_info_label = QLabel("")
+        self.file_info_label = QLabel("Drop STEP files or folders here")
         self.file_info_label.setStyleSheet("color: #666; font-size: 12px;")
         layout.addWidget(self.file_info_label)
         
@@ -155,7 +181,8 @@ class MainWindow(QMainWindow):
         # Coloring settings
         layout.addWidget(QLabel("Coloring Method:"), 1, 0)
         self.coloring_combo = QComboBox()
-        self.coloring_combo.addItems(["Random Colors", "Gradient", "Custom Palette"])
+        self.coloring_combo.addItems(["Random Colors", "Gradient", "Custom Palette", "Adjacency",
+                                      "Surface Type", "Normal Direction", "Area Bands", "Height Bands"])
         layout.addWidget(self.coloring_combo, 1, 1)
         
         # Color count
@@ -165,6 +192,14 @@ class MainWindow(QMainWindow):
         self.color_count_combo.setCurrentText("10")
         layout.addWidget(self.color_count_combo, 2, 1)
         
+        # Number of files processed at the same time
+        layout.addWidget(QLabel("Parallel Jobs:"), 3, 0)
+        self.jobs_spin = QSpinBox()
+        self.jobs_spin.setRange(1, max(1, os.cpu_count() or 1))
+        self.jobs_spin.setValue(min(self.DEFAULT_JOBS, self.jobs_spin.maximum()))
+        self.jobs_spin.valueChanged.connect(self.pool.resize)
+        layout.addWidget(self.jobs_spin, 3, 1)
+        
         return group
     
     def create_processing_group(self):
@@ -173,12 +208,19 @@ class MainWindow(QMainWindow):
         layout = QVBoxLayout(group)
         
         # Process button
-        self.process_btn = QPushButton("Process File")
+        self.process_btn = QPushButton("Process Files")
         self.process_btn.setMinimumHeight(40)
-        self.process_btn.clicked.connect(self.process_file)
+        self.process_btn.setToolTip("Process the selected files, or every file when none is selected")
+        self.process_btn.clicked.connect(self.process_files)
         self.process_btn.setEnabled(False)
         layout.addWidget(self.process_btn)
         
+        # Cancel button
+        self.cancel_btn = QPushButton("Cancel")
+        self.cancel_btn.clicked.connect(self.cancel_processing)
+        self.cancel_btn.setEnabled(False)
+        layout.addWidget(self.cancel_btn)
+        
         # Progress bar
         self.progress_bar = QProgressBar()
         self.progress_bar.setVisible(False)
@@ -200,6 +242,18 @@ class MainWindow(QMainWindow):
         
         return group
     
+    def create_preview_group(self):
+        """Create 3D preview group"""
+        group = QGroupBox("Preview")
+        layout = QVBoxLayout(group)
+        
+        self.preview = PreviewWidget()
+        self.preview.setMinimumSize(400, 400)
+        self.preview.status.connect(self.update_status)
+        layout.addWidget(self.preview)
+        
+        return group
+    
     def setup_styles(self):
         """Setup application styles"""
         self.setStyleSheet("""
@@ -246,44 +300,87 @@ class MainWindow(QMainWindow):
             }
         """)
     
-    def select_input_file(self):
-        """Select input STEP file"""
-        file_path, _ = QFileDialog.getOpenFileName(
+    def select_input_files(self):
+        """Add STEP files to the queue"""
+        file_paths, _ = QFileDialog.getOpenFileNames(
             self,
-            "Select STEP File",
+            "Select STEP Files",
             "",
             "STEP Files (*.stp *.step);;All Files (*)"
         )
+        self.add_input_paths(file_paths)
+    
+    def select_input_folder(self):
+        """Add every STEP file of a folder to the queue"""
+        folder = QFileDialog.getExistingDirectory(self, "Select Folder of STEP Files")
+        if folder:
+            self.add_input_paths([folder])
+    
+    def add_input_paths(self, paths):
+        """Add files and the STEP files of folders to the queue"""
+        files = [path for path in paths if os.path.isfile(path) and is_step_file(path)]
+        files += collect_input_files([path for path in paths if os.path.isdir(path)])
+        added = self.job_model.add_files(files)
         
-        if file_path:
-            self.input_file_path = file_path
-            filename = os.path.basename(file_path)
-            self.input_file_label.setText(filename)
-            
-            # Generate output filename
-            base_name = os.path.splitext(filename)[0]
-            output_dir = os.path.dirname(file_path)
-            self.output_file_path = os.path.join(output_dir, f"{base_name}_colored.step")
-            
-            # Update file info
-            file_size = os.path.getsize(file_path)
-            self.file_info_label.setText(f"File size: {file_size:,} bytes")
-            
-            # Enable process button
+        if added:
+            self.status_text.append(f"Added {added} file(s) to the queue")
             self.process_btn.setEnabled(True)
-            
-            self.status_text.append(f"Selected file: {filename}")
+            if not self.job_table.currentIndex().isValid():
+                # Current (pre-scanned, previewed) but not selected, so that
+                # Process still means every file
+                self.job_table.selectionModel().setCurrentIndex(
+                    self.job_model.index(0, 0), QItemSelectionModel.NoUpdate)
     
-    def process_file(self):
-        """Process the selected STEP file"""
-        if not self.input_file_path:
-            QMessageBox.warning(self, "Warning", "Please select a STEP file first.")
+    def dragEnterEvent(self, event):
+        """Accept dragged local files and folders"""
+        if event.mimeData().hasUrls():
+            event.acceptProposedAction()
+    
+    def dropEvent(self, event):
+        """Queue dropped files and folders"""
+        paths = [url.toLocalFile() for url in event.mimeData().urls() if url.isLocalFile()]
+        self.add_input_paths(paths)
+        event.acceptProposedAction()
+    
+    def on_current_row_changed(self, current, previous):
+        """Show the pre-scan summary of the current file"""
+        if not current.isValid():
             return
+        file_path = self.job_model.row_at(current.row()).input_path
         
-        # Disable process button and show progress
-        self.process_btn.setEnabled(False)
-        self.progress_bar.setVisible(True)
-        self.progress_bar.setValue(0)
+        # Update file info from a quick pre-scan (no geometry is built); large
+        # files take a while, so it runs on its own thread
+        self.scan_path = file_path
+        self.file_info_label.setText(f"Scanning {os.path.basename(file_path)}...")
+        thread = ScanThread(file_path, self)
+        thread.scanned.connect(self.on_file_scanned)
+        thread.finished.connect(lambda: self.scan_threads.discard(thread))
+        self.scan_threads.add(thread)
+        thread.start()
+    
+    def on_file_scanned(self, file_path, text):
+        """Show a pre-scan result, unless another file became current meanwhile"""
+        if file_path == self.scan_path:
+            self.file_info_label.setText(text)
+    
+    def clear_finished(self):
+        """Remove every file that is not queued or running"""
+        self.job_model.clear_inactive()
+        self.process_btn.setEnabled(self.job_model.rowCount() > 0)
+    
+    def selected_rows(self):
+        """Rows selected in the table, or every row when nothing is selected"""
+        indexes = self.job_table.selectionModel().selectedRows()
+        if indexes:
+            return [self.job_model.row_at(index.row()) for index in sorted(indexes, key=lambda i: i.row())]
+        return list(self.job_model.rows)
+    
+    def process_files(self):
+        """Queue the selected files (all files if none is selected) on the worker pool"""
+        rows = [row for row in self.selected_rows() if not row.active]
+        if not rows:
+            QMessageBox.warning(self, "Warning", "Please add STEP files that are not already queued.")
+            return
         
         # Get settings
         orientation_criteria = self.orientation_combo.currentText().lower().replace(" ", "_")
@@ -292,36 +389,98 @@ class MainWindow(QMainWindow):
             "count": int(self.color_count_combo.currentText())
         }
         
-        # Start processing thread
-        self.processing_thread = ProcessingThread(
-            self.input_file_path,
-            self.output_file_path,
-            orientation_criteria,
-            coloring_criteria
-        )
+        # Only the current file is sent to the preview; the worker skips
+        # meshes the preview already shows
+        current = self.job_table.currentIndex()
+        preview_row = self.job_model.row_at(current.row()) if current.isValid() else rows[0]
+        if preview_row not in rows:
+            preview_row = rows[0]
         
-        self.processing_thread.progress.connect(self.progress_bar.setValue)
-        self.processing_thread.status.connect(self.update_status)
-        self.processing_thread.finished.connect(self.processing_finished)
+        for row in rows:
+            preview = row is preview_row and self.preview.view is not None
+            job = self.pool.submit(
+                row.input_path,
+                row.output_path,
+                orientation_criteria,
+                coloring_criteria,
+                preview=preview,
+                preview_key=self.preview.mesh_key if preview else None,
+            )
+            self.job_model.attach_job(row, job)
+            if preview:
+                self.preview_job = job
         
-        self.processing_thread.start()
+        # Show overall progress; more files can be queued while these run
+        self.progress_bar.setVisible(True)
+        self.cancel_btn.setEnabled(True)
+        self.update_progress()
+    
+    def cancel_processing(self):
+        """Cancel every queued and running job; running workers are killed and replaced"""
+        self.pool.cancel_all()
+    
+    def on_pool_update(self, job, kind, payload):
+        """Handle a worker pool update on the GUI thread"""
+        self.job_model.update_job(job)
+        
+        # Stage messages only for the previewed file, to keep the log readable
+        if kind == "stage" and job is self.preview_job:
+            if payload["event"] == "start":
+                self.update_status(self.STAGE_MESSAGES.get(payload["stage"], payload["stage"]))
+            elif "error" in payload:
+                self.update_status(f"  {payload['stage']}: failed after {payload['seconds']:.2f}s")
+            elif payload.get("reused"):
+                self.update_status(f"  {payload['stage']}: reused from previous run")
+            else:
+                self.update_status(f"  {payload['stage']}: {payload['seconds']:.2f}s")
+        elif kind == "colors":
+            self.preview.show_colors(payload["key"], payload["face_rgb"])
+        elif kind == "mesh":
+            mesh = Mesh.load(payload["path"])
+            os.remove(payload["path"])
+            self.preview.show_mesh(payload["key"], payload["lod"], mesh)
+        elif kind == "message":
+            self.update_status(payload)
+        elif kind == "finished":
+            self.job_finished(job)
     
     def update_status(self, message):
         """Update status text"""
         self.status_text.append(message)
         self.status_text.ensureCursorVisible()
     
-    def processing_finished(self, success, message):
-        """Handle processing completion"""
-        self.progress_bar.setVisible(False)
-        self.process_btn.setEnabled(True)
-        
-        if success:
-            self.status_text.append(f"✓ {message}")
-            QMessageBox.information(self, "Success", message)
+    def update_progress(self):
+        """Show the share of queued files that have finished"""
+        counts = self.job_model.counts()
+        active = counts.get("pending", 0) + counts.get("running", 0)
+        done = sum(count for status, count in counts.items() if status not in ("pending", "running", "ready"))
+        total = active + done
+        self.progress_bar.setValue(int(100 * done / total) if total else 100)
+        return active
+    
+    def job_finished(self, job):
+        """Handle the completion of a job"""
+        name = os.path.basename(job.input_path)
+        if job.status == OK:
+            self.status_text.append(f"✓ {name} -> {os.path.basename(job.output_path)} ({job.elapsed:.2f}s)")
+        elif job.status == CANCELLED:
+            self.status_text.append(f"✗ {name}: cancelled")
         else:
-            self.status_text.append(f"✗ {message}")
-            QMessageBox.critical(self, "Error", message)
+            self.status_text.append(f"✗ {name}: {job.error}")
+        
+        if self.update_progress() == 0:
+            counts = self.job_model.counts()
+            self.progress_bar.setVisible(False)
+            self.cancel_btn.setEnabled(False)
+            self.status_text.append(f"Queue finished: {counts.get(OK, 0)} processed, "
+                                    f"{counts.get('failed', 0)} failed, {counts.get(CANCELLED, 0)} cancelled")
+    
+    def closeEvent(self, event):
+        """Stop the worker processes and pre-scans before the window goes away"""
+        self.pool.shutdown()
+        for thread in list(self.scan_threads):
+            thread.wait()
+        super().closeEvent(event)
 
 
 def main():
@@ -0,0 +1,119 @@
+"""
+3D preview of the colored shape with VTK
+"""
+
+import numpy as np
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel
+from PyQt5.QtCore import Qt, pyqtSignal
+
+try:
+    from vtkmodules.vtkCommonCore import vtkPoints
+    from vtkmodules.vtkCommonDataModel import vtkCellArray, vtkPolyData
+    from vtkmodules.vtkRenderingCore import vtkActor, vtkPolyDataMapper, vtkRenderer
+    from vtkmodules.util.numpy_support import numpy_to_vtk
+    from vtkmodules.qt.QVTKRenderWindowInteractor import QVTKRenderWindowInteractor
+    import vtkmodules.vtkRenderingOpenGL2  # noqa: F401  (registers the render window)
+    import vtkmodules.vtkInteractionStyle  # noqa: F401  (registers the interactor styles)
+    VTK_AVAILABLE = True
+except ImportError:
+    VTK_AVAILABLE = False
+
+
+class PreviewWidget(QWidget):
+    """Interactive view of the last processed shape
+
+    Meshes come from the worker processes, tagged with the session key of
+    the oriented shape they belong to. The vertex, triangle and color
+    buffers are handed to VTK without copying. Recoloring the shape that
+    is already shown writes the new per-triangle colors into the existing
+    color array, so it neither re-meshes nor rebuilds the VTK pipeline.
+    """
+
+    status = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.mesh = None
+        self.mesh_key = None
+        self.face_rgb = None
+        self.color_key = None
+        self._colors = None
+        self._vtk_colors = None
+        self._buffers = None  # NumPy arrays VTK reads from; must outlive the polydata
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        if not VTK_AVAILABLE:
+            label = QLabel("3D preview requires vtk (pip install vtk)")
+            label.setAlignment(Qt.AlignCenter)
+            layout.addWidget(label)
+            self.view = None
+            return
+
+        self.view = QVTKRenderWindowInteractor(self)
+        layout.addWidget(self.view)
+
+        self.renderer = vtkRenderer()
+        self.renderer.SetBackground(0.96, 0.96, 0.96)
+        self.view.GetRenderWindow().AddRenderer(self.renderer)
+
+        self.polydata = vtkPolyData()
+        mapper = vtkPolyDataMapper()
+        mapper.SetInputData(self.polydata)
+        self.actor = vtkActor()
+        self.actor.SetMapper(mapper)
+        self.renderer.AddActor(self.actor)
+
+        self.view.Initialize()
+
+    def show_colors(self, key, face_rgb):
+        """Set the per-face colors of the shape with session key; recolors in place if it is shown"""
+        self.face_rgb = face_rgb
+        self.color_key = key
+        if key == self.mesh_key:
+            self.update_colors(face_rgb)
+
+    def show_mesh(self, key, lod, mesh):
+        """Swap in a mesh (a level of detail) of the shape whose colors were set last"""
+        if self.view is None or key != self.color_key:
+            return
+
+        first = key != self.mesh_key
+        self.mesh = mesh
+        self.mesh_key = key
+
+        # VTK wraps the vertex, connectivity and color buffers without copying:
+        # Mesh keeps triangles as int64, the layout vtkCellArray uses natively.
+        # Only the offsets array is built here.
+        connectivity = np.ascontiguousarray(mesh.triangles, dtype=np.int64).reshape(-1)
+        offsets = np.arange(0, len(connectivity) + 1, 3, dtype=np.int64)
+        self._colors = mesh.triangle_colors(self.face_rgb)
+        self._buffers = (mesh.vertices, connectivity, offsets, self._colors)
+
+        points = vtkPoints()
+        points.SetData(numpy_to_vtk(mesh.vertices, deep=False))
+        cells = vtkCellArray()
+        cells.SetData(numpy_to_vtk(offsets, deep=False), numpy_to_vtk(connectivity, deep=False))
+        self._vtk_colors = numpy_to_vtk(self._colors, deep=False)
+        self._vtk_colors.SetName("colors")
+
+        self.polydata.SetPoints(points)
+        self.polydata.SetPolys(cells)
+        self.polydata.GetCellData().SetScalars(self._vtk_colors)
+        self.polydata.Modified()
+
+        if first:
+            self.renderer.ResetCamera()
+        self.view.GetRenderWindow().Render()
+        self.status.emit(f"Preview ({lod}): {len(mesh):,} triangles, "
+                         f"{mesh.triangles_per_second:,.0f} triangles/s")
+
+    def update_colors(self, face_rgb):
+        """Recolor the shown mesh in place"""
+        self.face_rgb = face_rgb
+        if self.view is None or self.mesh is None or self._colors is None:
+            return
+        self.mesh.triangle_colors(face_rgb, out=self._colors)
+        self._vtk_colors.Modified()
+        self.view.GetRenderWindow().Render()
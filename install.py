@@ -27,7 +27,6 @@ def check_dependencies():
     
     required_modules = [
         ("PyQt5", "PyQt5"),
-        ("OCC", "pythonocc-core"),
         ("numpy", "numpy")
     ]
     
@@ -40,6 +39,14 @@ def check_dependencies():
             print(f"✗ {package_name} is missing")
             missing.append(package_name)
     
+    # Either OCC binding will do
+    from core import occ_backend
+    if occ_backend.is_available():
+        print(f"✓ {occ_backend.binding_name()} is available")
+    else:
+        print("✗ cadquery-ocp or pythonocc-core is missing")
+        missing.append("cadquery-ocp")
+    
     return len(missing) == 0
 
 
@@ -2,10 +2,17 @@
 """
 STEP File Face Coloring Tool - Main Entry Point
 
-A lightweight Python application for Windows that orients a solid body 
+A lightweight Python application for Windows that orients a solid body
 and colors faces of STEP files (.stp / .step) according to user-defined criteria.
+
+Run without arguments to start the GUI, or use `main.py batch <dir|glob>`
+to process many files headlessly, `main.py serve` to run a local job
+service that keeps warm worker processes between requests, or
+`main.py watch <dir>` to color STEP files as they are dropped into a folder.
 """
 
+import argparse
+import json
 import sys
 import os
 
@@ -13,23 +20,225 @@ import os
 project_root = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, project_root)
 
-try:
-    from gui.main_window import main as gui_main
-except ImportError as e:
-    print(f"Error importing GUI components: {e}")
-    print("Please ensure all dependencies are installed:")
-    print("pip install -r requirements.txt")
-    sys.exit(1)
+
+def add_processing_arguments(parser):
+    """Options of how each file is colored, shared by batch and watch"""
+    parser.add_argument("--orientation", default="auto", help="Orientation criteria")
+    parser.add_argument("--coloring", default="random", help="Coloring method")
+    parser.add_argument("--count", type=int, default=10, help="Number of colors (or bands)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Seed of the random palette (default: 0, reruns give the same colors)")
+    parser.add_argument("--rules", default=None,
+                        help="JSON file with coloring rules; implies --coloring rules")
+    parser.add_argument("--color-map", default=None,
+                        help="Color map (<name>_colored.colors.npy) of an earlier revision; "
+                             "faces that did not change keep their color")
+    parser.add_argument("--export-mesh", action="append", choices=["glb", "ply"], default=[],
+                        help="Also write the colored mesh as <name>_colored.glb / .ply (repeatable)")
+    parser.add_argument("--parse-workers", type=int, default=None,
+                        help="Experimental: index the STEP entities on N processes while OCCT reads "
+                             "the file, so patched outputs skip their own scan")
+
+
+def add_worker_arguments(parser):
+    """Options of the worker processes, shared by batch, watch and serve"""
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the parsed shape cache")
+    parser.add_argument("--cache-dir", default=None, help="Directory of the parsed shape cache")
+    parser.add_argument("--cache-size-mb", type=int, default=None, help="Maximum size of the shape cache")
+    parser.add_argument("--low-memory", action="store_true",
+                        help="Free the parsed STEP model right after the transfer")
+    parser.add_argument("--rss-limit-mb", type=int, default=None,
+                        help="Above this resident memory per worker, meshing runs on one thread")
+
+
+def worker_options_from_args(args):
+    """Keyword arguments of the worker options, as batch, WorkerPool and JobService take them"""
+    return {
+        "use_cache": not args.no_cache,
+        "cache_dir": args.cache_dir,
+        "cache_max_bytes": args.cache_size_mb * 1024 * 1024 if args.cache_size_mb else None,
+        "low_memory": args.low_memory,
+        "rss_limit": args.rss_limit_mb * 1024 * 1024 if args.rss_limit_mb else None,
+    }
+
+
+def build_parser():
+    """Build the command line parser"""
+    parser = argparse.ArgumentParser(description="STEP File Face Coloring Tool")
+    subparsers = parser.add_subparsers(dest="command")
+
+    batch = subparsers.add_parser("batch", help="Color a directory or glob of STEP files")
+    batch.add_argument("inputs", nargs="+", help="Directories or glob patterns of STEP files")
+    batch.add_argument("-j", "--workers", type=int, default=None,
+                       help="Number of worker processes (default: CPU count)")
+    batch.add_argument("-o", "--output-dir", default=None,
+                       help="Directory for colored files (default: next to each input)")
+    add_processing_arguments(batch)
+    batch.add_argument("--force", action="store_true", help="Reprocess files whose output is up to date")
+    batch.add_argument("--profile", action="store_true",
+                       help="Write a per-stage timing/memory report (<name>_colored.profile.json + .folded)")
+    add_worker_arguments(batch)
+
+    watch = subparsers.add_parser("watch", help="Color STEP files as they land in a directory")
+    watch.add_argument("directory", help="Directory to watch")
+    watch.add_argument("-j", "--workers", type=int, default=None,
+                       help="Number of worker processes (default: 2)")
+    watch.add_argument("-o", "--output-dir", default=None,
+                       help="Directory for colored files (default: next to each input)")
+    add_processing_arguments(watch)
+    watch.add_argument("--settle", type=float, default=0.5,
+                       help="Seconds a file must stay unchanged before it is processed")
+    watch.add_argument("--max-pending", type=int, default=None,
+                       help="Jobs queued in the worker pool at once (default: twice the workers)")
+    watch.add_argument("--poll", action="store_true", help="Poll the directory instead of using inotify")
+    watch.add_argument("--stats-file", default=None,
+                       help="Write queue depth, counters and latencies to this JSON file")
+    watch.add_argument("--job-timeout", type=float, default=None,
+                       help="Seconds after which a running job is killed")
+    add_worker_arguments(watch)
+
+    serve = subparsers.add_parser("serve", help="Run a local HTTP/JSON job service")
+    serve.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    serve.add_argument("--port", type=int, default=8765, help="TCP port to listen on")
+    serve.add_argument("--socket", default=None, help="Listen on this Unix socket instead of TCP")
+    serve.add_argument("-j", "--workers", type=int, default=None,
+                       help="Number of worker processes (default: 2)")
+    serve.add_argument("-o", "--output-dir", default=None,
+                       help="Directory for colored files when a job gives no output path")
+    serve.add_argument("--max-pending", type=int, default=256,
+                       help="Queued jobs above which submissions get 429")
+    serve.add_argument("--max-connections", type=int, default=64,
+                       help="Open connections above which requests get 503")
+    serve.add_argument("--job-timeout", type=float, default=None,
+                       help="Seconds after which a running job is killed")
+    add_worker_arguments(serve)
+
+    return parser
+
+
+def run_gui():
+    """Launch the GUI application"""
+    try:
+        from gui.main_window import main as gui_main
+    except ImportError as e:
+        print(f"Error importing GUI components: {e}")
+        print("Please ensure all dependencies are installed:")
+        print("pip install -r requirements.txt")
+        sys.exit(1)
+
+    gui_main()
+
+
+def coloring_criteria_from_args(args):
+    """Coloring criteria dict of the batch / watch options"""
+    from core.coloring_rules import validate_rules
+
+    coloring_criteria = {"method": args.coloring, "count": args.count}
+    if args.seed is not None:
+        coloring_criteria["seed"] = args.seed
+    if args.rules:
+        with open(args.rules, encoding="utf-8") as f:
+            rules = json.load(f)
+        # Either a bare list of rules or a full criteria dict
+        if isinstance(rules, list):
+            rules = {"rules": rules}
+        coloring_criteria.update(rules, method="rules")
+        validate_rules(coloring_criteria.get("rules", []), coloring_criteria.get("up_axis", "z"))
+    if getattr(args, "color_map", None):
+        coloring_criteria["color_map"] = args.color_map
+    return coloring_criteria
+
+
+def run_batch(args):
+    """Run headless batch processing"""
+    from core.batch import run_batch as batch_main
+
+    coloring_criteria = coloring_criteria_from_args(args)
+
+    summaries = batch_main(
+        args.inputs,
+        output_dir=args.output_dir,
+        workers=args.workers,
+        orientation_criteria=args.orientation,
+        coloring_criteria=coloring_criteria,
+        force=args.force,
+        profile=args.profile,
+        mesh_formats=args.export_mesh,
+        parse_workers=args.parse_workers,
+        **worker_options_from_args(args),
+    )
+
+    failed = [s for s in summaries if s["status"] == "failed"]
+    done = [s for s in summaries if s["status"] == "ok"]
+    skipped = len(summaries) - len(failed) - len(done)
+    print(f"Done: {len(done)} processed, {skipped} skipped, {len(failed)} failed")
+    return 1 if failed else 0
+
+
+def run_watch(args):
+    """Color files dropped into a directory until interrupted"""
+    from core.watch import FolderWatcher
+
+    watcher = FolderWatcher(
+        args.directory,
+        output_dir=args.output_dir,
+        orientation_criteria=args.orientation,
+        coloring_criteria=coloring_criteria_from_args(args),
+        mesh_formats=args.export_mesh,
+        workers=args.workers,
+        max_pending=args.max_pending,
+        settle=args.settle,
+        polling=args.poll,
+        stats_path=args.stats_file,
+        job_timeout=args.job_timeout,
+        parse_workers=args.parse_workers,
+        **worker_options_from_args(args),
+    )
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        print("Stopped")
+    finally:
+        watcher.close()
+    return 0
+
+
+def run_serve(args):
+    """Run the local job service until interrupted"""
+    import asyncio
+    from core.service import JobService, serve
+
+    service = JobService(
+        workers=args.workers,
+        output_dir=args.output_dir,
+        max_pending=args.max_pending,
+        job_timeout=args.job_timeout,
+        **worker_options_from_args(args),
+    )
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.socket, args.max_connections))
+    except KeyboardInterrupt:
+        print("Stopped")
+    return 0
 
 
 def main():
     """Main application entry point"""
+    args = build_parser().parse_args()
+
     print("STEP File Face Coloring Tool")
     print("=" * 40)
-    
+
     try:
+        if args.command == "batch":
+            sys.exit(run_batch(args))
+        if args.command == "watch":
+            sys.exit(run_watch(args))
+        if args.command == "serve":
+            sys.exit(run_serve(args))
+
         # Launch GUI application
-        gui_main()
+        run_gui()
     except Exception as e:
         print(f"Application error: {e}")
         sys.exit(1)
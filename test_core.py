@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Tests of the core algorithms that run without OCCT
+"""
+
+import json
+import os
+import struct
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+# Add project root to path
+project_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, project_root)
+
+from core.coloring_rules import validate_rules, evaluate_rules
+from core.entity_table import parse_entity_table
+from core.face_graph import FaceGraph, dsatur_coloring
+from core.fingerprint import face_fingerprints, write_color_map, read_color_map, lookup_colors
+from core.mesh_export import GLB_MAGIC, GLB_JSON_CHUNK, GLB_BIN_CHUNK, PLY_FACE_DTYPE, write_glb, write_ply
+from core.palette import make_palette, random_palette
+from core.profiling import PipelineProfiler
+from core.step_patcher import model_context, patch_step_colors
+from core.tessellation import Mesh
+
+INS2 = os.path.join(project_root, "stp_files", "INS2_1_Insulation Wythe.stp")
+
+
+def grid_pairs(rows, columns):
+    """Adjacent cell pairs of a rows x columns grid, numbered row by row"""
+    cells = np.arange(rows * columns).reshape(rows, columns)
+    return np.concatenate([
+        np.column_stack([cells[:, :-1].ravel(), cells[:, 1:].ravel()]),
+        np.column_stack([cells[:-1, :].ravel(), cells[1:, :].ravel()]),
+    ])
+
+
+def assert_proper(graph, colors):
+    """No two neighboring faces share a color"""
+    src = np.repeat(np.arange(len(graph)), graph.degree)
+    assert len(colors) == len(graph)
+    assert (colors >= 0).all()
+    assert (colors[src] != colors[graph.indices]).all()
+
+
+def test_dsatur_adjacent_faces_differ():
+    rng = np.random.default_rng(1)
+    pairs = rng.integers(0, 200, size=(1000, 2))
+    graph = FaceGraph.from_pairs(pairs, 200)
+    assert_proper(graph, dsatur_coloring(graph))
+
+
+def test_dsatur_is_exact_on_bipartite_and_odd_cycle():
+    grid = FaceGraph.from_pairs(grid_pairs(6, 7), 42)
+    colors = dsatur_coloring(grid)
+    assert_proper(grid, colors)
+    assert colors.max() == 1
+
+    cycle = FaceGraph.from_pairs([(i, (i + 1) % 7) for i in range(7)], 7)
+    colors = dsatur_coloring(cycle)
+    assert_proper(cycle, colors)
+    assert colors.max() == 2
+
+
+def test_profiler_records_a_failed_stage():
+    events = []
+    profiler = PipelineProfiler(events.append, ("read", "orient"))
+    with profiler.stage("read", reused=False):
+        pass
+    with pytest.raises(ValueError):
+        with profiler.stage("orient") as info:
+            info["faces"] = 12
+            raise ValueError("no solid")
+
+    assert [(e["stage"], e["event"]) for e in events] == [("read", "start"), ("read", "end"),
+                                                          ("orient", "start"), ("orient", "end")]
+    assert events[-1]["error"] == "no solid"
+    record = profiler.report()["stages"][-1]
+    assert (record["stage"], record["faces"], record["error"]) == ("orient", 12, "no solid")
+    assert "error" not in profiler.records[0]
+
+
+def make_face_table(count, seed=0):
+    """Stand-in FaceTable whose values sit in the middle of the fingerprint bins"""
+    rng = np.random.default_rng(seed)
+    normal = rng.normal(size=(count, 3))
+    normal /= np.linalg.norm(normal, axis=1, keepdims=True)
+    return SimpleNamespace(
+        area=np.exp(np.round(rng.uniform(0.0, 10.0, count) / np.log1p(1e-4)) * np.log1p(1e-4)),
+        centroid=np.round(rng.uniform(-500.0, 500.0, (count, 3)), 3),
+        normal=np.round(normal, 3),
+        surface_type=rng.integers(0, 11, count).astype(np.int8),
+    )
+
+
+def test_fingerprints_stable_under_small_perturbation():
+    table = make_face_table(500)
+    fingerprints = face_fingerprints(table)
+    assert len(np.unique(fingerprints)) == len(fingerprints)
+
+    rng = np.random.default_rng(2)
+    perturbed = SimpleNamespace(
+        area=table.area * (1 + rng.uniform(-1e-6, 1e-6, len(table.area))),
+        centroid=table.centroid + rng.uniform(-1e-5, 1e-5, table.centroid.shape),
+        normal=table.normal + rng.uniform(-1e-5, 1e-5, table.normal.shape),
+        surface_type=table.surface_type,
+    )
+    assert (face_fingerprints(perturbed) == fingerprints).all()
+
+    # A real change of one face changes only its fingerprint
+    perturbed.centroid[7, 0] += 0.1
+    changed = face_fingerprints(perturbed) != fingerprints
+    assert changed.tolist() == [i == 7 for i in range(len(fingerprints))]
+
+
+def test_fingerprints_ignore_orientation():
+    table = make_face_table(50)
+    angle = 0.3
+    rotation = np.array([[np.cos(angle), -np.sin(angle), 0.0],
+                         [np.sin(angle), np.cos(angle), 0.0],
+                         [0.0, 0.0, 1.0]])
+    matrix = np.column_stack([rotation, [10.0, -20.0, 5.0]])
+    moved = SimpleNamespace(
+        area=table.area,
+        centroid=table.centroid @ rotation.T + matrix[:, 3],
+        normal=table.normal @ rotation.T,
+        surface_type=table.surface_type,
+    )
+    assert (face_fingerprints(moved, matrix) == face_fingerprints(table)).all()
+
+
+def test_color_map_round_trip(tmp_path):
+    fingerprints = face_fingerprints(make_face_table(100))
+    rgb = np.random.default_rng(3).random((100, 3)).astype(np.float32)
+    path = str(tmp_path / "part.colors.npy")
+    write_color_map(path, fingerprints, rgb)
+
+    queries = np.concatenate([fingerprints[::-1], [np.uint64(12345)]])
+    found_rgb, found = lookup_colors(read_color_map(path), queries)
+    assert found.tolist() == [True] * 100 + [False]
+    assert np.array_equal(found_rgb[:100], rgb[::-1])
+
+
+def test_palette_is_deterministic_for_a_seed():
+    first = make_palette("random", 12, seed=7)
+    assert np.array_equal(first, make_palette("random", 12, seed=7))
+    assert np.array_equal(first, random_palette(12, seed=7))
+    assert not np.array_equal(first, make_palette("random", 12, seed=8))
+    assert first.shape == (12, 3)
+    assert ((first >= 0.0) & (first <= 1.0)).all()
+    assert not first.flags.writeable
+
+
+def test_rules_validation_names_the_bad_rule():
+    rules = [{"surface_type": "plane", "color": [1, 0, 0]}, {"surface_type": ["cylinder", "cilinder"]}]
+    with pytest.raises(ValueError, match=r"rule 2 .*'cilinder'.*plane, cylinder"):
+        validate_rules(rules)
+    with pytest.raises(ValueError, match="normal '\\+w'"):
+        evaluate_rules(make_face_table(3), [{"normal": "+w"}])
+    with pytest.raises(ValueError, match="unknown key"):
+        validate_rules([{"colour": [1, 0, 0]}])
+    validate_rules(rules[:1])
+
+
+def test_patcher_on_ins2(tmp_path):
+    table = parse_entity_table(INS2, 1)
+    faces = table.ids[table.rows_of("ADVANCED_FACE")]
+    palette = make_palette("distinct", 5)
+    face_rgb = palette[np.arange(len(faces)) % 5]
+    output_path = str(tmp_path / "patched.step")
+
+    summary = patch_step_colors(INS2, output_path, faces, face_rgb, table=table)
+    assert summary["faces"] == 231
+    assert summary["colors"] == 5
+    assert summary["restyled"] == 0
+    # Seven entities per color, one styled item per face, one presentation
+    assert summary["entities_added"] == 7 * 5 + 231 + 1
+
+    patched = parse_entity_table(output_path, 1)
+    assert len(patched) == len(table) + summary["entities_added"]
+    assert np.array_equal(patched.ids[:len(table)], table.ids)
+    assert np.array_equal(patched.ids[len(table):],
+                          np.arange(table.max_id + 1, table.max_id + 1 + summary["entities_added"]))
+
+    with open(INS2, "rb") as f:
+        original = f.read()
+    with open(output_path, "rb") as f:
+        text = f.read()
+    assert text[:table.data_end] == original[:table.data_end]
+    assert text.endswith(original[table.data_end:])
+
+    counts = patched.type_counts()
+    assert counts["STYLED_ITEM"] == 231
+    assert counts["COLOUR_RGB"] == 5
+    # The faces belong to #59 ADVANCED_BREP_SHAPE_REPRESENTATION, context #18084
+    presentation = text[text.rindex(b"MECHANICAL_DESIGN_GEOMETRIC_PRESENTATION_REPRESENTATION"):]
+    assert presentation.split(b";")[0].endswith(b",#18084)")
+
+    # Patching the patched file restyles the same STYLED_ITEMs
+    again = str(tmp_path / "again.step")
+    summary = patch_step_colors(output_path, again, faces, face_rgb[::-1])
+    assert summary["restyled"] == 231
+    assert parse_entity_table(again, 1).type_counts()["STYLED_ITEM"] == 231
+
+
+def test_fallback_context_is_the_3d_model_context(tmp_path):
+    path = str(tmp_path / "contexts.step")
+    with open(path, "wb") as f:
+        f.write(b"ISO-10303-21;\nHEADER;\nFILE_SCHEMA(('AUTOMOTIVE_DESIGN'));\nENDSEC;\nDATA;\n"
+                b"#1=( GEOMETRIC_REPRESENTATION_CONTEXT(2) PARAMETRIC_REPRESENTATION_CONTEXT() "
+                b"REPRESENTATION_CONTEXT('2D SPACE','') );\n"
+                b"#2=( GEOMETRIC_REPRESENTATION_CONTEXT(2) GLOBAL_UNIT_ASSIGNED_CONTEXT((#4)) "
+                b"REPRESENTATION_CONTEXT('GEOMETRIC_REPRESENTATION_CONTEXT(3)','') );\n"
+                b"#3=( GEOMETRIC_REPRESENTATION_CONTEXT(3) GLOBAL_UNIT_ASSIGNED_CONTEXT((#4)) "
+                b"REPRESENTATION_CONTEXT('Context #1','3D') );\n"
+                b"#4=( LENGTH_UNIT() NAMED_UNIT(*) SI_UNIT(.MILLI.,.METRE.) );\n"
+                b"ENDSEC;\nEND-ISO-10303-21;\n")
+    with open(path, "rb") as f:
+        assert model_context(f.read(), parse_entity_table(path, 1)) == 3
+
+
+def make_mesh():
+    """Two unit squares of two triangles each, one square per face"""
+    vertices = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0], [2, 0, 0], [2, 1, 0]], dtype=np.float32)
+    triangles = np.array([[0, 1, 2], [0, 2, 3], [1, 4, 5], [1, 5, 2]], dtype=np.int32)
+    return Mesh(vertices, triangles, np.array([0, 0, 1, 1], dtype=np.int32))
+
+
+def test_triangle_colors_round_to_nearest():
+    face_rgb = np.array([[0.999, 0.5, 0.002], [1.2, -0.1, 0.0]])
+    assert make_mesh().triangle_colors(face_rgb).tolist() == [[255, 128, 1]] * 2 + [[255, 0, 0]] * 2
+
+
+def test_glb_header_and_padding(tmp_path):
+    path = str(tmp_path / "mesh.glb")
+    write_glb(make_mesh(), np.array([[1.0, 0.0, 0.0], [0.0, 0.0, 1.0]]), path)
+    with open(path, "rb") as f:
+        data = f.read()
+
+    magic, version, total = struct.unpack_from("<III", data, 0)
+    assert (magic, version, total) == (GLB_MAGIC, 2, len(data))
+    json_length, json_type = struct.unpack_from("<II", data, 12)
+    assert json_type == GLB_JSON_CHUNK
+    assert json_length % 4 == 0
+    document = json.loads(data[20:20 + json_length])
+
+    bin_offset = 20 + json_length
+    bin_length, bin_type = struct.unpack_from("<II", data, bin_offset)
+    assert bin_type == GLB_BIN_CHUNK
+    assert bin_length % 4 == 0
+    assert bin_offset + 8 + bin_length == len(data)
+    assert document["buffers"][0]["byteLength"] == 6 * 12 + 4 * 3 * 4
+    assert len(document["materials"]) == 2
+    assert sum(a["count"] for a in document["accessors"][1:]) == 12
+
+
+def test_glb_rejects_an_empty_mesh(tmp_path):
+    empty = Mesh(np.zeros((0, 3), dtype=np.float32), np.zeros((0, 3), dtype=np.int64),
+                 np.zeros(0, dtype=np.int32))
+    path = tmp_path / "empty.glb"
+    with pytest.raises(ValueError, match="no triangles"):
+        write_glb(empty, np.zeros((0, 3)), str(path))
+    assert not path.exists()
+
+
+def test_ply_header_and_records(tmp_path):
+    path = str(tmp_path / "mesh.ply")
+    write_ply(make_mesh(), np.array([[1.0, 0.0, 0.0], [0.0, 0.0, 1.0]]), path)
+    with open(path, "rb") as f:
+        data = f.read()
+
+    header, body = data.split(b"end_header\n", 1)
+    lines = header.decode("ascii").splitlines()
+    assert lines[0] == "ply"
+    assert lines[1] == "format binary_little_endian 1.0"
+    assert "element vertex 6" in lines
+    assert "element face 4" in lines
+    assert len(body) == 6 * 12 + 4 * PLY_FACE_DTYPE.itemsize
+
+    faces = np.frombuffer(body[6 * 12:], dtype=PLY_FACE_DTYPE)
+    assert (faces["count"] == 3).all()
+    assert faces["color"].tolist() == [[255, 0, 0]] * 2 + [[0, 0, 255]] * 2
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Tests of the STEP entity table at chunk and block boundaries: strings that
+hold ';', '#' or '(', '' escapes, complex entities and records split across
+chunks
+"""
+
+import os
+import sys
+
+import pytest
+
+# Add project root to path
+project_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, project_root)
+
+import core.entity_table as entity_table
+from core.entity_table import parse_entity_table
+
+HEADER = b"""ISO-10303-21;
+HEADER;
+FILE_DESCRIPTION(('a;b''c'),'2;1');
+FILE_NAME('x(y) DATA;','',(''),(''),'','','');
+FILE_SCHEMA(('AUTOMOTIVE_DESIGN { 1 0 10303 214 1 1 1 1 }'));
+ENDSEC;
+DATA;
+"""
+
+TRAILER = b"""ENDSEC;
+END-ISO-10303-21;
+"""
+
+LONG_NAME = "A_VERY_LONG_ENTITY_NAME_THAT_GOES_ON_FOR_MORE_THAN_SIXTY_FOUR_BYTES_OF_TEXT"
+
+# (id, type name, statement) in file order
+RECORDS = [
+    (1, "PRODUCT", b"#1=PRODUCT('a;#2=FAKE(','it''s; (#3=NO(',' ',(#2));"),
+    (2, "PRODUCT_CONTEXT", b"#2 = PRODUCT_CONTEXT('',#3,'mechanical');"),
+    (3, "APPLICATION_CONTEXT", b"#3=APPLICATION_CONTEXT(''';''');"),
+    (10, "GEOMETRIC_REPRESENTATION_CONTEXT GLOBAL_UNCERTAINTY_ASSIGNED_CONTEXT "
+         "GLOBAL_UNIT_ASSIGNED_CONTEXT REPRESENTATION_CONTEXT",
+     b"#10=( GEOMETRIC_REPRESENTATION_CONTEXT(3) GLOBAL_UNCERTAINTY_ASSIGNED_CONTEXT((#11))\n"
+     b"GLOBAL_UNIT_ASSIGNED_CONTEXT((#12)) REPRESENTATION_CONTEXT('Context #1; (x','3D;') );"),
+    (11, "UNCERTAINTY_MEASURE_WITH_UNIT",
+     b"#11=UNCERTAINTY_MEASURE_WITH_UNIT(LENGTH_MEASURE(1.E-07),#12,\n'distance_accuracy_value',\n'it''s;');"),
+    (12, "LENGTH_UNIT NAMED_UNIT SI_UNIT", b"#12=( LENGTH_UNIT() NAMED_UNIT(*) SI_UNIT(.MILLI.,.METRE.) );"),
+    (13, LONG_NAME, b"#13=" + LONG_NAME.encode("ascii") + b"('');"),
+    (14, "CARTESIAN_POINT", b"#14 =  CARTESIAN_POINT ('',(0.,0.,0.));"),
+    (15, "CARTESIAN_POINT", b"#15=CARTESIAN_POINT('#16=FAKE(;',(1.,0.,0.));"),
+]
+
+
+@pytest.fixture
+def edge_file(tmp_path):
+    """A small STEP file of awkward records, one per line; returns (path, text)"""
+    text = HEADER + b"\n".join(record for _, _, record in RECORDS) + b"\n" + TRAILER
+    path = str(tmp_path / "edge.step")
+    with open(path, "wb") as f:
+        f.write(text)
+    return path, text
+
+
+def assert_table(table, text):
+    """The table holds exactly RECORDS, at their offsets in text"""
+    offsets = [text.index(record) for _, _, record in RECORDS]
+    assert table.ids.tolist() == [entity_id for entity_id, _, _ in RECORDS]
+    assert [table.type_names[code] for code in table.type_codes] == [name for _, name, _ in RECORDS]
+    assert table.offsets.tolist() == offsets
+    assert table.ends.tolist() == [offset + len(record) for offset, (_, _, record) in zip(offsets, RECORDS)]
+    assert text[table.data_end:] == TRAILER
+
+
+def test_serial_parse_of_awkward_records(edge_file):
+    path, text = edge_file
+    table = parse_entity_table(path, 1)
+    assert table.workers == 1
+    assert_table(table, text)
+    assert table.rows_of("SI_UNIT").tolist() == [5]
+    counts = table.type_counts()
+    assert counts["CARTESIAN_POINT"] == 2
+    assert counts["REPRESENTATION_CONTEXT"] == 1
+    assert "FAKE" not in counts and "NO" not in counts
+
+
+def test_blocks_split_mid_record(edge_file, monkeypatch):
+    path, text = edge_file
+    for block_size in (7, 16, 61, 100):
+        monkeypatch.setattr(entity_table, "BLOCK_SIZE", block_size)
+        assert_table(parse_entity_table(path, 1), text)
+
+
+def cut_after(text, *markers):
+    """Offsets just past each marker (each found after the previous one)"""
+    cuts, pos = [], len(HEADER)
+    for marker in markers:
+        pos = text.index(marker, pos) + len(marker)
+        cuts.append(pos)
+    return cuts
+
+
+def test_chunks_split_mid_record(edge_file, monkeypatch):
+    path, text = edge_file
+    # Cuts inside a string after ';', between the quotes of a '' escape, on a
+    # ';' inside a string, inside the component list of a complex entity,
+    # inside a type name and just after a statement end
+    cuts = cut_after(text, b"'a;", b"it'", b"'''", b"GLOBAL_UNCERTAINTY_", b"Context #1;",
+                     b"'it'", b"LENGTH_UN", b"LONG_ENTITY", b"(0.,0.,0.));", b"'#16=FAKE(")
+    monkeypatch.setattr(entity_table, "_chunk_bounds", lambda start, end, workers: [start] + cuts + [end])
+
+    table = parse_entity_table(path, len(cuts) + 1)
+    assert table.workers == len(cuts) + 1
+    assert_table(table, text)
+
+
+def test_even_chunks_of_small_size(edge_file, monkeypatch):
+    path, text = edge_file
+    monkeypatch.setattr(entity_table, "MIN_CHUNK_SIZE", 1)
+    table = parse_entity_table(path, 13)
+    assert table.workers == 13
+    assert_table(table, text)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))